@@ -4,25 +4,116 @@
 # Features:
 # - Tkinter GUI (dark/light theme toggle)
 # - Multi-category dashboard (Aptitude, Programming, Computer Science)
-# - 50 MCQs per subject (programmatically generated)
-# - 5 coding problems per subject (Python problems executable via subprocess)
-# - 60-minute timer
-# - Session-only profile & stats (no persistent storage)
+# - 50 MCQs per subject (programmatically generated per attempt; seeded papers reproducible + LRU cached)
+# - 5 coding problems per subject (Python run on a pre-warmed worker pool, C/Java compiled once
+#   and cached; unchanged deterministic runs answered from a result cache)
+# - 60-minute timer (one shared monotonic clock for all exam windows)
+# - Session-only profile & stats; in-progress attempts are journaled so a crash can be resumed
+# - Optional HTTP/JSON server mode (--serve) so browser clients can take the same exams
+# - Load benchmark scenarios with JSON baselines (--bench); startup profile (--profile-startup)
+# - Question packs (JSON lines/CSV) imported into an indexed SQLite store (--import/--export)
+# - Per-candidate cohort papers pre-assembled from a blueprint into a memory-mapped file (--cohort)
+# - Likely-copied coding submissions found with MinHash/LSH over normalized tokens (--similarity)
+# - Per-subject/mode leaderboards with O(log n) rank, percentile and top-k pages
+# - Streaming CSV/JSON-lines/HTML reports of recorded attempts (--report, Profile > Export Report)
+# - Switchable hot-path metrics with Prometheus/JSON-lines export (--metrics) and a diagnostics panel
 # - Designed for Python 3.10+ (Windows compatible)
 
+import time
+STARTUP_T0 = time.perf_counter()  # --profile-startup measures from here
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog, scrolledtext, filedialog
-import tkinter.font as tkfont
-import time, random, subprocess, sys, os, tempfile, threading
+from tkinter import ttk, messagebox, simpledialog
+import random, sys, os, threading
+import json, queue, itertools, atexit, signal, math, bisect, argparse
+try:
+    import resource  # POSIX only: rlimits and per-run usage for candidate code
+except ImportError:
+    resource = None
+from functools import lru_cache, wraps
+from array import array
+# Modules needed only by code runs, workers, judging, --serve or the coding/result windows
+# (subprocess, tempfile, selectors, concurrent.futures, asyncio, tkinter.scrolledtext, ...)
+# are imported where they are used, so the login window is not kept waiting on them.
 
 # ----------------------------
 # Configuration
 # ----------------------------
 DEFAULT_THEME = "dark"
 PY_EXEC_TIMEOUT = 6  # seconds per execution
+PY_POOL_SIZE = max(2, min(4, os.cpu_count() or 1))  # pre-warmed Python workers kept ready for "Run"
+PY_WORKER_MAX_JOBS = 200  # recycle a worker after this many runs
+WORKER_START_TIMEOUT = 10  # seconds to wait for a worker to come up
+WORKER_GRACE = 2  # extra seconds before an unresponsive worker is killed
+# limits applied to every candidate run (CPU seconds, address space bytes, open files, output bytes)
+EXEC_LIMITS = {"cpu": 5, "memory": 512 * 1024 * 1024, "nofile": 64, "output": 1024 * 1024}
+STREAM_FLUSH_INTERVAL = 0.05  # seconds between output chunks sent by a worker
+STREAM_CHUNK_BYTES = 16 * 1024  # ...or sooner once this much output is pending
+MEMORY_LIMIT_NEAR = 0.9  # a failed run that peaked above this share of the memory cap hit it
+STDERR_TAIL_BYTES = 4096  # end of streamed stderr kept to tell which limit a run hit
+OUTPUT_QUEUE_SIZE = 256  # chunks buffered between the runner thread and the Tk loop
+OUTPUT_POLL_MS = 40  # how often the Tk loop drains the output queue
+OUTPUT_PANE_LIMIT = 200_000  # characters kept in the output pane per run
+JUDGE_CASE_TIMEOUT = 2  # seconds per test case when judging a submission
+JUDGE_TIME_BUDGET = 30  # seconds for judging a whole coding test
+COMPILE_TIMEOUT = 20  # seconds per gcc/javac run
+COMPILE_CONCURRENCY = max(1, (os.cpu_count() or 1) // 2)  # builds allowed at once
+COMPILE_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".exam_portal", "build")
+COMPILE_CACHE_ENTRIES = 500  # cached builds kept; least recently used go first
+RESULT_CACHE_SIZE = 512  # deterministic run results kept in memory (0 turns the cache off)
+RESULT_CACHE_BYTES = 32 * 1024 * 1024  # ... and the output they may hold in total
+RESULT_CACHE_DISK_ENTRIES = 20000  # results kept by the optional --run-cache folder
 WINDOW_TITLE = "Smart Exam Portal — exam_portal.py (Temporary Session)"
 WINDOW_SIZE = "1100x720"
 EXAM_DURATION_SECONDS = 60 * 60  # 60 minutes
+MCQ_COUNT = 50  # questions per generated paper
+BANK_SEED = 2024  # seed for cohorts and --bench: same (subject, seed, count) -> same paper
+BANK_CACHE_SIZE = 32  # generated papers kept in the LRU cache
+CODING_COUNT = 5  # problems per coding test drawn from an imported pack
+QUESTION_DB = os.path.join(os.path.expanduser("~"), ".exam_portal", "questions.db")  # imported packs
+PAPERS_FILE = os.path.join(os.path.expanduser("~"), ".exam_portal", "papers.bin")  # --cohort output (--papers)
+COHORT_POOL_SIZE = 2000  # items drawn per blueprint section for the cohort to share
+COHORT_CHUNK = 250  # candidates per assembler task
+IMPORT_BATCH_SIZE = 5000  # pack records per INSERT batch (one transaction each)
+IMPORT_MAX_ERRORS = 100  # rejected records reported per pack
+DRAW_TRIES_PER_ITEM = 8  # random rowid probes per wanted item before listing all matches
+
+# MCQ navigator: a paged grid of NAV_COLS x NAV_ROWS cells
+NAV_COLS = 5
+NAV_ROWS = 10
+NAV_CELL_W, NAV_CELL_H = 46, 32
+NAV_COLORS = {"marked": "#ff9f1c", "answered": "#10b981", "visited": "#fbbf24", "new": "#2b3440"}
+
+JOURNAL_DIR = os.path.join(os.path.expanduser("~"), ".exam_portal", "journal")
+RESULTS_FILE = os.path.join(os.path.expanduser("~"), ".exam_portal", "results.jsonl")  # every recorded attempt
+REPORT_CHUNK = 256 * 1024  # characters buffered per report write
+LEADERBOARD_FILE = os.path.join(os.path.expanduser("~"), ".exam_portal", "leaderboard.jsonl")  # best result per user
+LEADERBOARD_PAGE = 20  # entries per leaderboard page
+SUBMISSIONS_FILE = os.path.join(os.path.expanduser("~"), ".exam_portal", "submissions.jsonl")  # coding answers
+RESPONSES_FILE = os.path.join(os.path.expanduser("~"), ".exam_portal", "responses.jsonl")  # MCQ item responses
+DIFFICULTY_FILE = os.path.join(os.path.expanduser("~"), ".exam_portal", "difficulty.json")  # --item-stats labels
+SIMILARITY_PERMS = 128  # MinHash signature length
+SIMILARITY_BANDS = 16  # LSH bands (rows per band = PERMS // BANDS); ~0.7 similarity to share a bucket
+SIMILARITY_SHINGLE = 5  # tokens per shingle
+SIMILARITY_MIN_TOKENS = 20  # shorter answers are too generic to compare
+SIMILARITY_THRESHOLD = 0.8  # estimated Jaccard similarity reported as likely copied
+SIMILARITY_MAX_BUCKET = 64  # comparisons per member inside one oversized bucket
+SIMILARITY_BATCH = 5000  # submissions read from disk per batch
+JOURNAL_FLUSH_INTERVAL = 0.5  # seconds between journal writes
+JOURNAL_BATCH_SIZE = 64  # write early once this many events are waiting
+
+# instrumentation (see Metrics); latency histogram bucket bounds are in seconds
+METRICS_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+METRICS_EXPORT_INTERVAL = 10  # seconds between metric file snapshots
+METRICS_PANEL_REFRESH_MS = 1000  # diagnostics panel refresh
+
+# --serve mode
+SERVER_HOST = "127.0.0.1"  # use --host 0.0.0.0 to serve a lab network
+SERVER_PORT = 8765
+SERVER_EXEC_WORKERS = PY_POOL_SIZE  # threads handing code runs to the worker pool
+SERVER_MAX_PENDING_RUNS = 4 * PY_POOL_SIZE  # runs in flight before the server answers 503
+SERVER_MAX_BODY = 256 * 1024  # bytes per request body
+SERVER_SWEEP_INTERVAL = 5  # seconds between expiry sweeps
+SERVER_SESSION_TTL = 15 * 60  # seconds a submitted session stays readable
 
 # Categories and subjects
 CATEGORIES = {
@@ -31,244 +122,4213 @@ CATEGORIES = {
     "Computer Science": ["DBMS", "CN", "OS"]
 }
 
-# Utility: programmatic MCQ generation
-def generate_mcqs_for(subject, count=50):
-    mcqs = []
-    templates = {
-        "Aptitude": [
-            ("Next in series: {a}, {b}, {c}, {d}, ?", "series"),
-            ("If 5x - 3 = 2x + {k}, x = ?", "algebra"),
-            ("A train {L} m long crosses a platform in {t} sec at {v} km/h. Platform length = ?", "speed"),
-            ("If each side of square increased by {p}%, area increases by ?", "percent"),
-            ("Profit: Bought at {c}, sold at {s}. Profit % = ?", "profit"),
-        ],
-        "C": [
-            ("Which header file contains malloc declaration?", "c_stdlib"),
-            ("What does the 'static' keyword in C do for a function or variable?", "c_keywords"),
-            ("Given int x = {a}; printf(\"%d\", x++); what prints?", "postinc"),
-            ("How many bytes is sizeof(char) on most platforms?", "size"),
-            ("Which is true about pointer arithmetic: {i}?", "c_basic"),
-        ],
-        "Java": [
-            ("Which keyword is used to inherit a class in Java?", "inherit"),
-            ("Which interface is used to implement runnable threads?", "threads"),
-            ("What is the output of: System.out.println(5/2);", "div"),
-            ("Which collection is synchronized by default?", "collections"),
-            ("What is the default value of boolean in Java?", "default"),
-        ],
-        "Python": [
-            ("What does list comprehension [x*x for x in range({n})] produce?", "list_comp"),
-            ("What is the output of: print(3//2)?", "floor_div"),
-            ("Which keyword creates a generator?", "yield"),
-            ("Which type is immutable: list or tuple?", "immut"),
-            ("What does 'None' represent in Python?", "none"),
-        ],
-        "DBMS": [
-            ("What is normalization's aim?", "normal"),
-            ("Which normal form resolves partial dependency?", "2nf"),
-            ("Define primary key uniqueness: True/False", "pk"),
-            ("What SQL clause filters result rows?", "where"),
-            ("Which operation is used for joining two relations?", "join"),
-        ],
-        "CN": [
-            ("OSI layer that handles routing is?", "network"),
-            ("What protocol ensures reliable byte stream?", "tcp"),
-            ("Which device operates at data-link layer?", "switch"),
-            ("IP address v4 is how many bits?", "ipv4"),
-            ("What does DNS resolve?", "domain"),
-        ],
-        "OS": [
-            ("Which scheduling is preemptive: Round Robin or FCFS?", "rr"),
-            ("What is a process vs thread?", "proc_thread"),
-            ("Which condition denotes deadlock?", "deadlock"),
-            ("Virtual memory uses which structure?", "paging"),
-            ("What is a semaphore used for?", "sync"),
-        ]
-    }
+# Utility: programmatic MCQ generation
+# Every question comes from a template family that returns (text, correct option, three
+# wrong options), so the key always matches the options. Numeric families draw their
+# parameters from ranges wide enough for very large papers; the fixed questions of each
+# subject are used at most once. A paper keeps a hash set of normalised question texts and of
+# each family's normalised option sets, so a repeat (or a rewording with the same options) is
+# rejected in O(1) and a new one is drawn instead. A family that runs out of fresh option sets
+# may then reuse them with new numbers, and one whose texts are used up too is dropped, so
+# huge papers do not stall on repeats.
+MCQ_FAMILY_MISSES = 64  # a family that repeats itself this often in a row is used up
+
+def _norm(text):
+    return " ".join(str(text).lower().split())
+
+def _near(rng, answer, *likely, floor=None):
+    # three distinct wrong numbers near `answer`; `likely` (typical mistakes) are tried first
+    wrong = []
+    for x in likely:
+        if x != answer and x not in wrong and (floor is None or x >= floor):
+            wrong.append(x)
+    if len(wrong) > 3:
+        wrong = rng.sample(wrong, 3)
+    step = max(1, abs(answer) // 10)
+    while len(wrong) < 3:
+        x = answer + rng.choice((-3, -2, -1, 1, 2, 3)) * step
+        if x != answer and x not in wrong and (floor is None or x >= floor):
+            wrong.append(x)
+    return wrong
+
+def _pct(x):
+    return f"{round(x, 2):g}%"
+
+def _signed(n):
+    return f"+ {n}" if n >= 0 else f"- {-n}"
+
+def _ip(n):
+    return f"{n >> 24 & 255}.{n >> 16 & 255}.{n >> 8 & 255}.{n & 255}"
+
+# Aptitude
+def _mcq_series(rng):
+    kind = rng.randrange(3)
+    if kind == 0:
+        a, d = rng.randint(1, 99), rng.randint(2, 30)
+        terms = [a + d*i for i in range(5)]
+    elif kind == 1:
+        a, r = rng.randint(1, 12), rng.randint(2, 5)
+        terms = [a * r**i for i in range(5)]
+    else:
+        n, d = rng.randint(1, 40), rng.randint(1, 3)
+        terms = [(n + d*i)**2 for i in range(5)]
+    *shown, nxt = terms
+    gap = shown[-1] - shown[-2]
+    wrong = _near(rng, nxt, shown[-1] + (shown[1] - shown[0]), nxt + gap, nxt - 1, floor=1)
+    return "Next in series: {}, {}, {}, {}, ?".format(*shown), str(nxt), [str(x) for x in wrong]
+
+def _mcq_algebra(rng):
+    x = rng.randint(-20, 40)
+    p = rng.randint(2, 15)
+    r = rng.randint(1, p - 1)
+    q = rng.randint(1, 60)
+    k = (p - r)*x - q
+    text = f"If {p}x - {q} = {r}x {_signed(k)}, x = ?"
+    wrong = _near(rng, x, -x, (k + q) // (p + r), x + 1, x - 1)
+    return text, str(x), [str(w) for w in wrong]
+
+def _mcq_speed(rng):
+    v = rng.choice((36, 54, 72, 90, 108, 126, 144))  # km/h, a whole number of m/s
+    ms = v * 5 // 18
+    length = rng.randint(80, 400)
+    t = rng.randint(-(-(length + 50) // ms), -(-(length + 50) // ms) + 40)
+    platform = ms*t - length
+    wrong = _near(rng, platform, ms*t, platform + length, v*t - length, floor=1)
+    return (f"A train {length} m long crosses a platform in {t} sec at {v} km/h. Platform length = ?",
+            f"{platform} m", [f"{w} m" for w in wrong])
+
+def _mcq_percent(rng):
+    p = rng.randint(1, 60)
+    if rng.random() < 0.5:
+        area = 2*p + p*p/100
+        return (f"If each side of square increased by {p}%, area increases by ?",
+                _pct(area), [_pct(x) for x in _near(rng, area, 2*p, p, p*p/100, 2*p + 1, floor=0)])
+    q = rng.randint(1, 50)
+    area = p + q + p*q/100
+    return (f"Length of a rectangle increases by {p}% and breadth by {q}%. Area increases by ?",
+            _pct(area), [_pct(x) for x in _near(rng, area, p + q, p*q/100 + max(p, q), (p + q)/2, floor=0)])
+
+def _mcq_profit(rng):
+    c = rng.randrange(100, 5001, 20)
+    pct = rng.choice([x for x in range(-40, 101, 5) if x])
+    s = c * (100 + pct) // 100
+    on_sp = abs(s - c) * 100 / s  # the usual mistake: percent of the selling price
+    wrong = [_pct(x) for x in _near(rng, abs(pct), round(on_sp, 2), abs(pct) + 5, abs(pct) - 5, floor=1)]
+    if pct > 0:
+        return f"Profit: Bought at {c}, sold at {s}. Profit % = ?", _pct(pct), wrong
+    return f"Loss: Bought at {c}, sold at {s}. Loss % = ?", _pct(-pct), wrong
+
+# C
+def _mcq_c_increment(rng):
+    a = rng.randint(0, 999)
+    if rng.random() < 0.5:
+        return f"Given int x = {a}; printf(\"%d\", x++); what prints?", str(a), [str(a + 1), str(a - 1), "undefined"]
+    return f"Given int x = {a}; printf(\"%d\", ++x); what prints?", str(a + 1), [str(a), str(a + 2), "undefined"]
+
+def _mcq_c_arith(rng):
+    a, b = rng.randint(10, 9999), rng.randint(2, 16)
+    if rng.random() < 0.5:
+        return (f"What does printf(\"%d\", {a} / {b}); print?", str(a // b),
+                [str(x) for x in _near(rng, a // b, round(a / b + 0.5), a % b, a // b + 1, floor=0)])
+    return (f"What does printf(\"%d\", {a} % {b}); print?", str(a % b),
+            [str(x) for x in _near(rng, a % b, a // b, b - a % b, floor=0)])
+
+def _mcq_c_bits(rng):
+    a, b = rng.randint(1, 255), rng.randint(1, 255)
+    op = rng.choice("&|^<")
+    if op == "<":
+        k = rng.randint(1, 6)
+        return (f"What does printf(\"%d\", {a} << {k}); print?", str(a << k),
+                [str(x) for x in _near(rng, a << k, a >> k, a * k, a << (k + 1), floor=0)])
+    res = {"&": a & b, "|": a | b, "^": a ^ b}
+    wrong = [res[o] for o in res if o != op] + [a + b]
+    return (f"What does printf(\"%d\", {a} {op} {b}); print?", str(res[op]),
+            [str(x) for x in _near(rng, res[op], *wrong, floor=0)])
+
+def _mcq_c_sizeof(rng):
+    n = rng.randint(2, 4096)
+    return (f"With a 4-byte int, what is sizeof(int[{n}])?", f"{4*n} bytes",
+            [f"{x} bytes" for x in _near(rng, 4*n, n, 8*n, 4*n + 4, floor=1)])
+
+# Java
+def _mcq_java_arith(rng):
+    a, b = rng.randint(5, 9999), rng.randint(2, 16)
+    if rng.random() < 0.5:
+        exact = f"{a / b:.2f}".rstrip("0").rstrip(".")
+        wrong = [exact if exact != str(a // b) else str(a // b + 2), str(a // b + 1), str(a % b)]
+        return f"What is the output of: System.out.println({a}/{b});", str(a // b), wrong
+    return (f"What is the output of: System.out.println({a} % {b});", str(a % b),
+            [str(x) for x in _near(rng, a % b, a // b, b - a % b, floor=0)])
+
+def _mcq_java_cast(rng):
+    whole, frac = rng.randint(1, 999), rng.randint(1, 9)
+    sign = rng.choice((1, -1))
+    value = f"{'-' if sign < 0 else ''}{whole}.{frac}"
+    rounded = sign * (whole + (1 if frac >= 5 else 0))
+    wrong = _near(rng, sign*whole, sign*(whole + 1), sign*whole - 1, rounded)
+    return (f"What is the output of: System.out.println((int) {value});", str(sign*whole), [str(x) for x in wrong])
+
+def _mcq_java_string(rng):
+    s = "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 14)))
+    n = len(s)
+    return (f"What is the output of: System.out.println(\"{s}\".length());", str(n),
+            [str(x) for x in _near(rng, n, n - 1, n + 1, n + 2, floor=1)])
+
+def _mcq_java_shift(rng):
+    a, k = rng.randint(16, 4096), rng.randint(1, 4)
+    return (f"What is the output of: System.out.println({a} >> {k});", str(a >> k),
+            [str(x) for x in _near(rng, a >> k, a << k, a // (k + 1), (a >> k) + 1, floor=0)])
+
+# Python
+def _mcq_py_list_comp(rng):
+    n = rng.randint(1, 9)
+    start = rng.randint(0, 3)
+    rng_text = f"range({n})" if start == 0 else f"range({start}, {start + n})"
+    xs = range(start, start + n)
+    answer = str([x*x for x in xs])
+    wrong = [str([x*x for x in range(start + 1, start + n + 1)]), str(list(xs)), str([2*x for x in xs])]
+    return f"What does list comprehension [x*x for x in {rng_text}] produce?", answer, wrong
+
+def _mcq_py_division(rng):
+    a, b = rng.randint(-9999, 9999), rng.randint(2, 12)
+    if rng.random() < 0.5:
+        trunc = int(a / b)
+        return (f"What is the output of: print({a}//{b})?", str(a // b),
+                [str(x) for x in _near(rng, a // b, trunc, trunc + 1, -(a // b))])
+    return (f"What is the output of: print({a} % {b})?", str(a % b),
+            [str(x) for x in _near(rng, a % b, a - int(a / b)*b, b - a % b, a // b)])
+
+def _mcq_py_range(rng):
+    a, step = rng.randint(0, 50), rng.randint(1, 7)
+    b = a + rng.randint(1, 80)
+    n = len(range(a, b, step))
+    return (f"What is the output of: print(len(range({a}, {b}, {step})))?", str(n),
+            [str(x) for x in _near(rng, n, n + 1, n - 1, (b - a) // step + 1, b - a, floor=0)])
+
+def _mcq_py_sum(rng):
+    n = rng.randint(2, 500)
+    s = n*(n - 1)//2
+    return (f"What is the output of: print(sum(range({n})))?", str(s),
+            [str(x) for x in _near(rng, s, n*(n + 1)//2, s - n + 1, n*n // 2, floor=0)])
+
+# DBMS
+def _mcq_dbms_sizes(rng):
+    m, n = rng.randint(2, 5000), rng.randint(2, 5000)
+    kind = rng.randrange(3)
+    if kind == 0:
+        return (f"Relation R has {m} tuples and S has {n} tuples. How many tuples are in R × S?", str(m*n),
+                [str(m + n), str(max(m, n)), str(m*n - min(m, n))])
+    if kind == 1:
+        return (f"R and S are union-compatible with {m} and {n} tuples. At most how many tuples are in R ∪ S?",
+                str(m + n), [str(m*n), str(max(m, n)), str(m + n - 1)])
+    return (f"R and S are union-compatible with {m} and {n} tuples. At most how many tuples are in R ∩ S?",
+            str(min(m, n)), [str(max(m, n)), str(m + n), "0"] if min(m, n) else [str(m), str(n), str(m + n)])
+
+def _mcq_dbms_count(rng):
+    rows = rng.randint(10, 100000)
+    nulls = rng.randint(1, rows - 1)
+    if rng.random() < 0.5:
+        return (f"Table T has {rows} rows and column c is NULL in {nulls} of them. SELECT COUNT(c) FROM T returns?",
+                str(rows - nulls), [str(rows), str(nulls), str(rows + nulls)])
+    return (f"Table T has {rows} rows and column c is NULL in {nulls} of them. SELECT COUNT(*) FROM T returns?",
+            str(rows), [str(rows - nulls), str(nulls), str(rows + nulls)])
+
+def _mcq_dbms_superkeys(rng):
+    n = rng.randint(2, 20)
+    return (f"A relation has {n} attributes and a single-attribute candidate key. How many superkeys does it have?",
+            str(2**(n - 1)), [str(2**n - 1), str(2**n), str(n)])
+
+# CN
+def _mcq_cn_hosts(rng):
+    p = rng.randint(8, 30)
+    hosts = 2**(32 - p) - 2
+    return (f"How many usable host addresses does an IPv4 /{p} subnet have?", str(hosts),
+            [str(hosts + 2), str(hosts + 1), str(2**(31 - p))])
+
+def _mcq_cn_network(rng):
+    p = rng.randint(8, 30)
+    addr = rng.getrandbits(32)
+    mask = (0xFFFFFFFF << (32 - p)) & 0xFFFFFFFF
+    net = addr & mask
+    wrong = [_ip(net | (~mask & 0xFFFFFFFF)), _ip(net + 1), _ip(addr & ((mask << 1) & 0xFFFFFFFF))]
+    return f"What is the network address of host {_ip(addr)}/{p}?", _ip(net), wrong
+
+def _mcq_cn_mask(rng):
+    p = rng.randint(8, 30)
+    mask = (0xFFFFFFFF << (32 - p)) & 0xFFFFFFFF
+    near = [(0xFFFFFFFF << (32 - q)) & 0xFFFFFFFF for q in (p - 1, p + 1, p + 2 if p < 30 else p - 2)]
+    return f"What is the subnet mask of a /{p} network?", _ip(mask), [_ip(m) for m in near]
+
+def _mcq_cn_transfer(rng):
+    rate = rng.choice((8, 16, 24, 40, 48, 64, 80, 96, 128, 256))
+    t = rng.randint(1, 900)
+    mb = t * rate // 8
+    return (f"How many seconds does it take to send {mb} MB over a {rate} Mbps link (ignore overheads)?", str(t),
+            [str(x) for x in _near(rng, t, mb // rate or t + 4, t * 8, t // 8 or t + 8, floor=1)])
+
+# OS
+def _mcq_os_pages(rng):
+    bits = rng.randint(20, 48)
+    kb = 2**rng.randint(0, 6)
+    k = bits - 10 - kb.bit_length() + 1
+    return (f"A {bits}-bit logical address space uses {kb} KB pages. How many pages are there?", f"2^{k}",
+            [f"2^{x}" for x in (k - 1, k + 1, bits - kb.bit_length() + 1)])
+
+def _mcq_os_address(rng):
+    kb = 2**rng.randint(0, 6)
+    addr = rng.randint(0, 2**24)
+    size = kb * 1024
+    if rng.random() < 0.5:
+        return (f"With {kb} KB pages, which page number holds virtual address {addr}?", str(addr // size),
+                [str(x) for x in _near(rng, addr // size, addr // size + 1, addr // (kb * 1000), addr % size, floor=0)])
+    return (f"With {kb} KB pages, what is the page offset of virtual address {addr}?", str(addr % size),
+            [str(x) for x in _near(rng, addr % size, addr // size, addr % (kb * 1000), floor=0)])
+
+def _mcq_os_deadlock(rng):
+    n, k = rng.randint(2, 30), rng.randint(2, 30)
+    need = n*(k - 1) + 1
+    return (f"{n} processes each need {k} units of one resource. Minimum units that guarantee no deadlock?",
+            str(need), [str(n*k), str(need - 1), str(n*(k - 1))])
+
+def _mcq_os_rr(rng):
+    q = rng.randint(2, 50)
+    burst = rng.randint(q + 1, q * 40)
+    n = -(-burst // q)
+    return (f"Under Round Robin with a {q} ms quantum, how many time slices does a {burst} ms burst need?", str(n),
+            [str(x) for x in _near(rng, n, burst // q if burst % q else n + 1, n + 1, floor=1)])
+
+MCQ_FAMILIES = {
+    "Aptitude": [_mcq_series, _mcq_algebra, _mcq_speed, _mcq_percent, _mcq_profit],
+    "C": [_mcq_c_increment, _mcq_c_arith, _mcq_c_bits, _mcq_c_sizeof],
+    "Java": [_mcq_java_arith, _mcq_java_cast, _mcq_java_string, _mcq_java_shift],
+    "Python": [_mcq_py_list_comp, _mcq_py_division, _mcq_py_range, _mcq_py_sum],
+    "DBMS": [_mcq_dbms_sizes, _mcq_dbms_count, _mcq_dbms_superkeys],
+    "CN": [_mcq_cn_hosts, _mcq_cn_network, _mcq_cn_mask, _mcq_cn_transfer],
+    "OS": [_mcq_os_pages, _mcq_os_address, _mcq_os_deadlock, _mcq_os_rr],
+}
+
+# fixed questions: (text, correct option, wrong options)
+STATIC_MCQS = {
+    "C": [
+        ("Which header file contains malloc declaration?", "stdlib.h", ["stdio.h", "string.h", "math.h"]),
+        ("What does the 'static' keyword do for a function defined in a C file?", "Limits it to that file",
+         ["Makes it inline", "Makes it thread-safe", "Allocates it on the heap"]),
+        ("How many bytes is sizeof(char) on most platforms?", "1", ["2", "4", "8"]),
+        ("Adding 1 to an int* advances it by?", "sizeof(int) bytes", ["1 byte", "2 bytes", "Depends on the value stored"]),
+    ],
+    "Java": [
+        ("Which keyword is used to inherit a class in Java?", "extends", ["implements", "inherits", "super"]),
+        ("Which interface is used to implement runnable threads?", "Runnable", ["Callable", "Threadable", "Executor"]),
+        ("Which collection is synchronized by default?", "Vector", ["ArrayList", "HashMap", "LinkedList"]),
+        ("What is the default value of a boolean field in Java?", "false", ["true", "null", "0"]),
+    ],
+    "Python": [
+        ("What is the output of: print(3//2)?", "1", ["1.5", "2", "1.0"]),
+        ("Which keyword creates a generator?", "yield", ["return", "generate", "lambda"]),
+        ("Which type is immutable?", "tuple", ["list", "dict", "set"]),
+        ("What does 'None' represent in Python?", "The absence of a value", ["Zero", "An empty string", "False"]),
+    ],
+    "DBMS": [
+        ("What is normalization's aim?", "Reduce redundancy", ["Speed up every query", "Encrypt data", "Add indexes"]),
+        ("Which normal form resolves partial dependency?", "2NF", ["1NF", "3NF", "BCNF"]),
+        ("Primary key values must be unique and non-null: True/False?", "True", ["False", "Only for numeric keys", "Only when indexed"]),
+        ("What SQL clause filters result rows?", "WHERE", ["ORDER BY", "GROUP BY", "SELECT"]),
+        ("Which operation combines tuples of two relations on a matching condition?", "Join", ["Union", "Projection", "Selection"]),
+    ],
+    "CN": [
+        ("OSI layer that handles routing is?", "Network", ["Transport", "Data link", "Session"]),
+        ("What protocol ensures reliable byte stream?", "TCP", ["UDP", "IP", "ICMP"]),
+        ("Which device operates at data-link layer?", "Switch", ["Router", "Hub", "Repeater"]),
+        ("IP address v4 is how many bits?", "32 bits", ["16 bits", "64 bits", "128 bits"]),
+        ("What does DNS resolve?", "Domain names to IP addresses", ["MAC to IP addresses", "IP to port numbers", "URLs to file paths"]),
+    ],
+    "OS": [
+        ("Which scheduling is preemptive?", "Round Robin", ["FCFS", "Non-preemptive SJF", "Non-preemptive priority"]),
+        ("What do threads of one process share?", "The address space", ["The stack", "The register set", "The program counter"]),
+        ("Which is a necessary condition for deadlock?", "Circular wait", ["Preemption", "Aging", "Starvation"]),
+        ("Virtual memory uses which structure to map pages to frames?", "Page table", ["Stack", "Inode table", "Ready queue"]),
+        ("What is a semaphore used for?", "Process synchronization", ["Memory allocation", "Disk scheduling", "Page replacement"]),
+    ],
+}
+
+def generate_mcqs_for(subject, count=50, seed=None):
+    # private RNG so a seeded paper is reproducible and never disturbs the global random state
+    rng = random.Random(f"{subject}:{seed}:{count}") if seed is not None else random.Random()
+    families = list(MCQ_FAMILIES.get(subject, MCQ_FAMILIES["Aptitude"]))
+    misses = [0] * len(families)  # consecutive repeats per family
+    statics = list(STATIC_MCQS.get(subject, ()))
+    seen = set()  # normalised texts and (family, option set) pairs already in this paper
+    relaxed = set()  # families out of fresh option sets: only their texts must differ now
+    diffs = ["Easy"] * (count//2) + ["Medium"] * (count//3) + ["Hard"] * (count - (count//2) - (count//3))
+    rng.shuffle(diffs)
+    mcqs = []
+    while len(mcqs) < count:
+        if not families and not statics:
+            raise ValueError(f"cannot generate {count} distinct {subject} questions (stopped at {len(mcqs)})")
+        pick = rng.randrange(len(families) + len(statics))
+        if pick < len(families):
+            qtext, answer, wrong = families[pick](rng)
+        else:
+            qtext, answer, wrong = statics.pop(pick - len(families))
+        key = _norm(qtext)
+        opts = [answer, *wrong]
+        # same family and same four options (in any order) reads as the same question reworded
+        optset = (families[pick].__name__ if pick < len(families) else "", tuple(sorted(_norm(o) for o in opts)))
+        if key in seen or (optset in seen and optset[0] not in relaxed) or len(set(opts)) != 4:
+            if pick < len(families):
+                misses[pick] += 1
+                if misses[pick] >= MCQ_FAMILY_MISSES:
+                    if optset[0] in relaxed:
+                        del families[pick], misses[pick]
+                    else:
+                        relaxed.add(optset[0])
+                        misses[pick] = 0
+            continue
+        if pick < len(families):
+            misses[pick] = 0
+        seen.add(key)
+        seen.add(optset)
+        rng.shuffle(opts)
+        diff = diffs[len(mcqs)]
+        mcqs.append({
+            "id": item_id(subject, qtext, opts),
+            "question": f"{subject}: {qtext} ({diff})",
+            "options": opts,
+            "answer": opts.index(answer) + 1,
+            "difficulty": diff,
+            "template": families[pick].__name__[len("_mcq_"):] if pick < len(families) else "static"
+        })
+    return mcqs
+
+def item_id(subject, text, options):
+    # stable content id (the difficulty label is not part of it), used by item analysis
+    import hashlib
+    h = hashlib.sha1("\x1f".join([subject, text, *map(str, options)]).encode("utf-8"))
+    return h.hexdigest()[:16]
+
+# Question bank: without a seed every paper is freshly generated, so each attempt gets its
+# own questions (the journal keeps the paper for resuming). Seeded papers (cohorts,
+# benchmarks) are reproducible and kept in a bounded LRU cache; the cached dicts are
+# shared, so callers get copies. Measured difficulties live in DIFFICULTY_OVERRIDES (item
+# id -> label) and are applied to every paper handed out. --item-stats saves them to
+# DIFFICULTY_FILE, which is read the first time a paper is handed out.
+DIFFICULTY_OVERRIDES = {}
+_OVERRIDES_LOADED = False
+
+@lru_cache(maxsize=BANK_CACHE_SIZE)
+def _cached_paper(subject, seed, count):
+    return tuple(generate_mcqs_for(subject, count=count, seed=seed))
+
+def set_difficulty(q, label):
+    old = q.get("difficulty")
+    if old and q["question"].endswith(f"({old})"):
+        q["question"] = q["question"][:-len(old) - 2] + f"({label})"
+    q["difficulty"] = label
+    return q
+
+def difficulty_overrides():
+    global _OVERRIDES_LOADED
+    if not _OVERRIDES_LOADED:
+        _OVERRIDES_LOADED = True
+        try:
+            with open(DIFFICULTY_FILE, encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            saved = {}
+        if isinstance(saved, dict):
+            saved = {k: v for k, v in saved.items() if v in ("Easy", "Medium", "Hard")}
+            DIFFICULTY_OVERRIDES.update(dict(saved, **DIFFICULTY_OVERRIDES))  # labels set in this run win
+    return DIFFICULTY_OVERRIDES
+
+def save_difficulty_overrides(labels):
+    overrides = difficulty_overrides()
+    overrides.update(labels)
+    os.makedirs(os.path.dirname(DIFFICULTY_FILE), exist_ok=True)
+    tmp = DIFFICULTY_FILE + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(overrides, f)
+    os.replace(tmp, DIFFICULTY_FILE)
+
+def apply_difficulty_overrides(paper):
+    overrides = difficulty_overrides()
+    for q in paper:
+        label = overrides.get(q.get("id"))
+        if label is not None and label != q.get("difficulty"):
+            set_difficulty(q, label)
+    return paper
+
+class LazyQuestionBank:
+    def __init__(self, subjects, seed=None, count=MCQ_COUNT):
+        self.subjects = list(subjects)
+        self.seed = seed
+        self.count = count
+
+    def paper(self, subject, seed=None, count=None):
+        if subject not in self.subjects:
+            return []
+        seed = self.seed if seed is None else seed
+        count = self.count if count is None else count
+        if seed is None:
+            return apply_difficulty_overrides(generate_mcqs_for(subject, count=count))
+        return apply_difficulty_overrides([dict(q) for q in _cached_paper(subject, seed, count)])
+
+    def get(self, subject, default=None):
+        if subject not in self.subjects:
+            return default
+        return self.paper(subject)
+
+    def __getitem__(self, subject):
+        if subject not in self.subjects:
+            raise KeyError(subject)
+        return self.paper(subject)
+
+    def __contains__(self, subject):
+        return subject in self.subjects
+
+    def __iter__(self):
+        return iter(self.subjects)
+
+    def __len__(self):
+        return len(self.subjects)
+
+SUBJECTS = [s for subjects in CATEGORIES.values() for s in subjects]
+QUESTION_BANK = LazyQuestionBank(SUBJECTS)
+
+# Coding bank (problems with tests are executable: Python in the worker pool, C and Java compiled first)
+CODING_BANK = {
+    "Python": [
+        {"title":"Easy: Sum of list", "desc":"Write a function solve() that reads a line of integers separated by spaces and prints their sum.",
+         "tests":[{"input":"1 2 3 4 5\n", "output":"15"}, {"input":"10 -3 7\n", "output":"14"},
+                  {"input":"42\n", "output":"42"}, {"input":"0 0 0\n", "output":"0"}]},
+        {"title":"Easy-Mid: Count vowels", "desc":"Write solve() that reads a line, counts vowels (a,e,i,o,u) and prints the count.",
+         "tests":[{"input":"hello world\n", "output":"3"}, {"input":"rhythm\n", "output":"0"},
+                  {"input":"programming is fun\n", "output":"5"}, {"input":"aeiou\n", "output":"5"}]},
+        {"title":"Medium: Unique words", "desc":"Write solve() that reads a sentence and prints number of unique words (case-insensitive).",
+         "tests":[{"input":"The cat and the hat\n", "output":"4"}, {"input":"a A a\n", "output":"1"},
+                  {"input":"one two three\n", "output":"3"}, {"input":"Go go GO stop\n", "output":"2"}]},
+        {"title":"Hard: Longest increasing subsequence length", "desc":"Write solve() that reads integers and prints length of LIS.",
+         "tests":[{"input":"10 9 2 5 3 7 101 18\n", "output":"4"}, {"input":"0 1 0 3 2 3\n", "output":"4"},
+                  {"input":"7 7 7 7\n", "output":"1"}, {"input":"1 2 3 4 5\n", "output":"5"}]},
+        {"title":"Harder: Evaluate expression", "desc":"Write solve() that evaluates a single-line arithmetic expression (safe eval) and prints result.",
+         "tests":[{"input":"2 + 3 * 4\n", "output":"14"}, {"input":"(1 + 2) * (3 + 4)\n", "output":"21"},
+                  {"input":"10 - 4 - 3\n", "output":"3"}, {"input":"100 - 7 * (2 + 3)\n", "output":"65"}]}
+    ],
+    "C": [
+        {"title":"Easy: Hello World variant", "desc":"Write a C program that reads a name and prints 'Hello from C, <name>!'.",
+         "tests":[{"input":"Ada\n", "output":"Hello from C, Ada!"}, {"input":"Linus\n", "output":"Hello from C, Linus!"}]},
+        {"title":"Easy-Mid: Pointers practice", "desc":"Write a C function void swap(int *a, int *b); main reads two integers, swaps them with it and prints them.",
+         "tests":[{"input":"3 7\n", "output":"7 3"}, {"input":"-1 0\n", "output":"0 -1"}, {"input":"5 5\n", "output":"5 5"}]},
+        {"title":"Medium: String reverse", "desc":"Write a C program that reads a word, reverses it in place and prints it.",
+         "tests":[{"input":"hello\n", "output":"olleh"}, {"input":"a\n", "output":"a"}, {"input":"racecar\n", "output":"racecar"}]},
+        {"title":"Hard: Dynamic memory", "desc":"Read integers until end of input into an array grown with malloc/realloc, then print them in reverse order.",
+         "tests":[{"input":"1 2 3\n", "output":"3 2 1"}, {"input":"42\n", "output":"42"},
+                  {"input":" ".join(map(str, range(1, 101))) + "\n", "output":" ".join(map(str, range(100, 0, -1)))}]},
+        {"title":"Harder: Implement linked list", "desc":"Implement a singly linked list. Each input line is 'insert x' (append) or 'delete x' (first occurrence); print the final list, or 'empty'.",
+         "tests":[{"input":"insert 1\ninsert 2\ninsert 3\ndelete 2\n", "output":"1 3"}, {"input":"insert 5\ndelete 5\n", "output":"empty"},
+                  {"input":"insert 4\ninsert 4\ndelete 4\ndelete 9\n", "output":"4"}]}
+    ],
+    "Java": [
+        {"title":"Easy: Hello Java", "desc":"Write a class Main whose main method reads a name and prints 'Hello Java, <name>'.",
+         "tests":[{"input":"Duke\n", "output":"Hello Java, Duke"}, {"input":"Grace\n", "output":"Hello Java, Grace"}]},
+        {"title":"Easy-Mid: Class & Object", "desc":"Implement a Rectangle class with width, height and area(); Main reads the two sides and prints the area.",
+         "tests":[{"input":"3 4\n", "output":"12"}, {"input":"1 1\n", "output":"1"}, {"input":"10 0\n", "output":"0"}]},
+        {"title":"Medium: Array operations", "desc":"Read integers and print the second largest distinct value, or 'none' if there is none.",
+         "tests":[{"input":"3 9 4 9 1\n", "output":"4"}, {"input":"7 7\n", "output":"none"}, {"input":"-5 -2\n", "output":"-5"}]},
+        {"title":"Hard: Threads demo", "desc":"Read n, sum 1..n using four Runnable workers on separate Threads (join them all) and print the total.",
+         "tests":[{"input":"10\n", "output":"55"}, {"input":"1000\n", "output":"500500"}, {"input":"1\n", "output":"1"}]},
+        {"title":"Harder: Data structures", "desc":"Implement a stack as a linked list. Lines are 'push x' or 'pop' (print the popped value, or 'empty').",
+         "tests":[{"input":"push 1\npush 2\npop\npop\npop\n", "output":"2\n1\nempty"}, {"input":"pop\n", "output":"empty"},
+                  {"input":"push 7\npush 8\npop\npush 9\npop\n", "output":"8\n9"}]}
+    ],
+    "DBMS": [
+        {"title":"Easy: SQL SELECT", "desc":"Write SQL to select top-N records from a table."},
+        {"title":"Easy-Mid: JOIN query", "desc":"Write SQL to join two tables on a key."},
+        {"title":"Medium: Normalization", "desc":"Explain/Show steps to normalize a table to 3NF (text answer)."},
+        {"title":"Hard: Transaction", "desc":"Design transactions to avoid lost update (explain)."},
+        {"title":"Harder: Query optimization", "desc":"Explain indexes and how to optimize a query."}
+    ],
+    "CN": [
+        {"title":"Easy: Describe IP", "desc":"Explain IPv4 address structure (text)."},
+        {"title":"Easy-Mid: Subnetting", "desc":"Given CIDR /24, how many hosts? (text)"},
+        {"title":"Medium: Routing", "desc":"Explain how OSPF works at high level."},
+        {"title":"Hard: Congestion control", "desc":"Explain TCP congestion control algorithms."},
+        {"title":"Harder: Protocol design", "desc":"Design a simple reliable message protocol (text)."}
+    ],
+    "OS": [
+        {"title":"Easy: Process vs Thread", "desc":"Explain difference between process and thread."},
+        {"title":"Easy-Mid: Scheduling", "desc":"Given processes, compute turnaround time for Round Robin."},
+        {"title":"Medium: Critical section", "desc":"Write pseudocode to solve mutual exclusion with semaphores."},
+        {"title":"Hard: Virtual memory", "desc":"Explain demand paging and page replacement algorithms."},
+        {"title":"Harder: Kernel modules", "desc":"Describe how kernel modules are loaded/unloaded (text)."}
+    ],
+    "Aptitude": [
+        {"title":"Easy: Simple Interest", "desc":"Compute simple interest for principal, rate, time."},
+        {"title":"Easy-Mid: Percentage", "desc":"Find percentage increase for given values."},
+        {"title":"Medium: Series", "desc":"Find next in numeric series."},
+        {"title":"Hard: Time & Work", "desc":"Solve combined work-rate problems."},
+        {"title":"Harder: Combinatorics", "desc":"Counting/permutation combinatorics problem."}
+    ]
+}
+
+# ----------------------------
+# Question store (SQLite, optional)
+# ----------------------------
+# Question packs (JSON lines or CSV) are read one record at a time, validated and written
+# to QUESTION_DB in batches, so a pack of any size never has to fit in memory. Items are
+# indexed by (subject, kind, difficulty, random key) and by tag. A paper is drawn with
+# one index seek per question at a random key, without copying or shuffling the bank.
+# Subjects with nothing imported keep using the generated papers and CODING_BANK.
+#
+# MCQ record:    {"subject", "question", "options": [4], "answer": 1-4 | "A"-"D" | option text,
+#                 "difficulty"?, "tags"?: [...] | "a;b"}
+# Coding record: {"type": "coding", "subject", "title", "desc", "tests"?: [{"input", "output"}],
+#                 "difficulty"?, "tags"?}
+# CSV packs use the same column names; options may be option_a..option_d or "a|b|c|d".
+DIFFICULTIES = ("Easy", "Medium", "Hard")
+PACK_CSV_FIELDS = ["type", "subject", "question", "option_a", "option_b", "option_c", "option_d",
+                   "answer", "difficulty", "tags", "title", "desc", "tests"]
+
+def _split_list(value, sep, what):
+    if isinstance(value, str):
+        return [v.strip() for v in value.split(sep) if v.strip()]
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        raise ValueError(f"{what} must be a list or a {sep!r}-separated string")
+    return value
+
+def validate_pack_item(rec):
+    # returns a normalised item dict or raises ValueError saying what is wrong
+    if not isinstance(rec, dict):
+        raise ValueError("record is not an object")
+    kind = rec.get("type") or "mcq"
+    if not isinstance(kind, str):
+        raise ValueError("type must be \"mcq\" or \"coding\"")
+    kind = kind.strip().lower()
+    subject = str(rec.get("subject") or "").strip()
+    if subject not in SUBJECTS:
+        raise ValueError(f"unknown subject {subject!r}")
+    difficulty = str(rec.get("difficulty") or "Medium").strip().capitalize()
+    if difficulty not in DIFFICULTIES:
+        raise ValueError(f"difficulty must be one of {', '.join(DIFFICULTIES)}")
+    tags = _split_list(rec.get("tags"), ";", "tags")
+    if not all(isinstance(t, str) for t in tags):
+        raise ValueError("tags must be strings")
+    tags = sorted({t.strip().lower() for t in tags if t.strip()})
+    if kind == "coding":
+        title, desc = str(rec.get("title") or "").strip(), str(rec.get("desc") or "").strip()
+        if not title or not desc:
+            raise ValueError("coding items need a title and desc")
+        tests = rec.get("tests") or []
+        if isinstance(tests, str):
+            tests = json.loads(tests)
+        if not isinstance(tests, list) or not all(isinstance(t, dict) and isinstance(t.get("input"), str) and isinstance(t.get("output"), str)
+                   for t in tests):
+            raise ValueError("tests must be a list of {input, output} strings")
+        return {"id": item_id(subject, title, [desc]), "kind": "coding", "subject": subject, "difficulty": difficulty,
+                "tags": tags, "question": title, "options": [], "answer": 0,
+                "data": {"title": title, "desc": desc, "tests": tests}}
+    if kind != "mcq":
+        raise ValueError(f"unknown item type {kind!r}")
+    question = str(rec.get("question") or "").strip()
+    if not question:
+        raise ValueError("question is empty")
+    options = rec.get("options")
+    if options is None:
+        options = [rec.get(f"option_{c}") for c in "abcd"]
+    options = [str(o).strip() for o in _split_list(options, "|", "options") if o is not None and str(o).strip()]
+    if len(options) != 4 or len({_norm(o) for o in options}) != 4:
+        raise ValueError("need exactly 4 distinct options")
+    answer = rec.get("answer")
+    if isinstance(answer, str):
+        answer = answer.strip()
+        if len(answer) == 1 and answer.upper() in "ABCD":
+            answer = "ABCD".index(answer.upper()) + 1
+        elif answer.isdigit():
+            answer = int(answer)
+        elif answer in options:
+            answer = options.index(answer) + 1
+    if not isinstance(answer, int) or isinstance(answer, bool) or not 1 <= answer <= 4:
+        raise ValueError("answer must be 1-4, A-D or the text of an option")
+    return {"id": item_id(subject, question, options), "kind": "mcq", "subject": subject, "difficulty": difficulty,
+            "tags": tags, "question": question, "options": options, "answer": answer, "data": None}
+
+def read_pack(path, fmt=None):
+    # yields (line number, record) one at a time; fmt is "jsonl" or "csv" (default: extension)
+    import csv
+    fmt = fmt or ("csv" if path.lower().endswith(".csv") else "jsonl")
+    with open(path, encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            for lineno, row in enumerate(csv.DictReader(f), start=2):
+                yield lineno, row
+            return
+        for lineno, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield lineno, json.loads(line)
+            except ValueError as e:
+                yield lineno, ValueError(f"invalid JSON: {e}")
+
+class QuestionStore:
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS items (
+            id TEXT PRIMARY KEY, kind TEXT NOT NULL, subject TEXT NOT NULL, difficulty TEXT NOT NULL,
+            question TEXT NOT NULL, options TEXT, answer INTEGER, data TEXT, rnd INTEGER NOT NULL);
+        CREATE INDEX IF NOT EXISTS items_draw ON items (subject, kind, difficulty, rnd);
+        CREATE INDEX IF NOT EXISTS items_any ON items (subject, kind, rnd);
+        CREATE TABLE IF NOT EXISTS tags (tag TEXT NOT NULL, item_id TEXT NOT NULL, PRIMARY KEY (tag, item_id));
+        CREATE INDEX IF NOT EXISTS tags_item ON tags (item_id);
+    """
+
+    def __init__(self, path=None):
+        import sqlite3
+        self.path = path or QUESTION_DB
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")  # one fsync per batch instead of per journal swap
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(self.SCHEMA)
+        self.lock = threading.Lock()
+        self.bounds = {}  # filter -> (min rowid, max rowid), reset by every import
+
+    def close(self):
+        self.db.close()
+
+    def import_pack(self, path, fmt=None, batch=IMPORT_BATCH_SIZE):
+        # -> {"added", "duplicates", "rejected", "errors": [(line, message), ...]}
+        report = {"added": 0, "duplicates": 0, "rejected": 0, "errors": []}
+        rows, tag_rows = [], []
+        def flush():
+            with self.lock, self.db:
+                before = self.db.total_changes
+                self.db.executemany("INSERT OR IGNORE INTO items VALUES (?,?,?,?,?,?,?,?,?)", rows)
+                added = self.db.total_changes - before
+                self.db.executemany("INSERT OR IGNORE INTO tags VALUES (?,?)", tag_rows)
+                self.bounds.clear()
+            report["added"] += added
+            report["duplicates"] += len(rows) - added
+            rows.clear()
+            tag_rows.clear()
+        for lineno, rec in read_pack(path, fmt):
+            try:
+                if isinstance(rec, Exception):
+                    raise rec
+                item = validate_pack_item(rec)
+            except (ValueError, TypeError, AttributeError) as e:  # a bad record never aborts the import
+                report["rejected"] += 1
+                if len(report["errors"]) < IMPORT_MAX_ERRORS:
+                    report["errors"].append((lineno, str(e)))
+                continue
+            rows.append((item["id"], item["kind"], item["subject"], item["difficulty"], item["question"],
+                         json.dumps(item["options"]), item["answer"],
+                         json.dumps(item["data"]) if item["data"] else None, random.getrandbits(62)))
+            tag_rows.extend((t, item["id"]) for t in item["tags"])
+            if len(rows) >= batch:
+                flush()
+        if rows:
+            flush()
+        return report
+
+    def export_pack(self, path, subject=None, fmt=None):
+        # streams items back out in the format read_pack accepts; returns the number written
+        import csv
+        fmt = fmt or ("csv" if path.lower().endswith(".csv") else "jsonl")
+        sql = "SELECT id, kind, subject, difficulty, question, options, answer, data FROM items"
+        args = ()
+        if subject:
+            sql += " WHERE subject = ?"
+            args = (subject,)
+        written = 0
+        with self.lock:
+            cur = self.db.execute(sql, args)
+            tag_cur = self.db.cursor()
+            with open(path, "w", encoding="utf-8", newline="") as f:
+                writer = csv.DictWriter(f, PACK_CSV_FIELDS) if fmt == "csv" else None
+                if writer:
+                    writer.writeheader()
+                while True:
+                    batch = cur.fetchmany(IMPORT_BATCH_SIZE)
+                    if not batch:
+                        break
+                    for iid, kind, subj, diff, question, options, answer, data in batch:
+                        tags = [t for (t,) in tag_cur.execute("SELECT tag FROM tags WHERE item_id = ?", (iid,))]
+                        rec = {"type": kind, "subject": subj, "difficulty": diff, "tags": tags}
+                        if kind == "coding":
+                            rec.update(json.loads(data))
+                        else:
+                            rec.update(question=question, options=json.loads(options), answer=answer)
+                        if writer:
+                            row = dict(rec, tags=";".join(tags))
+                            if kind == "coding":
+                                row["tests"] = json.dumps(rec["tests"])
+                            else:
+                                del row["options"]
+                                row.update(zip(("option_a", "option_b", "option_c", "option_d"), rec["options"]))
+                            writer.writerow(row)
+                        else:
+                            f.write(json.dumps(rec) + "\n")
+                        written += 1
+        return written
+
+    def _filter(self, subject, kind, difficulty, tag):
+        where, args = ["subject = ?", "kind = ?"], [subject, kind]
+        if difficulty:
+            where.append("difficulty = ?")
+            args.append(difficulty)
+        if tag:
+            where.append("id IN (SELECT item_id FROM tags WHERE tag = ?)")
+            args.append(tag.lower())
+        return " AND ".join(where), args
+
+    def draw(self, subject, count=MCQ_COUNT, kind="mcq", difficulty=None, tag=None, rng=None):
+        # a uniform random sample of up to `count` items: random rowids between the filter's
+        # smallest and largest, rejecting misses and repeats (one primary-key seek each);
+        # sparse filters fall back to sampling the full list of matching rowids
+        rng = rng or random
+        where, args = self._filter(subject, kind, difficulty, tag)
+        cols = "id, difficulty, question, options, answer, data"
+        picked = {}
+        with self.lock:
+            key = (where, *args)
+            bounds = self.bounds.get(key)
+            if bounds is None:
+                bounds = self.bounds[key] = self.db.execute(
+                    f"SELECT MIN(rowid), MAX(rowid) FROM items WHERE {where}", args).fetchone()
+            lo, hi = bounds
+            if lo is None:
+                return []
+            for _ in range(count * DRAW_TRIES_PER_ITEM):
+                if len(picked) >= count:
+                    break
+                row = self.db.execute(f"SELECT {cols} FROM items WHERE rowid = ? AND {where}",
+                                      (rng.randint(lo, hi), *args)).fetchone()
+                if row is not None:
+                    picked[row[0]] = row
+            if len(picked) < count:
+                rest = [r for (r,) in self.db.execute(f"SELECT rowid FROM items WHERE {where}", args)]
+                for rowid in rng.sample(rest, len(rest)):
+                    if len(picked) >= count:
+                        break
+                    row = self.db.execute(f"SELECT {cols} FROM items WHERE rowid = ?", (rowid,)).fetchone()
+                    picked.setdefault(row[0], row)
+        rows = list(picked.values())
+        rng.shuffle(rows)
+        items = []
+        for iid, diff, question, options, answer, data in rows[:count]:
+            if kind == "coding":
+                items.append(dict(json.loads(data), id=iid, difficulty=diff))
+            else:
+                items.append({"id": iid, "question": f"{subject}: {question} ({diff})", "options": json.loads(options),
+                              "answer": answer, "difficulty": diff})
+        return items
+
+    def counts(self):
+        # {(subject, kind): n}
+        with self.lock:
+            return {(s, k): n for s, k, n in self.db.execute("SELECT subject, kind, COUNT(*) FROM items GROUP BY subject, kind")}
+
+_QUESTION_STORE = None
+
+def get_question_store(create=False):
+    # None until a pack has been imported, so plain start-ups never touch sqlite
+    global _QUESTION_STORE
+    if _QUESTION_STORE is None and (create or os.path.exists(QUESTION_DB)):
+        _QUESTION_STORE = QuestionStore()
+    return _QUESTION_STORE
+
+def draw_mcq_paper(subject, count=MCQ_COUNT, username=None):
+    # a pre-assembled cohort paper wins, then imported questions, then a shuffled generated paper
+    book = get_paper_book() if username else None
+    if book and book.subject == subject:
+        paper = book.paper(username)
+        if paper:
+            return apply_difficulty_overrides(paper)
+    store = get_question_store()
+    paper = apply_difficulty_overrides(store.draw(subject, count)) if store else []
+    if not paper:
+        paper = QUESTION_BANK.get(subject, [])
+        random.shuffle(paper)
+    return paper
+
+def draw_coding_set(subject, count=CODING_COUNT):
+    store = get_question_store()
+    problems = store.draw(subject, count, kind="coding") if store else []
+    return problems or CODING_BANK.get(subject, [])
+
+def pack_main(args):
+    store = get_question_store(create=True)
+    status = 0
+    for path in args.import_packs or ():
+        report = store.import_pack(path)
+        print(f"{path}: {report['added']} added, {report['duplicates']} duplicates, {report['rejected']} rejected")
+        for lineno, msg in report["errors"]:
+            print(f"  line {lineno}: {msg}")
+        status = status or (1 if report["rejected"] else 0)
+    if args.export_pack:
+        n = store.export_pack(args.export_pack, subject=args.subject)
+        print(f"{args.export_pack}: {n} items written")
+    return status
+
+# ----------------------------
+# Cohort papers: pre-assembled per candidate
+# ----------------------------
+# --cohort BLUEPRINT --roster FILE builds every candidate's paper ahead of the exam instead
+# of at the moment they click Start. A blueprint is JSON:
+#   {"title": "Midterm", "subject": "Python", "seed": 7, "sections": [
+#       {"subject": "Python", "difficulty": "Easy", "count": 10},
+#       {"subject": "Python", "template": "py_range", "count": 5}]}
+# Each section draws from a pool of imported items (template = pack tag) or generated ones
+# (template = MCQ family name, or "static"). Papers are seeded by (seed, username), so the
+# same roster and blueprint always give the same papers; question order and option order
+# are shuffled per candidate, the answer key follows the options, and no two candidates get
+# an identical paper. Chunks of the roster are assembled in a process pool.
+#
+# The output is one file that exam start opens with mmap:
+#   header | meta JSON | item offsets (Q) | item JSON blob | username hash table (QQ)
+#   | item numbers per paper (I, paper_len each) | option permutation per question (B)
+# so a candidate's paper is a hash probe plus two fixed-offset reads, however big the cohort.
+PAPERS_MAGIC = b"EXPAPER1"
+PAPERS_HEADER = "<8sIIIIQQQQQQ"  # magic, candidates, paper_len, items, slots, then section offsets
+OPTION_PERMS = list(itertools.permutations(range(4)))
+_COHORT_POOLS = None  # per-section item numbers, set in each assembler process
+
+def read_roster(path):
+    import csv
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        rows = [r for r in csv.reader(f) if r and r[0].strip() and not r[0].lstrip().startswith("#")]
+    col = 0
+    if rows and "username" in [c.strip().lower() for c in rows[0]]:
+        col = [c.strip().lower() for c in rows[0]].index("username")
+        rows = rows[1:]
+    names = [r[col].strip() for r in rows if len(r) > col and r[col].strip()]
+    return list(dict.fromkeys(names))  # first occurrence wins
+
+def load_blueprint(path):
+    with open(path, encoding="utf-8") as f:
+        bp = json.load(f)
+    sections = bp.get("sections")
+    if not sections:
+        raise ValueError("blueprint has no sections")
+    for n, sec in enumerate(sections, 1):
+        if sec.get("subject") not in SUBJECTS:
+            raise ValueError(f"section {n}: unknown subject {sec.get('subject')!r}")
+        if not isinstance(sec.get("count"), int) or sec["count"] < 1:
+            raise ValueError(f"section {n}: count must be a positive integer")
+        if sec.get("difficulty") and sec["difficulty"].capitalize() not in DIFFICULTIES:
+            raise ValueError(f"section {n}: difficulty must be one of {', '.join(DIFFICULTIES)}")
+    subjects = {sec["subject"] for sec in sections}
+    bp.setdefault("subject", subjects.pop() if len(subjects) == 1 else None)
+    if bp["subject"] not in SUBJECTS:
+        raise ValueError("a mixed-subject blueprint needs a \"subject\" to be served under")
+    bp.setdefault("title", f"{bp['subject']} cohort exam")
+    bp.setdefault("seed", BANK_SEED)
+    return bp
+
+def _section_pool(sec, seed, size):
+    difficulty = (sec.get("difficulty") or "").capitalize() or None
+    template = sec.get("template")
+    store = get_question_store()
+    items = store.draw(sec["subject"], size, difficulty=difficulty, tag=template,
+                       rng=random.Random(f"{seed}:{sec['subject']}")) if store else []
+    if not items:
+        items = [q for q in generate_mcqs_for(sec["subject"], size, seed=seed)
+                 if (not difficulty or q["difficulty"] == difficulty) and (not template or q["template"] == template)]
+    if len(items) < sec["count"]:
+        raise ValueError(f"only {len(items)} {sec['subject']} items match {sec}; cannot draw {sec['count']}")
+    return items
+
+def _init_assembler(pools):
+    global _COHORT_POOLS
+    _COHORT_POOLS = pools
+
+def _assemble_paper(username, sections, seed, salt=0):
+    # -> (item numbers, option permutation numbers), one each per question
+    rng = random.Random(f"{seed}:{username}:{salt}")
+    used = set()
+    numbers = []
+    for pool, count in zip(_COHORT_POOLS, (sec["count"] for sec in sections)):
+        picked = []
+        for _ in range(4 * len(pool)):
+            if len(picked) == count:
+                break
+            n = pool[rng.randrange(len(pool))]
+            if n not in used:
+                used.add(n)
+                picked.append(n)
+        else:
+            rest = [n for n in pool if n not in used]  # sections overlap heavily: sample what is left
+            if len(rest) < count - len(picked):
+                raise ValueError(f"overlapping sections leave too few items for {username!r}")
+            picked += rng.sample(rest, count - len(picked))
+            used.update(picked)
+        numbers += picked
+    return numbers, [rng.randrange(len(OPTION_PERMS)) for _ in numbers]
+
+def _assemble_chunk(usernames, sections, seed):
+    out = array("I")
+    perms = bytearray()
+    for name in usernames:
+        numbers, p = _assemble_paper(name, sections, seed)
+        out.extend(numbers)
+        perms += bytes(p)
+    return out.tobytes(), bytes(perms)
+
+def _username_hash(name):
+    import hashlib
+    return int.from_bytes(hashlib.blake2b(name.encode("utf-8"), digest_size=8).digest(), "little")
+
+def assemble_cohort(roster, blueprint, path, workers=None, pool_size=COHORT_POOL_SIZE):
+    import struct
+    from concurrent.futures import ProcessPoolExecutor
+    started = time.perf_counter()
+    sections, seed = blueprint["sections"], blueprint["seed"]
+    paper_len = sum(sec["count"] for sec in sections)
+    # one item table for the whole cohort; sections refer to it by number
+    items, numbers, pools = [], {}, []
+    for sec in sections:
+        pool = []
+        for q in _section_pool(sec, seed, max(pool_size, sec["count"])):
+            if q["id"] not in numbers:
+                numbers[q["id"]] = len(items)
+                items.append({k: q[k] for k in ("id", "question", "options", "answer", "difficulty")})
+            pool.append(numbers[q["id"]])
+        pools.append(pool)
+    chunks = [roster[i:i + COHORT_CHUNK] for i in range(0, len(roster), COHORT_CHUNK)]
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(min(workers, len(chunks)), initializer=_init_assembler, initargs=(pools,)) as ex:
+            parts = list(ex.map(_assemble_chunk, chunks, itertools.repeat(sections), itertools.repeat(seed)))
+    else:
+        _init_assembler(pools)
+        parts = [_assemble_chunk(chunk, sections, seed) for chunk in chunks]
+    papers = array("I")
+    perms = bytearray()
+    for a, p in parts:
+        papers.frombytes(a)
+        perms += p
+    # seeds differ per candidate, but tiny pools can still collide: reseed the later copy
+    _init_assembler(pools)
+    seen = {}
+    for idx, name in enumerate(roster):
+        lo, hi = idx * paper_len, (idx + 1) * paper_len
+        salt = 0
+        while (papers[lo:hi].tobytes() + perms[lo:hi]) in seen:
+            salt += 1
+            if salt > 50:
+                raise ValueError("the blueprint's pools are too small for one distinct paper per candidate")
+            numbers_, p = _assemble_paper(name, sections, seed, salt)
+            papers[lo:hi], perms[lo:hi] = array("I", numbers_), bytes(p)
+        seen[papers[lo:hi].tobytes() + perms[lo:hi]] = idx
+    # open-addressing table of (username hash, candidate number + 1); 0 marks an empty slot
+    slots = 1 << max(4, (2 * len(roster) - 1).bit_length())
+    table = array("Q", bytes(16 * slots))
+    for idx, name in enumerate(roster):
+        h = _username_hash(name)
+        s = h & (slots - 1)
+        while table[2 * s + 1]:
+            s = (s + 1) & (slots - 1)
+        table[2 * s], table[2 * s + 1] = h, idx + 1
+    meta = json.dumps({k: blueprint[k] for k in ("title", "subject", "seed", "sections")}).encode("utf-8")
+    blobs = [json.dumps(q, separators=(",", ":")).encode("utf-8") for q in items]
+    offsets = array("Q", itertools.accumulate((len(b) for b in blobs), initial=0))
+    header_size = struct.calcsize(PAPERS_HEADER)
+    meta_off = header_size
+    index_off = meta_off + len(meta)
+    index_off += -index_off % 8
+    blob_off = index_off + 8 * len(offsets)
+    table_off = blob_off + offsets[-1]
+    table_off += -table_off % 8
+    papers_off = table_off + 16 * slots
+    perms_off = papers_off + 4 * len(papers)
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(struct.pack(PAPERS_HEADER, PAPERS_MAGIC, len(roster), paper_len, len(items), slots,
+                            meta_off, index_off, blob_off, table_off, papers_off, perms_off))
+        f.write(meta)
+        f.write(bytes(index_off - f.tell()))
+        f.write(offsets.tobytes())
+        f.writelines(blobs)
+        f.write(bytes(table_off - f.tell()))
+        f.write(table.tobytes())
+        f.write(papers.tobytes())
+        f.write(perms)
+    os.replace(tmp, path)
+    return {"candidates": len(roster), "questions": paper_len, "items": len(items),
+            "bytes": os.path.getsize(path), "time": time.perf_counter() - started}
+
+class PaperBook:
+    def __init__(self, path):
+        import mmap, struct
+        self.path = path
+        with open(path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, self.candidates, self.paper_len, self.items, self.slots, meta_off, self.index_off,
+         self.blob_off, self.table_off, self.papers_off, self.perms_off) = struct.unpack_from(PAPERS_HEADER, self.mm)
+        if magic != PAPERS_MAGIC:
+            raise ValueError(f"{path} is not a paper file")
+        self.meta = json.loads(self.mm[meta_off:self.index_off].rstrip(b"\0"))
+        self.title = self.meta["title"]
+        self.subject = self.meta["subject"]
+        self.mtime = os.path.getmtime(path)
+
+    def _candidate(self, username):
+        import struct
+        h = _username_hash(username)
+        s = h & (self.slots - 1)
+        while True:
+            key, idx = struct.unpack_from("<QQ", self.mm, self.table_off + 16 * s)
+            if not idx:
+                return None
+            if key == h:
+                return idx - 1
+            s = (s + 1) & (self.slots - 1)
+
+    def __contains__(self, username):
+        return self._candidate(username) is not None
+
+    def __len__(self):
+        return self.candidates
+
+    def item(self, n):
+        import struct
+        lo, hi = struct.unpack_from("<QQ", self.mm, self.index_off + 8 * n)
+        return json.loads(self.mm[self.blob_off + lo:self.blob_off + hi])
+
+    def paper(self, username):
+        # the candidate's questions in order, options permuted and answers remapped; None if not on the roster
+        import struct
+        idx = self._candidate(username)
+        if idx is None:
+            return None
+        numbers = struct.unpack_from(f"<{self.paper_len}I", self.mm, self.papers_off + 4 * idx * self.paper_len)
+        start = self.perms_off + idx * self.paper_len
+        perms = self.mm[start:start + self.paper_len]
+        paper = []
+        for n, p in zip(numbers, perms):
+            q = self.item(n)
+            order = OPTION_PERMS[p]
+            q["options"] = [q["options"][i] for i in order]
+            q["answer"] = order.index(q["answer"] - 1) + 1
+            paper.append(q)
+        return paper
+
+_PAPER_BOOK = None
+
+def get_paper_book(path=None):
+    # the cohort paper file, reopened when --cohort rewrites it; None when there is none
+    global _PAPER_BOOK
+    path = path or PAPERS_FILE
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    if _PAPER_BOOK is None or _PAPER_BOOK.path != path or _PAPER_BOOK.mtime != mtime:
+        try:
+            _PAPER_BOOK = PaperBook(path)
+        except (OSError, ValueError):
+            return None
+    return _PAPER_BOOK
+
+def cohort_main(args):
+    try:
+        blueprint = load_blueprint(args.cohort)
+        if not args.roster:
+            raise ValueError("--cohort needs --roster FILE")
+        roster = read_roster(args.roster)
+        if not roster:
+            raise ValueError(f"{args.roster} lists no candidates")
+        if args.seed is not None:
+            blueprint["seed"] = args.seed
+        path = PAPERS_FILE
+        report = assemble_cohort(roster, blueprint, path)
+    except (OSError, ValueError) as e:
+        print(f"cohort: {e}", file=sys.stderr)
+        return 2
+    print(f"{path}: {report['candidates']} papers x {report['questions']} questions from {report['items']} items, "
+          f"{report['bytes'] / 1024:.0f} KiB in {report['time']:.2f}s")
+    return 0
+
+# ----------------------------
+# Instrumentation (off by default)
+# ----------------------------
+# Counters and latency histograms around the hot paths. While METRICS.enabled is false an
+# instrumented call costs one attribute check. --metrics PATH (or View > Diagnostics)
+# switches it on; MetricsExporter then writes a snapshot every METRICS_EXPORT_INTERVAL
+# seconds, either as Prometheus text (replaced in place, for a textfile collector) or as
+# one JSON line per snapshot.
+class Histogram:
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(METRICS_BUCKETS) + 1)  # last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(METRICS_BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        # linear interpolation inside the bucket that holds the q-th observation
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if c and seen + c >= rank:
+                lo = METRICS_BUCKETS[i - 1] if i else 0.0
+                hi = METRICS_BUCKETS[i] if i < len(METRICS_BUCKETS) else self.max
+                return min(self.max, lo + (hi - lo) * (rank - seen) / c)
+            seen += c
+        return self.max
+
+class Metrics:
+    def __init__(self):
+        self.enabled = False
+        self.counters = {}  # (name, labels) -> int
+        self.histograms = {}  # (name, labels) -> Histogram
+        self.lock = threading.Lock()
+
+    def inc(self, name, n=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def observe(self, name, seconds, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            h = self.histograms.get(key)
+            if h is None:
+                h = self.histograms[key] = Histogram()
+            h.observe(seconds)
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def snapshot(self):
+        # plain data: {"counters": [...], "histograms": [...]}, safe to hand to another thread
+        with self.lock:
+            counters = [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(self.counters.items())]
+            histograms = [{"name": n, "labels": dict(l), "count": h.count, "sum": h.sum, "max": h.max,
+                           "buckets": list(h.counts), "p50": h.quantile(0.5), "p95": h.quantile(0.95),
+                           "p99": h.quantile(0.99)}
+                          for (n, l), h in sorted(self.histograms.items())]
+        return {"time": time.time(), "counters": counters, "histograms": histograms}
+
+def _prom_labels(labels, **extra):
+    items = {**labels, **extra}
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{str(v)}"' for k, v in items.items()) + "}"
+
+def format_prometheus(snapshot):
+    lines = []
+    typed = set()
+    for c in snapshot["counters"]:
+        if c["name"] not in typed:
+            lines.append(f"# TYPE {c['name']} counter")
+            typed.add(c["name"])
+        lines.append(f"{c['name']}{_prom_labels(c['labels'])} {c['value']}")
+    for h in snapshot["histograms"]:
+        name = h["name"]
+        if name not in typed:
+            lines.append(f"# TYPE {name} histogram")
+            typed.add(name)
+        cumulative = 0
+        for bound, c in zip([*METRICS_BUCKETS, "+Inf"], h["buckets"]):
+            cumulative += c
+            lines.append(f"{name}_bucket{_prom_labels(h['labels'], le=bound)} {cumulative}")
+        lines.append(f"{name}_sum{_prom_labels(h['labels'])} {h['sum']:.6f}")
+        lines.append(f"{name}_count{_prom_labels(h['labels'])} {h['count']}")
+    return "\n".join(lines) + "\n"
+
+class MetricsExporter:
+    def __init__(self, path, fmt=None, interval=METRICS_EXPORT_INTERVAL, metrics=None):
+        self.path = path
+        self.fmt = fmt or ("prom" if path.endswith((".prom", ".txt")) else "jsonl")
+        self.interval = interval
+        self.metrics = metrics or METRICS
+        self.stop = threading.Event()
+        threading.Thread(target=self._loop, daemon=True).start()
+        atexit.register(self.close)
+
+    def _loop(self):
+        while not self.stop.wait(self.interval):
+            self.export()
+
+    def export(self):
+        snap = self.metrics.snapshot()
+        try:
+            folder = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(folder, exist_ok=True)
+            if self.fmt == "prom":
+                tmp = self.path + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    f.write(format_prometheus(snap))
+                os.replace(tmp, self.path)
+            else:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(snap) + "\n")
+        except OSError:
+            pass  # metrics must never break an exam
+
+    def close(self):
+        if not self.stop.is_set():
+            self.stop.set()
+            self.export()
+
+METRICS = Metrics()
+
+def timed(name, **labels):
+    # decorator: observe the wall time of every call in histogram `name` while METRICS is on
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not METRICS.enabled:
+                return fn(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                METRICS.observe(name, time.perf_counter() - started, **labels)
+        return wrapper
+    return deco
+
+# ----------------------------
+# Code execution: pre-warmed Python worker pool
+# ----------------------------
+# Workers are started once (`exam_portal.py --worker`), pre-import the modules candidates
+# usually need and then wait for jobs on a pipe (one JSON message per line). On POSIX every
+# job runs in a child forked from the warm worker, so each run starts from a clean state
+# without paying interpreter start-up again; the child gets the EXEC_LIMITS rlimits and its
+# CPU time, peak RSS and output size are reported back. Elsewhere the job runs inline and
+# the worker is recycled afterwards.
+WORKER_PRELOAD = ("collections", "itertools", "functools", "math", "heapq", "bisect",
+                  "re", "string", "json", "traceback", "linecache", "io")
+_WORKER_PROTO = None  # (proto_in, proto_out) inside a worker process
+
+def _send_message(stream, msg):
+    stream.write(json.dumps(msg).encode("utf-8") + b"\n")
+    stream.flush()
+
+def _stdin_untouched():
+    try:
+        return sys.stdin.tell() == 0
+    except (OSError, ValueError, AttributeError):
+        return False
+
+def _exec_candidate(code, entry=None, filename="<candidate>"):
+    import linecache, traceback  # preloaded in workers
+    # make tracebacks show the candidate's own source lines
+    linecache.cache[filename] = (len(code), None, code.splitlines(True), filename)
+    status = 0
+    glb = {"__name__": "__main__"}
+    try:
+        exec(compile(code, filename, "exec"), glb)
+        # judge convention: call solve() when the program defines it but never read its input
+        if entry and callable(glb.get(entry)) and _stdin_untouched():
+            glb[entry]()
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            status = e.code or 0
+        else:
+            print(e.code, file=sys.stderr)
+            status = 1
+    except BaseException as e:
+        # drop our own frame so the candidate only sees their code in the traceback
+        traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+        status = 1
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        except Exception:
+            pass
+    return status
+
+def _apply_limits(limits):
+    if resource is None:
+        return
+    # CPU gets one second of slack on the hard limit so SIGXCPU fires before SIGKILL
+    for name, key, slack in (("RLIMIT_CPU", "cpu", 1), ("RLIMIT_AS", "memory", 0), ("RLIMIT_NOFILE", "nofile", 0)):
+        lim = limits.get(key)
+        if not lim or not hasattr(resource, name):
+            continue
+        rl = getattr(resource, name)
+        lim = int(math.ceil(lim))
+        _, hard = resource.getrlimit(rl)
+        new_hard = lim + slack if hard == resource.RLIM_INFINITY else min(hard, lim + slack)
+        try:
+            resource.setrlimit(rl, (min(lim, new_hard), new_hard))
+        except (ValueError, OSError):
+            pass
+
+def _limit_hit(limits, returncode, usage, stderr, output_over, timed_out):
+    if output_over:
+        return "output"
+    if timed_out:
+        return None
+    if hasattr(signal, "SIGXCPU") and returncode == -signal.SIGXCPU:
+        return "cpu"
+    if limits.get("cpu") and returncode == -signal.SIGKILL and usage["cpu_time"] >= limits["cpu"]:
+        return "cpu"
+    if returncode != 0 and ("MemoryError" in stderr[-2000:] or "java.lang.OutOfMemoryError" in stderr[-2000:]):
+        return "memory"
+    # compiled programs just crash when malloc returns NULL: judge by how close they got to the cap
+    if returncode != 0 and limits.get("memory") and usage["max_rss_kb"] * 1024 >= MEMORY_LIMIT_NEAR * limits["memory"]:
+        return "memory"
+    if returncode != 0 and "Too many open files" in stderr[-2000:]:
+        return "nofile"
+    return None
+
+def format_usage(usage):
+    rss = usage.get("max_rss_kb", 0)
+    out = usage.get("output_bytes", 0)
+    return f"CPU {usage.get('cpu_time', 0.0)*1000:.0f} ms | Peak RSS {rss/1024:.1f} MB | Output {out} B"
+
+def _run_forked(job):
+    import codecs, selectors, tempfile
+    timeout = job.get("timeout", PY_EXEC_TIMEOUT)
+    limits = dict(EXEC_LIMITS, **(job.get("limits") or {}))
+    max_output = limits.get("output") or 0
+    stdin_file = tempfile.TemporaryFile()
+    stdin_file.write(job.get("stdin", "").encode("utf-8"))
+    stdin_file.seek(0)
+    out_r, out_w = os.pipe()
+    err_r, err_w = os.pipe()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    started = time.perf_counter()
+    pid = os.fork()
+    spawned = time.perf_counter()
+    if pid == 0:
+        status = 1
+        try:
+            os.setsid()  # own process group, so a timeout also kills anything it spawns
+            for f in _WORKER_PROTO:
+                f.close()
+            os.close(out_r)
+            os.close(err_r)
+            os.dup2(stdin_file.fileno(), 0)
+            os.dup2(out_w, 1)
+            os.dup2(err_w, 2)
+            sys.stdin = open(0, "r", encoding="utf-8", closefd=False)  # fd 0 is now a seekable file
+            _apply_limits(limits)
+            if job.get("argv"):
+                try:
+                    os.execv(job["argv"][0], job["argv"])  # a compiled program (see run_program)
+                except OSError as e:
+                    os.write(2, f"cannot start program: {e}\n".encode())
+                    status = 127
+            else:
+                status = _exec_candidate(job["code"], job.get("entry"))
+        finally:
+            os._exit(status & 0xff)
+    os.close(out_w)
+    os.close(err_w)
+    stdin_file.close()
+    chunks = {out_r: [], err_r: []}
+    written = 0
+    # streaming: forward output as "chunk" messages, coalesced to one per STREAM_FLUSH_INTERVAL
+    stream = job.get("stream", False)
+    names = {out_r: "stdout", err_r: "stderr"}
+    decoders = {fd: codecs.getincrementaldecoder("utf-8")("replace") for fd in chunks}
+    pending = {fd: [] for fd in chunks}
+    err_tail = bytearray()  # streamed stderr is not kept, but _limit_hit needs its end
+    pending_bytes = 0
+    last_flush = started
+    def flush(final=False):
+        for fd, parts in pending.items():
+            text = decoders[fd].decode(b"".join(parts), final)
+            parts.clear()
+            if text:
+                _send_message(_WORKER_PROTO[1], {"type": "chunk", "id": job.get("id"), "stream": names[fd], "data": text})
+    sel = selectors.DefaultSelector()
+    for fd in chunks:
+        sel.register(fd, selectors.EVENT_READ)
+    timed_out = output_over = False
+    while sel.get_map() and not output_over:
+        remaining = started + timeout - time.perf_counter()
+        if remaining <= 0:
+            timed_out = True
+            break
+        for key, _ in sel.select(min(remaining, STREAM_FLUSH_INTERVAL) if stream else remaining):
+            data = os.read(key.fd, 65536)
+            if not data:
+                sel.unregister(key.fd)
+                continue
+            if max_output and written + len(data) > max_output:
+                data = data[:max_output - written]
+                output_over = True
+            (pending if stream else chunks)[key.fd].append(data)
+            if stream and key.fd == err_r:
+                err_tail += data
+                del err_tail[:-STDERR_TAIL_BYTES]
+            written += len(data)
+            pending_bytes += len(data)
+            if output_over:
+                break
+        now = time.perf_counter()
+        if stream and pending_bytes and (now - last_flush >= STREAM_FLUSH_INTERVAL or pending_bytes >= STREAM_CHUNK_BYTES):
+            flush()
+            pending_bytes = 0
+            last_flush = now
+    sel.close()
+    if stream:
+        flush(final=True)
+    if timed_out or output_over:
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except OSError:
+            pass
+    _, status, ru = os.wait4(pid, 0)
+    elapsed = time.perf_counter() - started
+    os.close(out_r)
+    os.close(err_r)
+    # ru_maxrss is KiB on Linux but bytes on macOS
+    rss_kb = ru.ru_maxrss // 1024 if sys.platform == "darwin" else ru.ru_maxrss
+    usage = {"cpu_time": ru.ru_utime + ru.ru_stime, "max_rss_kb": rss_kb, "output_bytes": written}
+    returncode = os.waitstatus_to_exitcode(status)
+    stderr = b"".join(chunks[err_r]).decode("utf-8", "replace")
+    tail = err_tail.decode("utf-8", "replace") if stream else stderr
+    return {
+        "stdout": b"".join(chunks[out_r]).decode("utf-8", "replace"),
+        "stderr": stderr,
+        "returncode": returncode,
+        "timed_out": timed_out,
+        "elapsed": elapsed,
+        "spawn": spawned - started,
+        "usage": usage,
+        "limit_exceeded": _limit_hit(limits, returncode, usage, tail, output_over, timed_out),
+    }
+
+def _run_process_inline(job):
+    # no fork available and the job is a compiled program: a plain child process
+    import subprocess
+    started = time.perf_counter()
+    timed_out = False
+    try:
+        proc = subprocess.run(job["argv"], input=job.get("stdin", "").encode("utf-8"), capture_output=True,
+                              timeout=job.get("timeout", PY_EXEC_TIMEOUT))
+        stdout, stderr, status = proc.stdout, proc.stderr, proc.returncode
+    except subprocess.TimeoutExpired as e:
+        stdout, stderr, status, timed_out = e.stdout or b"", e.stderr or b"", None, True
+    except OSError as e:
+        stdout, stderr, status = b"", f"cannot start program: {e}\n".encode(), 127
+    max_output = dict(EXEC_LIMITS, **(job.get("limits") or {})).get("output") or 0
+    output_over = bool(max_output) and len(stdout) + len(stderr) > max_output
+    if max_output:
+        stdout = stdout[:max_output]
+        stderr = stderr[:max(0, max_output - len(stdout))]
+    written = len(stdout) + len(stderr)  # bytes kept, like _run_forked
+    stdout, stderr = stdout.decode("utf-8", "replace"), stderr.decode("utf-8", "replace")
+    if job.get("stream"):
+        for name, text in (("stdout", stdout), ("stderr", stderr)):
+            if text:
+                _send_message(_WORKER_PROTO[1], {"type": "chunk", "id": job.get("id"), "stream": name, "data": text})
+        stdout = stderr = ""
+    return {
+        "stdout": stdout,
+        "stderr": stderr,
+        "returncode": status,
+        "timed_out": timed_out,
+        "elapsed": time.perf_counter() - started,
+        "usage": {"cpu_time": 0.0, "max_rss_kb": 0, "output_bytes": written},
+        "limit_exceeded": "output" if output_over else None,
+    }
+
+def _run_inline(job):
+    # no fork available: run in this interpreter and ask the pool to recycle us afterwards;
+    # rlimits cannot be applied here, so only CPU time and output size are measured
+    if job.get("argv"):
+        return _run_process_inline(job)
+    import io
+    out, err = io.StringIO(), io.StringIO()
+    saved = sys.stdin, sys.stdout, sys.stderr
+    sys.stdin, sys.stdout, sys.stderr = io.StringIO(job.get("stdin", "")), out, err
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    try:
+        status = _exec_candidate(job["code"], job.get("entry"))
+    finally:
+        sys.stdin, sys.stdout, sys.stderr = saved
+    stdout, stderr = out.getvalue(), err.getvalue()
+    written = len(stdout.encode("utf-8")) + len(stderr.encode("utf-8"))
+    if job.get("stream"):
+        for name, text in (("stdout", stdout), ("stderr", stderr)):
+            if text:
+                _send_message(_WORKER_PROTO[1], {"type": "chunk", "id": job.get("id"), "stream": name, "data": text})
+        stdout = stderr = ""
+    return {
+        "stdout": stdout,
+        "stderr": stderr,
+        "returncode": status,
+        "timed_out": False,
+        "elapsed": time.perf_counter() - started,
+        "usage": {"cpu_time": time.process_time() - cpu_started, "max_rss_kb": 0, "output_bytes": written},
+        "limit_exceeded": None,
+        "recycle": True,
+    }
+
+def worker_main():
+    global _WORKER_PROTO
+    # keep private copies of the protocol pipes and point fds 0/1 at devnull,
+    # so nothing the candidate prints can corrupt the message stream
+    proto_in = os.fdopen(os.dup(0), "rb")
+    proto_out = os.fdopen(os.dup(1), "wb")
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+    _WORKER_PROTO = (proto_in, proto_out)
+    for name in WORKER_PRELOAD:
+        __import__(name)
+    _send_message(proto_out, {"type": "ready", "pid": os.getpid()})
+    run_job = _run_forked if hasattr(os, "fork") else _run_inline
+    for line in proto_in:
+        try:
+            job = json.loads(line)
+        except ValueError:
+            continue
+        result = run_job(job)
+        result.update(type="done", id=job.get("id"))
+        _send_message(proto_out, result)
+
+class _PoolWorker:
+    def __init__(self):
+        import subprocess
+        # a fixed hash seed keeps set/dict ordering of candidate output reproducible (see ResultCache)
+        env = dict(os.environ, PYTHONHASHSEED=os.environ.get("PYTHONHASHSEED", "0"))
+        self.proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--worker"],
+                                     stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                     stderr=subprocess.DEVNULL, env=env)
+        self.inbox = queue.Queue()
+        self.jobs = 0
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self):
+        for line in self.proc.stdout:
+            try:
+                self.inbox.put(json.loads(line))
+            except ValueError:
+                continue
+        self.inbox.put({"type": "eof"})
+
+    def send(self, msg):
+        _send_message(self.proc.stdin, msg)
+
+    def wait(self, timeout):
+        try:
+            return self.inbox.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def execute(self, job, on_output=None):
+        parts = {"stdout": [], "stderr": []}
+        deadline = time.perf_counter() + job["timeout"] + WORKER_GRACE
+        try:
+            self.send(job)
+            while True:
+                msg = self.wait(max(0.0, deadline - time.perf_counter()))
+                if not msg or msg.get("type") != "chunk":
+                    break
+                parts[msg["stream"]].append(msg["data"])
+                if on_output:
+                    on_output(msg["stream"], msg["data"])
+        except OSError:
+            msg = {"type": "eof"}
+        if msg is None or msg.get("type") != "done":
+            # the worker missed its deadline or died
+            timed_out = msg is None
+            return {
+                "stdout": "".join(parts["stdout"]),
+                "stderr": "".join(parts["stderr"]) + ("" if timed_out else "Worker process crashed.\n"),
+                "returncode": None,
+                "timed_out": timed_out,
+                "elapsed": job["timeout"] if timed_out else 0.0,
+                "usage": {"cpu_time": 0.0, "max_rss_kb": 0, "output_bytes": 0},
+                "limit_exceeded": None,
+                "lost": True,
+            }
+        msg.pop("type", None)
+        msg.pop("id", None)
+        if job.get("stream"):
+            msg["stdout"] = "".join(parts["stdout"])
+            msg["stderr"] = "".join(parts["stderr"])
+        return msg
+
+    def kill(self):
+        try:
+            self.proc.kill()
+            self.proc.wait(timeout=2)
+        except Exception:
+            pass
+
+class PythonWorkerPool:
+    def __init__(self, size=PY_POOL_SIZE):
+        self.size = size
+        self.idle = queue.Queue()
+        self._ids = itertools.count(1)
+        self._closed = False
+        self._all = set()
+        self._lock = threading.Lock()
+        for _ in range(size):
+            self._spawn_async()
+
+    def _spawn_async(self):
+        threading.Thread(target=self._spawn, daemon=True).start()
+
+    def _spawn(self):
+        if self._closed:
+            return
+        try:
+            w = _PoolWorker()
+        except OSError:
+            return
+        with self._lock:
+            self._all.add(w)
+        msg = w.wait(WORKER_START_TIMEOUT)
+        if msg and msg.get("type") == "ready" and not self._closed:
+            self.idle.put(w)
+        else:
+            self._retire(w, respawn=False)
+
+    def _retire(self, w, respawn=True):
+        w.kill()
+        with self._lock:
+            self._all.discard(w)
+        if respawn:
+            self._spawn_async()
+
+    def run(self, code, stdin="", timeout=PY_EXEC_TIMEOUT, entry=None, limits=None, on_output=None, argv=None,
+            deadline=None):
+        # with a deadline, waiting for an idle worker counts against the run's time budget
+        queued = time.perf_counter()
+        wait = WORKER_START_TIMEOUT if deadline is None else max(0.0, min(WORKER_START_TIMEOUT, deadline - queued))
+        try:
+            w = self.idle.get(timeout=wait)
+        except queue.Empty:
+            METRICS.inc("exam_runs_total", outcome="no_worker")
+            if deadline is not None and time.perf_counter() >= deadline:
+                raise TimeoutError("time budget ran out waiting for a Python worker")
+            raise RuntimeError("no Python worker became available")
+        started = time.perf_counter()
+        METRICS.observe("exam_run_queue_wait_seconds", started - queued)
+        if deadline is not None:
+            timeout = min(timeout, deadline - started)
+            if timeout <= 0:
+                self.idle.put(w)
+                raise TimeoutError("time budget ran out waiting for a Python worker")
+        res = w.execute({"id": next(self._ids), "code": code, "stdin": stdin, "timeout": timeout, "entry": entry,
+                         "limits": limits, "argv": argv, "stream": on_output is not None}, on_output)
+        w.jobs += 1
+        lost = res.pop("lost", False)
+        if METRICS.enabled:
+            if "spawn" in res:
+                METRICS.observe("exam_run_spawn_seconds", res["spawn"])
+            if not lost:
+                METRICS.observe("exam_run_exec_seconds", res["elapsed"])
+            METRICS.inc("exam_runs_total", outcome="lost" if lost else "timeout" if res["timed_out"]
+                        else "limit" if res.get("limit_exceeded") else "ok" if res["returncode"] == 0 else "error")
+        # a child that hit its timeout was already killed by the worker; only replace
+        # workers that stopped answering, crashed, asked for it or reached their job quota
+        if res.pop("recycle", False) or lost or w.jobs >= PY_WORKER_MAX_JOBS:
+            self._retire(w)
+        else:
+            self.idle.put(w)
+        return res
+
+    def close(self):
+        self._closed = True
+        with self._lock:
+            workers = list(self._all)
+            self._all.clear()
+        for w in workers:
+            w.kill()
+
+_WORKER_POOL = None
+_WORKER_POOL_LOCK = threading.Lock()
+
+def get_worker_pool():
+    global _WORKER_POOL
+    with _WORKER_POOL_LOCK:
+        if _WORKER_POOL is None:
+            _WORKER_POOL = PythonWorkerPool()
+            atexit.register(_WORKER_POOL.close)
+        return _WORKER_POOL
+
+def run_python_cold(code, stdin="", timeout=PY_EXEC_TIMEOUT, entry=None, limits=None, on_output=None, argv=None):
+    # fallback when the pool has no free worker: a throwaway worker for this one run
+    w = _PoolWorker()
+    try:
+        msg = w.wait(WORKER_START_TIMEOUT)
+        if not msg or msg.get("type") != "ready":
+            raise RuntimeError("Python worker failed to start")
+        res = w.execute({"id": 0, "code": code, "stdin": stdin, "timeout": timeout, "entry": entry,
+                         "limits": limits, "argv": argv, "stream": on_output is not None}, on_output)
+        res.pop("lost", None)
+        res.pop("recycle", None)
+        return res
+    finally:
+        w.kill()
+
+def run_python(code, stdin="", timeout=PY_EXEC_TIMEOUT, entry=None, limits=None, on_output=None, deadline=None):
+    # on_output(stream, text) is called from the calling thread as output arrives
+    try:
+        return get_worker_pool().run(code, stdin=stdin, timeout=timeout, entry=entry, limits=limits, on_output=on_output,
+                                     deadline=deadline)
+    except RuntimeError:
+        return run_python_cold(code, stdin=stdin, timeout=timeout, entry=entry, limits=limits, on_output=on_output)
+
+def total_usage(usages):
+    total = {"cpu_time": 0.0, "max_rss_kb": 0, "output_bytes": 0}
+    for u in usages:
+        total["cpu_time"] += u.get("cpu_time", 0.0)
+        total["max_rss_kb"] = max(total["max_rss_kb"], u.get("max_rss_kb", 0))
+        total["output_bytes"] += u.get("output_bytes", 0)
+    return total
+
+# ----------------------------
+# Compiled languages: C (gcc) and Java (javac)
+# ----------------------------
+# A submission is built once per distinct (toolchain version, build command, source) and
+# the artifact is kept in COMPILE_CACHE_DIR under that content hash, so running unchanged
+# code again goes straight to execution. Builds are throttled to COMPILE_CONCURRENCY, and
+# concurrent requests for the same key (say every test case of one problem) wait for the
+# single build in flight. Failed builds are cached too, with their diagnostics. The
+# program itself runs on the worker pool like Python code, under the same timeout, limits
+# and output streaming.
+COMPILERS = {
+    "C": {"compiler": "gcc", "source": "main.c",
+          "build": ["{compiler}", "-O2", "-std=c11", "-pipe", "-o", "{out}/main", "{src}", "-lm"],
+          "run": ["{out}/main"]},
+    "Java": {"compiler": "javac", "runtime": "java", "source": "Main.java",
+             "build": ["{compiler}", "-encoding", "UTF-8", "-d", "{out}", "{src}"],
+             "run": ["{runtime}", "-Xmx{heap_mb}m", "-XX:MaxMetaspaceSize={meta_mb}m", "-Xss16m", "-XX:+UseSerialGC",
+                     "-XX:TieredStopAtLevel=1", "-cp", "{out}", "Main"],
+             # the JVM reserves far more address space than it uses, so RLIMIT_AS is replaced by
+             # heap and metaspace caps carved out of EXEC_LIMITS["memory"]; it also opens its own jars
+             "limits": {"memory": None, "nofile": 1024}},
+}
+_COMPILE_LOCK = threading.Lock()
+_COMPILE_SLOTS = threading.BoundedSemaphore(COMPILE_CONCURRENCY)
+_COMPILE_INFLIGHT = {}  # key -> Future of the build in progress
+
+@lru_cache(maxsize=None)
+def toolchain(language):
+    # {"compiler", "runtime", "version"} or None when the tools are not installed
+    import shutil, subprocess
+    spec = COMPILERS.get(language)
+    if spec is None:
+        return None
+    compiler = shutil.which(spec["compiler"])
+    runtime = shutil.which(spec["runtime"]) if spec.get("runtime") else ""
+    if not compiler or runtime is None:
+        return None
+    try:
+        proc = subprocess.run([compiler, "--version"], capture_output=True, text=True, timeout=10)
+        version = ((proc.stdout or proc.stderr).strip().splitlines() or [""])[0]
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return {"compiler": compiler, "runtime": runtime, "version": version}
+
+def can_execute(language):
+    return language == "Python" or toolchain(language) is not None
+
+def compile_key(language, code):
+    import hashlib
+    h = hashlib.sha256()
+    for part in (language, toolchain(language)["version"], *COMPILERS[language]["build"], code):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()[:32]
+
+def _cached_build(target):
+    if os.path.isdir(target):
+        os.utime(target)  # keeps recently used builds out of the pruning
+        try:
+            with open(os.path.join(target, "diagnostics.txt"), encoding="utf-8") as f:
+                diagnostics = f.read()
+        except OSError:
+            diagnostics = ""
+        return {"ok": True, "artifact": target, "diagnostics": diagnostics, "cached": True, "time": 0.0}
+    try:
+        with open(target + ".err", encoding="utf-8") as f:
+            return {"ok": False, "artifact": None, "diagnostics": f.read(), "cached": True, "time": 0.0}
+    except OSError:
+        return None
+
+def _prune_builds():
+    import shutil
+    # finished builds are "<key>" dirs and "<key>.err" files; "<key>.<random>" is a build in progress
+    entries = [e for e in os.scandir(COMPILE_CACHE_DIR) if "." not in e.name or e.name.endswith(".err")]
+    entries.sort(key=lambda e: e.stat().st_mtime)
+    for e in entries[:max(0, len(entries) - COMPILE_CACHE_ENTRIES)]:
+        try:
+            shutil.rmtree(e.path) if e.is_dir() else os.remove(e.path)
+        except OSError:
+            pass
+
+def _build(language, code, tools, target):
+    import shutil, subprocess, tempfile
+    spec = COMPILERS[language]
+    with _COMPILE_SLOTS:
+        started = time.perf_counter()
+        tmp = tempfile.mkdtemp(prefix=os.path.basename(target) + ".", dir=COMPILE_CACHE_DIR)
+        try:
+            src = os.path.join(tmp, spec["source"])
+            with open(src, "w", encoding="utf-8") as f:
+                f.write(code)
+            cmd = [a.format(compiler=tools["compiler"], out=tmp, src=src) for a in spec["build"]]
+            try:
+                proc = subprocess.run(cmd, capture_output=True, text=True, timeout=COMPILE_TIMEOUT, cwd=tmp)
+            except subprocess.TimeoutExpired:
+                # not cached: a slow build may just mean a busy machine
+                return {"ok": False, "artifact": None, "cached": False, "time": time.perf_counter() - started,
+                        "diagnostics": f"Compilation timed out after {COMPILE_TIMEOUT} s.\n"}
+            diagnostics = (proc.stdout + proc.stderr).replace(tmp + os.sep, "")[:OUTPUT_PANE_LIMIT]
+            elapsed = time.perf_counter() - started
+            if proc.returncode != 0:
+                with open(tmp + ".err", "w", encoding="utf-8") as f:
+                    f.write(diagnostics or f"{spec['compiler']} exited with status {proc.returncode}\n")
+                os.replace(tmp + ".err", target + ".err")
+                return {"ok": False, "artifact": None, "diagnostics": diagnostics, "cached": False, "time": elapsed}
+            with open(os.path.join(tmp, "diagnostics.txt"), "w", encoding="utf-8") as f:
+                f.write(diagnostics)
+            try:
+                os.rename(tmp, target)
+            except OSError:
+                pass  # another process finished the same build first; use theirs
+            _prune_builds()
+            return {"ok": True, "artifact": target, "diagnostics": diagnostics, "cached": False, "time": elapsed}
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+def compile_source(language, code):
+    # -> {"ok", "artifact", "diagnostics", "cached", "time"}
+    from concurrent.futures import Future
+    tools = toolchain(language)
+    if tools is None:
+        return {"ok": False, "artifact": None, "cached": False, "time": 0.0,
+                "diagnostics": f"{COMPILERS[language]['compiler']} is not installed on this machine.\n"}
+    os.makedirs(COMPILE_CACHE_DIR, exist_ok=True)
+    key = compile_key(language, code)
+    target = os.path.join(COMPILE_CACHE_DIR, key)
+    hit = _cached_build(target)
+    if hit:
+        METRICS.inc("exam_compile_total", language=language, result="hit")
+        return hit
+    with _COMPILE_LOCK:
+        fut = _COMPILE_INFLIGHT.get(key)
+        owner = fut is None
+        if owner:
+            fut = _COMPILE_INFLIGHT[key] = Future()
+    if not owner:
+        METRICS.inc("exam_compile_total", language=language, result="shared")
+        return dict(fut.result(), cached=True)
+    try:
+        res = _cached_build(target) or _build(language, code, tools, target)
+        fut.set_result(res)
+    except BaseException as e:
+        fut.set_exception(e)
+        raise
+    finally:
+        with _COMPILE_LOCK:
+            _COMPILE_INFLIGHT.pop(key, None)
+    METRICS.inc("exam_compile_total", language=language, result="built")
+    METRICS.observe("exam_compile_seconds", res["time"], language=language)
+    return res
+
+def run_executable(argv, stdin="", timeout=PY_EXEC_TIMEOUT, limits=None, on_output=None, deadline=None):
+    try:
+        return get_worker_pool().run("", stdin=stdin, timeout=timeout, limits=limits, on_output=on_output, argv=argv,
+                                     deadline=deadline)
+    except RuntimeError:
+        return run_python_cold("", stdin=stdin, timeout=timeout, limits=limits, on_output=on_output, argv=argv)
+
+def _execute_program(language, code, stdin, timeout, entry, limits, on_output, deadline=None):
+    if language == "Python":
+        return run_python(code, stdin=stdin, timeout=timeout, entry=entry, limits=limits, on_output=on_output,
+                          deadline=deadline)
+    build = compile_source(language, code)
+    info = {"ok": build["ok"], "cached": build["cached"], "time": build["time"]}
+    if not build["ok"]:
+        return {"stdout": "", "stderr": build["diagnostics"], "returncode": None, "timed_out": False, "elapsed": 0.0,
+                "usage": {"cpu_time": 0.0, "max_rss_kb": 0, "output_bytes": 0}, "limit_exceeded": None, "compile": info}
+    spec = COMPILERS[language]
+    memory_mb = (dict(EXEC_LIMITS, **(limits or {})).get("memory") or EXEC_LIMITS["memory"]) // (1024 * 1024)
+    argv = [a.format(out=build["artifact"], runtime=toolchain(language)["runtime"],
+                     heap_mb=max(16, memory_mb * 3 // 4), meta_mb=max(16, memory_mb // 8)) for a in spec["run"]]
+    res = run_executable(argv, stdin=stdin, timeout=timeout, limits=dict(spec.get("limits") or {}, **(limits or {})),
+                         on_output=on_output, deadline=deadline)
+    res["compile"] = info
+    return res
+
+# ----------------------------
+# Result cache for repeated runs
+# ----------------------------
+# Candidates press Run again and again on unchanged code, and resubmits are judged case by
+# case all over. A run whose output depends only on its inputs is kept under a hash of
+# (language, interpreter/toolchain version, source, stdin, entry, limits): at most
+# RESULT_CACHE_SIZE results / RESULT_CACHE_BYTES of output in memory, least recently used
+# first out, plus an optional on-disk tier (--run-cache DIR) that survives restarts and is
+# shared by every process pointed at it. Only runs that exited on their own within the
+# limits are stored, and only for code that stays away from clocks, randomness, threads,
+# the environment and the file system (NONDETERMINISTIC); workers run with a fixed
+# PYTHONHASHSEED so set and dict ordering is reproducible.
+NONDETERMINISTIC = {
+    "Python": r"\b(random|time|datetime|secrets|uuid|os|threading|multiprocessing|concurrent|asyncio|subprocess|"
+              r"socket|signal|tempfile|open|id|eval|exec|__import__|importlib|getattr|globals|vars|__builtins__)\b",
+    "C": r"\b(time|clock|clock_gettime|gettimeofday|getpid|getenv|fopen|open|pthread_create|fork|system|popen|"
+         r"getrandom|urandom|environ|__TIME__|__DATE__)\b",
+    "Java": r"\b(Random|ThreadLocalRandom|SecureRandom|random|currentTimeMillis|nanoTime|Instant|LocalDate|"
+            r"LocalDateTime|UUID|Thread|ExecutorService|parallelStream|getenv|File|Files|identityHashCode)\b",
+}
+
+def is_deterministic(language, code):
+    import re
+    pattern = NONDETERMINISTIC.get(language)
+    return pattern is not None and re.search(pattern, code) is None
+
+def run_key(language, code, stdin="", entry=None, limits=None):
+    import hashlib
+    spec = COMPILERS.get(language, {})
+    version = sys.version if language == "Python" else toolchain(language)["version"]
+    effective = dict(EXEC_LIMITS)
+    effective.update(spec.get("limits") or {})
+    effective.update(limits or {})
+    parts = [language, version, spec.get("build"), spec.get("run"), code, stdin,
+             entry if language == "Python" else None, sorted(effective.items())]
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+class ResultCache:
+    def __init__(self, size=RESULT_CACHE_SIZE, max_bytes=RESULT_CACHE_BYTES, folder=None,
+                 disk_entries=RESULT_CACHE_DISK_ENTRIES):
+        from collections import OrderedDict
+        self.size = size
+        self.max_bytes = max_bytes
+        self.folder = folder
+        self.disk_entries = disk_entries
+        self.entries = OrderedDict()  # key -> (result, output bytes), oldest first
+        self.bytes = 0
+        self.disk_writes = 0
+        self.lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.folder, key[:2], key + ".json")
+
+    def _remember(self, key, res):
+        weight = len(res["stdout"]) + len(res["stderr"])
+        if weight > self.max_bytes // 8:
+            return  # one huge output would flush everything else
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old:
+                self.bytes -= old[1]
+            self.entries[key] = (res, weight)
+            self.bytes += weight
+            while self.entries and (len(self.entries) > self.size or self.bytes > self.max_bytes):
+                _, (_, w) = self.entries.popitem(last=False)
+                self.bytes -= w
+
+    def get(self, key):
+        with self.lock:
+            hit = self.entries.get(key)
+            if hit:
+                self.entries.move_to_end(key)
+                return hit[0]
+        if not self.folder:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                res = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        self._remember(key, res)
+        return res
+
+    def put(self, key, res):
+        self._remember(key, res)
+        if not self.folder:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(res, f)
+            os.replace(tmp, path)
+        except OSError:
+            return  # the memory tier still has it
+        self.disk_writes += 1
+        if self.disk_writes % 256 == 0:
+            self.prune_disk()
+
+    def prune_disk(self):
+        entries = []
+        for shard in os.scandir(self.folder):
+            if shard.is_dir():
+                entries.extend(e for e in os.scandir(shard.path) if e.name.endswith(".json"))
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for e in entries[:max(0, len(entries) - self.disk_entries)]:
+            try:
+                os.remove(e.path)
+            except OSError:
+                pass
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+RESULT_CACHE = ResultCache()
+
+def run_program(language, code, stdin="", timeout=PY_EXEC_TIMEOUT, entry=None, limits=None, on_output=None,
+                deadline=None):
+    # one entry point for every executable subject; `entry` only applies to Python. A
+    # deadline (perf_counter) also bounds the wait for a free worker, see PythonWorkerPool.run
+    key = None
+    if RESULT_CACHE.size and is_deterministic(language, code) and can_execute(language):
+        key = run_key(language, code, stdin, entry, limits)
+        hit = RESULT_CACHE.get(key)
+        if hit is not None and hit["elapsed"] <= timeout:
+            METRICS.inc("exam_result_cache_total", result="hit")
+            res = dict(hit, cached=True)
+            if "compile" in res:
+                res["compile"] = dict(res["compile"], cached=True, time=0.0)
+            if on_output:
+                for stream in ("stdout", "stderr"):
+                    if res[stream]:
+                        on_output(stream, res[stream])
+                res["stdout"] = res["stderr"] = ""
+            return res
+        METRICS.inc("exam_result_cache_total", result="miss")
+    captured = {"stdout": [], "stderr": []}
+    sink = on_output
+    if key and on_output:
+        def sink(stream, text):
+            captured[stream].append(text)
+            on_output(stream, text)
+    res = _execute_program(language, code, stdin, timeout, entry, limits, sink, deadline)
+    ok = res["returncode"] is not None and res["returncode"] >= 0 and not res["timed_out"] and not res.get("limit_exceeded")
+    if key and ok:
+        stored = {k: v for k, v in res.items() if k != "spawn"}
+        if on_output:
+            stored["stdout"] = "".join(captured["stdout"])
+            stored["stderr"] = "".join(captured["stderr"])
+        RESULT_CACHE.put(key, stored)
+    res["cached"] = False
+    return res
+
+# ----------------------------
+# Judge: run CODING_BANK test cases in parallel
+# ----------------------------
+# A problem with "tests" is judged by running every case on the worker pool at once, so a
+# submission takes about as long as its slowest case. A case that cannot start before the
+# time budget runs out is reported as a timeout without being run.
+VERDICT_PASS = "pass"
+VERDICT_WRONG = "wrong answer"
+VERDICT_TIMEOUT = "timeout"
+VERDICT_ERROR = "runtime error"
+VERDICT_COMPILE = "compile error"
+VERDICT_UNJUDGED = "not judged"
+
+def _normalize_output(text):
+    return "\n".join(line.rstrip() for line in text.strip().splitlines())
+
+def judge_case(code, case, timeout=JUDGE_CASE_TIMEOUT, deadline=None, language="Python"):
+    if language != "Python":
+        compile_source(language, code)  # build (or wait for the shared build) before the case clock starts
+    if deadline is not None:
+        timeout = min(timeout, deadline - time.perf_counter())
+        if timeout <= 0:
+            return {"verdict": VERDICT_TIMEOUT, "time": 0.0, "detail": "time budget exhausted", "usage": {}}
+    try:
+        res = run_program(language, code, stdin=case["input"], timeout=timeout, entry="solve", deadline=deadline)
+    except TimeoutError:
+        return {"verdict": VERDICT_TIMEOUT, "time": 0.0, "detail": "time budget exhausted", "usage": {}}
+    if not res.get("compile", {}).get("ok", True):
+        lines = res["stderr"].strip().splitlines()
+        detail = next((l for l in lines if "error" in l), lines[0] if lines else "")
+        return {"verdict": VERDICT_COMPILE, "time": 0.0, "detail": detail.strip(), "usage": res["usage"]}
+    limit = res.get("limit_exceeded")
+    if limit:
+        verdict = VERDICT_TIMEOUT if limit == "cpu" else VERDICT_ERROR
+        return {"verdict": verdict, "time": res["elapsed"], "detail": f"{limit} limit exceeded", "usage": res["usage"]}
+    if res["timed_out"]:
+        verdict = VERDICT_TIMEOUT
+    elif res["returncode"] != 0:
+        verdict = VERDICT_ERROR
+    elif _normalize_output(res["stdout"]) == _normalize_output(case["output"]):
+        verdict = VERDICT_PASS
+    else:
+        verdict = VERDICT_WRONG
+    detail = res["stderr"].strip().splitlines()[-1] if verdict == VERDICT_ERROR and res["stderr"].strip() else ""
+    return {"verdict": verdict, "time": res["elapsed"], "detail": detail, "usage": res["usage"]}
+
+def judge_submission(problems, answers, time_budget=JUDGE_TIME_BUDGET, case_timeout=JUDGE_CASE_TIMEOUT, language="Python"):
+    from concurrent.futures import ThreadPoolExecutor
+    deadline = time.perf_counter() + time_budget
+    if not can_execute(language):
+        problems = [dict(p, tests=[]) for p in problems]  # nothing to run them with here
+    results = [{"title": p["title"], "cases": [None]*len(p.get("tests", []))} for p in problems]
+    jobs = []
+    for pi, (p, code) in enumerate(zip(problems, answers)):
+        for ci, case in enumerate(p.get("tests", [])):
+            if code and code.strip():
+                jobs.append((pi, ci, code, case))
+            else:
+                results[pi]["cases"][ci] = {"verdict": VERDICT_WRONG, "time": 0.0, "detail": "no answer", "usage": {}}
+    if jobs:
+        with ThreadPoolExecutor(max_workers=PY_POOL_SIZE) as ex:
+            futures = {ex.submit(judge_case, code, case, case_timeout, deadline, language): (pi, ci)
+                       for pi, ci, code, case in jobs}
+            for fut, (pi, ci) in futures.items():
+                results[pi]["cases"][ci] = fut.result()
+    for r in results:
+        r["passed"] = sum(1 for c in r["cases"] if c["verdict"] == VERDICT_PASS)
+        r["total"] = len(r["cases"])
+        r["solved"] = r["total"] > 0 and r["passed"] == r["total"]
+        r["usage"] = total_usage(c["usage"] for c in r["cases"])
+    return results
+
+def unjudged_results(problems, reason):
+    # judge_submission's shape for a submission that could not be judged: nothing passes
+    results = []
+    for p in problems:
+        cases = [{"verdict": VERDICT_UNJUDGED, "time": 0.0, "detail": reason, "usage": {}} for _ in p.get("tests", [])]
+        results.append({"title": p["title"], "cases": cases, "passed": 0, "total": len(cases), "solved": False,
+                        "usage": total_usage(())})
+    return results
+
+# ----------------------------
+# Attempt journal (crash-safe, write-behind)
+# ----------------------------
+# Every in-progress attempt appends its events (answer, mark, visit, time, code) to a
+# JSON-lines file in JOURNAL_DIR. Logging only queues a line in memory; one background
+# thread writes the batches and fsyncs them every JOURNAL_FLUSH_INTERVAL, or sooner once
+# JOURNAL_BATCH_SIZE lines are waiting, so a click never waits on the disk. A finished or
+# cancelled attempt removes its file; whatever is left at start-up can be replayed.
+class JournalWriter:
+    def __init__(self):
+        self.lock = threading.Lock()  # guards pending
+        self.io_lock = threading.Lock()  # keeps writes and removals in order
+        self.pending = {}  # path -> lines not yet on disk
+        self.wake = threading.Event()
+        threading.Thread(target=self._loop, daemon=True).start()
+        atexit.register(self.flush)
+
+    def append(self, path, line):
+        with self.lock:
+            buf = self.pending.setdefault(path, [])
+            buf.append(line)
+            full = len(buf) >= JOURNAL_BATCH_SIZE
+        if full:
+            self.wake.set()
+
+    def _loop(self):
+        while True:
+            self.wake.wait(JOURNAL_FLUSH_INTERVAL)
+            self.wake.clear()
+            self.flush()
+
+    def flush(self):
+        with self.io_lock:
+            with self.lock:
+                pending, self.pending = self.pending, {}
+            for path, lines in pending.items():
+                try:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    with open(path, "a", encoding="utf-8") as f:
+                        f.write("".join(lines))
+                        f.flush()
+                        os.fsync(f.fileno())
+                except OSError:
+                    pass
+
+    def remove(self, path):
+        with self.io_lock:
+            with self.lock:
+                self.pending.pop(path, None)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+_JOURNAL_WRITER = None
+_JOURNAL_WRITER_LOCK = threading.Lock()
+
+def get_journal_writer():
+    global _JOURNAL_WRITER
+    with _JOURNAL_WRITER_LOCK:
+        if _JOURNAL_WRITER is None:
+            _JOURNAL_WRITER = JournalWriter()
+        return _JOURNAL_WRITER
+
+class AttemptJournal:
+    def __init__(self, kind, subject, username, payload, resume=None):
+        if resume:
+            # keep appending to the journal we replayed
+            self.path = resume["path"]
+            self.lock = _hold_journal_lock(self.path)
+            self.log("resume", elapsed=resume["elapsed"])
+            return
+        name = f"attempt-{int(time.time()*1000)}-{os.getpid()}-{next(_JOURNAL_IDS)}.jsonl"
+        self.path = os.path.join(JOURNAL_DIR, name)
+        self.lock = _hold_journal_lock(self.path)
+        self.log("start", kind=kind, subject=subject, user=username, payload=payload)
+
+    def log(self, t, **fields):
+        fields["t"] = t
+        fields["ts"] = time.time()
+        get_journal_writer().append(self.path, json.dumps(fields) + "\n")
+
+    def close(self):
+        get_journal_writer().remove(self.path)
+        if self.lock is not None:
+            self.lock.close()
+            try:
+                os.remove(self.path + ".lock")
+            except OSError:
+                pass
+
+_JOURNAL_IDS = itertools.count(1)
+
+# A live attempt holds an OS lock on "<journal>.lock" for as long as its window is open, so
+# another running instance (or this one) never offers it for resuming. The lock goes away
+# with the process, so a crashed attempt is offered again on the next start.
+def _try_lock(f):
+    try:
+        if os.name == "nt":
+            import msvcrt
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+def _hold_journal_lock(path):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        f = open(path + ".lock", "a+")
+    except OSError:
+        return None  # journaling still works, the attempt is just not protected
+    if not _try_lock(f):
+        f.close()
+        return None
+    return f
+
+def journal_in_use(path):
+    try:
+        f = open(path + ".lock")
+    except FileNotFoundError:
+        return False
+    except OSError:
+        return True
+    with f:
+        return not _try_lock(f)  # closing the file drops a lock we just took
+
+def replay_journal(path):
+    state = None
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    ev = json.loads(line)
+                except ValueError:
+                    break  # torn last line from a crash
+                t = ev.get("t")
+                if t == "start":
+                    payload = ev["payload"]
+                    n = len(payload.get("questions") or payload.get("problems") or CODING_BANK.get(ev["subject"], []))
+                    state = {"path": path, "kind": ev["kind"], "subject": ev["subject"], "user": ev.get("user"),
+                             "payload": payload, "started": ev["ts"], "base": 0.0, "segment": ev["ts"],
+                             "current": 0, "selected": [0]*n, "marked": [False]*n, "visited": [False]*n,
+                             "times": [0.0]*n, "answers": [""]*n}
+                elif state is None:
+                    break
+                elif t == "sel":
+                    state["selected"][ev["i"]] = ev["v"]
+                elif t == "mark":
+                    state["marked"][ev["i"]] = ev["v"]
+                elif t == "visit":
+                    state["visited"][ev["i"]] = True
+                    state["current"] = ev["i"]
+                elif t == "time":
+                    state["times"][ev["i"]] += ev["dt"]
+                elif t == "answer":
+                    state["answers"][ev["i"]] = ev["code"]
+                elif t == "resume":
+                    state["base"] = ev["elapsed"]
+                    state["segment"] = ev["ts"]
+                elif t == "end":
+                    return None
+                state["last"] = ev["ts"]
+    except (OSError, KeyError, IndexError, TypeError):
+        return None
+    if state:
+        # time spent in the attempt, not counting the time the app was down
+        state["elapsed"] = state["base"] + state["last"] - state["segment"]
+    return state
+
+def load_unfinished_attempts(user=None):
+    # with `user`, only that user's attempts: others on a shared machine keep theirs
+    if not os.path.isdir(JOURNAL_DIR):
+        return []
+    out = []
+    for name in sorted(os.listdir(JOURNAL_DIR)):
+        if name.startswith("attempt-") and name.endswith(".jsonl"):
+            if journal_in_use(os.path.join(JOURNAL_DIR, name)):
+                continue  # still open in a running instance
+            state = replay_journal(os.path.join(JOURNAL_DIR, name))
+            if state and (user is None or state["user"] == user):
+                out.append(state)
+    return out
+
+# ----------------------------
+# Exam engine (no Tk)
+# ----------------------------
+# ExamSession holds everything about one attempt: navigation, answers, marks, per-question
+# time, the countdown and scoring. The Tk windows are views over it, and it can run with
+# no display at all, e.g. thousands of simulated candidates in one process. State is kept
+# compact: answers and flags are bytearrays, per-question time an array of doubles.
+FLAG_VISITED = 1
+FLAG_MARKED = 2
+
+class ExamSession:
+    mode = "MCQ"
+
+    def __init__(self, subject, items, duration=EXAM_DURATION_SECONDS, journal=None, clock=time.monotonic):
+        self.subject = subject
+        self.items = items
+        self.n = len(items)
+        self.duration = duration
+        self.journal = journal
+        self.clock = clock
+        self.current = 0
+        self.selected = bytearray(self.n)  # chosen option per question, 0 = unanswered
+        self.flags = bytearray(self.n)  # FLAG_VISITED | FLAG_MARKED
+        self.times = array("d", bytes(8 * self.n))  # seconds spent per question
+        self.started = None
+        self.q_started = None
+        self.finished = None
+        self.summary = None
+
+    def _log(self, t, **fields):
+        if self.journal:
+            self.journal.log(t, **fields)
+
+    def resume(self, state):
+        # restore from a replayed journal (see replay_journal)
+        self.current = state["current"]
+        self.selected[:] = bytes(state["selected"])
+        for i in range(self.n):
+            self.flags[i] = (FLAG_VISITED if state["visited"][i] else 0) | (FLAG_MARKED if state["marked"][i] else 0)
+        self.times = array("d", state["times"])
+
+    def start(self, elapsed=0.0, now=None):
+        now = self.clock() if now is None else now
+        self.started = now - elapsed
+        self.q_started = now
+        self.flags[self.current] |= FLAG_VISITED
+        self._log("visit", i=self.current)
+
+    # navigation
+    def goto(self, i, now=None):
+        if not 0 <= i < self.n:
+            raise IndexError(i)
+        now = self.clock() if now is None else now
+        dt = now - self.q_started
+        self.times[self.current] += dt
+        self._log("time", i=self.current, dt=dt)
+        self.q_started = now
+        prev, self.current = self.current, i
+        self.flags[i] |= FLAG_VISITED
+        self._log("visit", i=i)
+        return prev
+
+    def next(self, now=None):
+        if self.current < self.n - 1:
+            self.goto(self.current + 1, now)
+            return True
+        return False
+
+    def prev(self, now=None):
+        if self.current > 0:
+            self.goto(self.current - 1, now)
+            return True
+        return False
+
+    # answering
+    def answer(self, option, i=None):
+        i = self.current if i is None else i
+        self.selected[i] = option
+        self._log("sel", i=i, v=option)
+
+    def toggle_mark(self, i=None):
+        i = self.current if i is None else i
+        self.flags[i] ^= FLAG_MARKED
+        marked = bool(self.flags[i] & FLAG_MARKED)
+        self._log("mark", i=i, v=marked)
+        return marked
+
+    def status(self, i):
+        if self.flags[i] & FLAG_MARKED:
+            return "marked"
+        elif self.selected[i]:
+            return "answered"
+        elif self.flags[i] & FLAG_VISITED:
+            return "visited"
+        return "new"
+
+    # timing
+    def elapsed(self, now=None):
+        if self.finished is not None:
+            return self.finished - self.started
+        now = self.clock() if now is None else now
+        return now - self.started
+
+    def deadline(self):
+        return self.started + self.duration
+
+    def remaining(self, now=None):
+        return max(0, self.duration - int(self.elapsed(now)))
+
+    def tick(self, now=None):
+        # returns the seconds left; submits once time is up
+        remaining = self.remaining(now)
+        if remaining <= 0 and self.summary is None:
+            self.submit(now=now)
+        return remaining
+
+    def finish_timing(self, now=None):
+        if self.finished is None:
+            now = self.clock() if now is None else now
+            self.times[self.current] += now - self.q_started
+            self.finished = now
+        return self.finished - self.started
+
+    def resume_timing(self):
+        # undo finish_timing (e.g. the judge failed); the time in between still counts
+        if self.finished is not None and self.summary is None:
+            self.q_started = self.finished
+            self.finished = None
+
+    # scoring
+    def score(self):
+        correct = 0
+        attempted = 0
+        for i,q in enumerate(self.items):
+            if self.selected[i] != 0:
+                attempted += 1
+                if self.selected[i] == q.get("answer", 1):
+                    correct += 1
+        return correct, attempted
+
+    def submit(self, now=None):
+        if self.summary is not None:
+            return self.summary
+        total_time = self.finish_timing(now)
+        correct, attempted = self.score()
+        self.summary = {
+            "subject": self.subject,
+            "mode": self.mode,
+            "correct": correct,
+            "attempted": attempted,
+            "total_questions": self.n,
+            "time_taken": total_time,
+            "avg_time_per_question": sum(self.times)/max(1,self.n),
+            "item_ids": [q.get("id") for q in self.items],
+            "answer_key": [q.get("answer", 1) for q in self.items],
+            "responses": list(self.selected),
+            "per_q_time": list(self.times)
+        }
+        if self.journal:
+            self.journal.close()
+        return self.summary
+
+    def cancel(self):
+        if self.journal:
+            self.journal.close()
+
+class CodingSession(ExamSession):
+    mode = "Coding"
+
+    def __init__(self, subject, problems, user=None, **kwargs):
+        super().__init__(subject, problems, **kwargs)
+        self.user = user  # submissions are archived for similarity checks when set
+        self.answers = [""]*self.n
+        self.run_usage = []  # resource usage of every interactive run
+
+    def resume(self, state):
+        super().resume(state)
+        self.answers = list(state["answers"])
+
+    def save_answer(self, code, i=None):
+        i = self.current if i is None else i
+        self.answers[i] = code
+        self._log("answer", i=i, code=code)
+
+    def record_run(self, usage):
+        self.run_usage.append(usage)
+
+    def grade(self):
+        return judge_submission(self.items, list(self.answers), language=self.subject)
+
+    def submit(self, results=None, now=None):
+        if self.summary is not None:
+            return self.summary
+        total_time = self.finish_timing(now)
+        if results is None:
+            results = self.grade()
+        solved = 0
+        attempted = 0
+        for ans, r in zip(self.answers, results):
+            if ans and ans.strip():
+                attempted += 1
+            if r["total"]:
+                solved += r["solved"]
+            elif ans and len(ans.strip())>20:
+                solved += 1  # no test cases (text answers): crude length check
+        self.summary = {
+            "subject": self.subject,
+            "mode": self.mode,
+            "correct": solved,
+            "attempted": attempted,
+            "total_questions": self.n,
+            "time_taken": total_time,
+            "avg_time_per_question": sum(self.times)/max(1,self.n),
+            "per_q_time": list(self.times),
+            "judge": results,
+            "usage": total_usage(r["usage"] for r in results),
+            "run_usage": total_usage(self.run_usage),
+            "runs": len(self.run_usage)
+        }
+        if self.user:
+            archive_submission(self.user, self.subject, self.items, self.answers)
+        if self.journal:
+            self.journal.close()
+        return self.summary
+
+# ----------------------------
+# Similarity: likely-copied coding submissions (MinHash + LSH)
+# ----------------------------
+# Every submitted coding answer is appended to SUBMISSIONS_FILE (one JSON line each).
+# --similarity streams that file (or the given ones) in batches, and a process pool turns
+# each submission into a MinHash signature: the source is tokenized with comments dropped,
+# identifiers and literals replaced by placeholders (so renaming variables or changing
+# constants does not hide a copy), cut into SIMILARITY_SHINGLE-token shingles and
+# min-hashed SIMILARITY_PERMS ways. Signatures are split into SIMILARITY_BANDS bands and
+# bucketed per problem; only submissions sharing a bucket are compared, and pairs from
+# different users whose estimated similarity reaches the threshold are reported. Work is
+# linear in the number of submissions plus the size of the buckets, which are capped at
+# SIMILARITY_MAX_BUCKET comparisons per member.
+SIMILARITY_PRIME = (1 << 31) - 1
+SIMILARITY_KEYWORDS = {  # Python's come from the keyword module
+    "C": frozenset("auto break case char const continue default do double else enum extern float for goto if "
+                   "inline int long register restrict return short signed sizeof static struct switch typedef "
+                   "union unsigned void volatile while".split()),
+    "Java": frozenset("abstract assert boolean break byte case catch char class const continue default do double "
+                      "else enum extends final finally float for if implements import instanceof int interface "
+                      "long native new package private protected public return short static super switch "
+                      "synchronized this throw throws transient try void volatile while var".split()),
+}
+def archive_submission(user, subject, problems, answers):
+    writer = get_journal_writer()
+    ts = time.time()
+    for p, code in zip(problems, answers):
+        if code and code.strip():
+            writer.append(SUBMISSIONS_FILE, json.dumps({"user": user, "subject": subject, "problem": p.get("id") or p["title"],
+                                                        "title": p["title"], "code": code, "ts": ts}) + "\n")
+
+@lru_cache(maxsize=None)
+def _token_pattern(language):
+    import keyword, re
+    comment = r"\#[^\n]*" if language == "Python" else r"//[^\n]*|/\*.*?\*/|^[ \t]*\#[^\n]*"  # C: preprocessor too
+    pattern = re.compile(rf"""
+        (?P<comment>{comment})
+      | (?P<string>[rbuRBUfF]{{0,2}}(?:\'\'\'.*?\'\'\'|\"\"\".*?\"\"\"|'(?:\\.|[^'\\\n])*'|"(?:\\.|[^"\\\n])*"))
+      | (?P<number>\b(?:0[xX][0-9a-fA-F]+|\d+\.?\d*(?:[eE][-+]?\d+)?|\.\d+)[lLuUfF]*\b)
+      | (?P<name>[A-Za-z_]\w*)
+      | (?P<op>[^\s\w])""", re.S | re.X | re.M)
+    keywords = frozenset(keyword.kwlist) if language == "Python" else SIMILARITY_KEYWORDS.get(language, frozenset())
+    return pattern, keywords
+
+def code_tokens(code, language="Python"):
+    # literals -> "S"/"N", identifiers -> "V", keywords and operators kept, comments dropped
+    pattern, keywords = _token_pattern(language)
+    out = []
+    for m in pattern.finditer(code):
+        kind = m.lastgroup
+        if kind == "string":
+            out.append("S")
+        elif kind == "number":
+            out.append("N")
+        elif kind == "name":
+            out.append(m.group() if m.group() in keywords else "V")
+        elif kind == "op":
+            out.append(m.group())
+    return out
+
+@lru_cache(maxsize=None)
+def _minhash_params(perms, seed=BANK_SEED):
+    rng = random.Random(seed)
+    return tuple((rng.randrange(1, SIMILARITY_PRIME), rng.randrange(SIMILARITY_PRIME)) for _ in range(perms))
+
+def minhash_signature(tokens, perms=SIMILARITY_PERMS, k=SIMILARITY_SHINGLE):
+    # -> array("I") of `perms` minimums, or None when the code is too short to judge
+    import zlib
+    if len(tokens) < SIMILARITY_MIN_TOKENS:
+        return None
+    shingles = {zlib.crc32(" ".join(tokens[i:i + k]).encode("utf-8")) for i in range(len(tokens) - k + 1)}
+    params = _minhash_params(perms)
+    try:
+        np = _numpy()
+    except RuntimeError:
+        p = SIMILARITY_PRIME
+        return array("I", (min((a * x + b) % p for x in shingles) for a, b in params))
+    x = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+    ab = np.array(params, dtype=np.uint64)
+    return array("I", ((ab[:, :1] * x + ab[:, 1:]) % SIMILARITY_PRIME).min(axis=1).astype(np.uint32).tobytes())
+
+def _signature_chunk(jobs):
+    out = []
+    for language, code in jobs:
+        sig = minhash_signature(code_tokens(code, language))
+        out.append(sig.tobytes() if sig else None)
+    return out
+
+def _read_submissions(paths):
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                    if rec.get("code"):
+                        yield rec
+                except ValueError:
+                    continue  # torn line from a crash
+
+def find_similar(paths, threshold=SIMILARITY_THRESHOLD, workers=None, batch=SIMILARITY_BATCH):
+    from concurrent.futures import ProcessPoolExecutor
+    started = time.perf_counter()
+    perms, rows = SIMILARITY_PERMS, SIMILARITY_PERMS // SIMILARITY_BANDS
+    workers = workers or os.cpu_count() or 1
+    metas, sigs = [], []  # per kept submission: (user, ts, problem key), signature bytes
+    titles = {}
+    buckets = {}
+    scanned = 0
+    records = _read_submissions(paths)
+    ex = ProcessPoolExecutor(workers) if workers > 1 else None
+    try:
+        while True:
+            recs = list(itertools.islice(records, batch))
+            if not recs:
+                break
+            scanned += len(recs)
+            jobs = [(r.get("subject", "Python"), r["code"]) for r in recs]
+            step = max(1, -(-len(jobs) // (workers * 4)))
+            chunks = [jobs[i:i + step] for i in range(0, len(jobs), step)]
+            done = ex.map(_signature_chunk, chunks) if ex else map(_signature_chunk, chunks)
+            for rec, sig in zip(recs, itertools.chain.from_iterable(done)):
+                if sig is None:
+                    continue
+                key = (rec.get("subject", ""), rec.get("problem") or rec.get("title", ""))
+                titles[key] = rec.get("title") or key[1]
+                n = len(metas)
+                metas.append((rec.get("user", "?"), rec.get("ts", 0), key))
+                sigs.append(sig)
+                for band in range(SIMILARITY_BANDS):
+                    buckets.setdefault((key, band, sig[4 * band * rows:4 * (band + 1) * rows]), []).append(n)
+    finally:
+        if ex:
+            ex.shutdown()
+    pairs = {}
+    for members in buckets.values():
+        for i, a in enumerate(members):
+            for b in members[i + 1:i + 1 + SIMILARITY_MAX_BUCKET]:
+                if (a, b) in pairs or metas[a][0] == metas[b][0]:
+                    continue
+                sa, sb = memoryview(sigs[a]).cast("I"), memoryview(sigs[b]).cast("I")
+                pairs[(a, b)] = sum(x == y for x, y in zip(sa, sb)) / perms
+    report = []
+    for (a, b), sim in pairs.items():
+        if sim >= threshold:
+            key = metas[a][2]
+            report.append({"subject": key[0], "problem": key[1], "title": titles[key], "similarity": round(sim, 3),
+                           "a": {"user": metas[a][0], "ts": metas[a][1]}, "b": {"user": metas[b][0], "ts": metas[b][1]}})
+    report.sort(key=lambda r: (r["subject"], r["title"], -r["similarity"]))
+    return {"submissions": scanned, "signed": len(metas), "compared": len(pairs), "pairs": report,
+            "time": time.perf_counter() - started}
+
+def similarity_main(args):
+    paths = args.similarity or [SUBMISSIONS_FILE]
+    try:
+        result = find_similar(paths, threshold=args.threshold)
+    except OSError as e:
+        print(f"similarity: {e}", file=sys.stderr)
+        return 2
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    current = None
+    for r in result["pairs"]:
+        if (r["subject"], r["title"]) != current:
+            current = (r["subject"], r["title"])
+            print(f"\n{r['subject']} / {r['title']}")
+        print(f"  {r['similarity']:.0%}  {r['a']['user']}  <->  {r['b']['user']}")
+    print(f"\n{len(result['pairs'])} likely-copied pairs: {result['submissions']} submissions read, "
+          f"{result['signed']} long enough to compare, {result['compared']} pairs checked, {result['time']:.2f}s")
+    return 0
+
+# ----------------------------
+# Reports: streaming export of attempt results
+# ----------------------------
+# Every recorded attempt is appended to RESULTS_FILE. --report PATH (or Profile > Export
+# Report) streams that file, or --results FILE..., into CSV, JSON lines or one
+# self-contained HTML page. Attempts are read, turned into rows and rendered by generators,
+# and output goes to disk REPORT_CHUNK characters at a time; the only state kept is the
+# running totals per subject/mode and per question position, so memory stays flat however
+# many attempts are exported.
+REPORT_FIELDS = ["finished", "user", "subject", "mode", "correct", "attempted", "total_questions", "score_pct",
+                 "time_taken", "avg_time_per_question", "rank", "of", "per_q_time"]
+REPORT_FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".json": "jsonl", ".html": "html", ".htm": "html"}
+
+ARCHIVE_FIELDS = ("subject", "mode", "correct", "attempted", "total_questions", "time_taken",
+                  "avg_time_per_question", "standing", "per_q_time")  # what report_rows reads
+
+def archive_result(user, summary):
+    # scores and timing only: answer keys, responses and submitted code stay out of the archive
+    record = {k: summary[k] for k in ARCHIVE_FIELDS if k in summary}
+    get_journal_writer().append(RESULTS_FILE, json.dumps(dict(record, user=user, finished=time.time())) + "\n")
+
+# MCQ attempts also go to RESPONSES_FILE with what item analysis and regrading need: item
+# ids, answer key, responses and per-question time, but never the question text.
+RESPONSE_FIELDS = ("subject", "item_ids", "answer_key", "responses", "per_q_time")
+
+def archive_responses(user, summary):
+    if summary.get("mode") != "MCQ" or "item_ids" not in summary:
+        return
+    record = {k: summary[k] for k in RESPONSE_FIELDS if k in summary}
+    get_journal_writer().append(RESPONSES_FILE, json.dumps(dict(record, mode="MCQ", user=user, finished=time.time())) + "\n")
+
+def valid_responses(a):
+    # a logged attempt that add_attempt / grade_batch can take: equal-length lists, options 0-4, key 1-4
+    ids, key, resp = a.get("item_ids"), a.get("answer_key"), a.get("responses")
+    return (isinstance(ids, list) and isinstance(key, list) and isinstance(resp, list)
+            and len(ids) == len(key) == len(resp) > 0
+            and all(type(r) is int and 0 <= r <= 4 for r in resp)
+            and all(type(k) is int and 1 <= k <= 4 for k in key))
+
+def iter_attempts(paths, subject=None, user=None):
+    for path in paths:
+        try:
+            f = open(path, encoding="utf-8")
+        except FileNotFoundError:
+            continue  # nothing recorded yet
+        with f:
+            for line in f:
+                try:
+                    a = json.loads(line)
+                except ValueError:
+                    continue  # torn line from a crash
+                if (subject is None or a.get("subject") == subject) and (user is None or a.get("user") == user):
+                    yield a
+
+def _is_num(v):
+    return isinstance(v, (int, float)) and not isinstance(v, bool) and math.isfinite(v)
+
+def _report_record_ok(a):
+    # a hand-edited or foreign record is skipped like a torn line, not allowed to abort the export
+    return (all(_is_num(a.get(k, 0)) for k in ("finished", "correct", "attempted", "total_questions", "time_taken"))
+            and (a.get("avg_time_per_question") is None or _is_num(a["avg_time_per_question"]))
+            and all(isinstance(a.get(k, ""), str) for k in ("user", "subject", "mode"))
+            and isinstance(a.get("standing") or {}, dict)
+            and isinstance(a.get("per_q_time") or [], list) and all(_is_num(t) for t in a.get("per_q_time") or ()))
+
+def report_rows(attempts):
+    for a in attempts:
+        if not _report_record_ok(a):
+            continue
+        total = a.get("total_questions") or 0
+        taken = a.get("time_taken") or 0.0
+        avg = a.get("avg_time_per_question")
+        standing = a.get("standing") or {}
+        yield {
+            "finished": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(a.get("finished", 0))),
+            "user": a.get("user", ""),
+            "subject": a.get("subject", "Unknown"),
+            "mode": a.get("mode", "MCQ"),
+            "correct": a.get("correct", 0),
+            "attempted": a.get("attempted", 0),
+            "total_questions": total,
+            "score_pct": round(100 * a.get("correct", 0) / total, 2) if total else 0.0,
+            "time_taken": round(taken, 3),
+            "avg_time_per_question": round(taken / max(1, total) if avg is None else avg, 3),
+            "rank": standing.get("rank", ""),
+            "of": standing.get("of", ""),
+            "per_q_time": [round(t, 3) for t in a.get("per_q_time") or ()],
+        }
+
+def _csv_lines(rows):
+    import csv, io
+    buf = io.StringIO()
+    out = csv.writer(buf, lineterminator="\n")
+    out.writerow(REPORT_FIELDS)
+    for row in rows:
+        out.writerow([" ".join(map(str, row[k])) if k == "per_q_time" else row[k] for k in REPORT_FIELDS])
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    yield buf.getvalue()
+
+def _jsonl_lines(rows):
+    for row in rows:
+        yield json.dumps(row) + "\n"
+
+REPORT_CSS = """body{font:14px system-ui,sans-serif;margin:24px;color:#222}h1{font-size:20px}h2{font-size:16px;margin-top:28px}
+table{border-collapse:collapse;font-size:13px}th,td{border:1px solid #ddd;padding:3px 8px;text-align:right}
+th{background:#f3f3f3;position:sticky;top:0}td.l,th.l{text-align:left}td.q{text-align:left;color:#555;white-space:nowrap}
+.bar{display:inline-block;height:10px;background:#4f81bd;vertical-align:middle}"""
+
+def _html_lines(rows, title="Exam results"):
+    from html import escape
+    cols = [c for c in REPORT_FIELDS if c != "per_q_time"]
+    yield (f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>{escape(title)}</title><style>{REPORT_CSS}</style>"
+           f"</head><body><h1>{escape(title)}</h1>\n<h2>Attempts</h2>\n<table><tr>"
+           + "".join(f"<th class=\"l\">{c}</th>" if c in ("finished", "user", "subject", "mode") else f"<th>{c}</th>" for c in cols)
+           + "<th class=\"l\">seconds per question</th></tr>\n")
+    totals = {}  # (subject, mode) -> [attempts, score_pct sum, time sum]
+    positions = {}  # (subject, mode) -> [[seconds sum, attempts] per question position]
+    for row in rows:
+        key = (row["subject"], row["mode"])
+        t = totals.setdefault(key, [0, 0.0, 0.0])
+        t[0] += 1
+        t[1] += row["score_pct"]
+        t[2] += row["time_taken"]
+        pos = positions.setdefault(key, [])
+        for i, s in enumerate(row["per_q_time"]):
+            if i == len(pos):
+                pos.append([0.0, 0])
+            pos[i][0] += s
+            pos[i][1] += 1
+        # every cell is escaped: the archive is a plain file and its values cannot be trusted
+        yield ("<tr>" + "".join(f"<td class=\"l\">{escape(str(row[c]))}</td>" if c in ("finished", "user", "subject", "mode")
+                                else f"<td>{escape(str(row[c]))}</td>" for c in cols)
+               + f"<td class=\"q\">{escape(' '.join(f'{s:g}' for s in row['per_q_time']))}</td></tr>\n")
+    yield "</table>\n<h2>Summary</h2>\n<table><tr><th class=\"l\">subject</th><th class=\"l\">mode</th><th>attempts</th><th>mean score %</th><th>mean time (s)</th></tr>\n"
+    for (subject, mode), (n, score, spent) in sorted(totals.items()):
+        yield (f"<tr><td class=\"l\">{escape(str(subject))}</td><td class=\"l\">{escape(str(mode))}</td><td>{n}</td>"
+               f"<td>{score / n:.1f}</td><td>{spent / n:.1f}</td></tr>\n")
+    yield "</table>\n"
+    for (subject, mode), pos in sorted(positions.items()):
+        means = [s / max(1, n) for s, n in pos]
+        peak = max(means, default=0) or 1
+        yield (f"<h2>Mean time per question: {escape(str(subject))} {escape(str(mode))}</h2>\n"
+               "<table><tr><th>question</th><th>mean (s)</th><th>answered</th><th class=\"l\"></th></tr>\n")
+        for i, (m, (_, n)) in enumerate(zip(means, pos), 1):
+            yield (f"<tr><td>{i}</td><td>{m:.2f}</td><td>{n}</td>"
+                   f"<td class=\"l\"><span class=\"bar\" style=\"width:{200 * m / peak:.0f}px\"></span></td></tr>\n")
+        yield "</table>\n"
+    yield f"<p>Generated {time.strftime('%Y-%m-%d %H:%M:%S')} by Smart Exam Portal.</p></body></html>\n"
+
+def export_report(path, attempts, fmt=None):
+    # -> number of attempts written; fmt defaults from the file extension
+    fmt = fmt or REPORT_FORMATS.get(os.path.splitext(path)[1].lower())
+    if fmt not in ("csv", "jsonl", "html"):
+        raise ValueError(f"cannot tell the report format of {path!r}; use .csv, .jsonl or .html")
+    count = [0]
+    def counted(rows):
+        for row in rows:
+            count[0] += 1
+            yield row
+    rows = counted(report_rows(attempts))
+    lines = {"csv": _csv_lines, "jsonl": _jsonl_lines, "html": _html_lines}[fmt](rows)
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    tmp = path + ".tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8", newline="") as f:
+            chunk, size = [], 0
+            for line in lines:
+                chunk.append(line)
+                size += len(line)
+                if size >= REPORT_CHUNK:
+                    f.write("".join(chunk))
+                    chunk, size = [], 0
+            f.write("".join(chunk))
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    return count[0]
+
+def report_main(args):
+    get_journal_writer().flush()
+    started = time.perf_counter()
+    try:
+        n = export_report(args.report, iter_attempts(args.results or [RESULTS_FILE], subject=args.subject, user=args.user),
+                          fmt=args.report_format)
+    except (OSError, ValueError, TypeError) as e:
+        print(f"report: {e}", file=sys.stderr)
+        return 2
+    print(f"{args.report}: {n} attempts in {time.perf_counter() - started:.2f}s")
+    return 0
+
+# ----------------------------
+# Batch grading (NumPy, optional)
+# ----------------------------
+# Regrades a whole cohort in one vectorised pass: an answer key of length Q and an
+# attempts x Q response matrix (0 = blank, 1-4 = option) go in, per-attempt counts, scores
+# and per-difficulty breakdowns come out. A marking scheme (or a per-question, per-option
+# partial-credit table) is turned into a Q x 5 credit matrix, so any scheme is a single
+# gather + sum. NumPy is only imported when batch grading is used. --regrade KEYFILE feeds
+# it the attempts logged in RESPONSES_FILE, grouped by paper, after an answer key is fixed.
+MARKING_SCHEMES = {
+    "standard": {"correct": 1.0, "wrong": 0.0, "blank": 0.0},
+    "negative": {"correct": 1.0, "wrong": -0.25, "blank": 0.0},
+}
+
+def _numpy():
+    try:
+        import numpy as np
+    except ImportError:
+        raise RuntimeError("Batch grading needs NumPy (pip install numpy).") from None
+    return np
+
+def paper_key(questions):
+    return [q.get("answer", 1) for q in questions], [q.get("difficulty", "") for q in questions]
+
+def response_matrix(sessions):
+    np = _numpy()
+    return np.vstack([np.frombuffer(s.selected, dtype=np.uint8) for s in sessions])
+
+def credit_matrix(key, scheme="standard", partial=None):
+    # credit[q, option] = marks for choosing option on question q (option 0 = left blank)
+    np = _numpy()
+    key = np.asarray(key, dtype=np.intp)
+    if isinstance(scheme, str):
+        scheme = MARKING_SCHEMES[scheme]
+    credit = np.full((len(key), 5), scheme["wrong"], dtype=np.float64)
+    credit[:, 0] = scheme["blank"]
+    credit[np.arange(len(key)), key] = scheme["correct"]
+    for (q, option), marks in (partial or {}).items():
+        credit[q, option] = marks
+    return credit
+
+def grade_batch(key, responses, difficulties=None, scheme="standard", partial=None):
+    np = _numpy()
+    key = np.asarray(key, dtype=np.intp)
+    resp = np.asarray(responses)
+    if resp.ndim != 2 or resp.shape[1] != len(key):
+        raise ValueError(f"responses must be attempts x {len(key)}, got {resp.shape}")
+    if not np.issubdtype(resp.dtype, np.integer) or (resp.size and (resp.min() < 0 or resp.max() > 4)):
+        raise ValueError("responses must be integers: 0 (blank) or an option 1-4")
+    n = len(key)
+    credit = credit_matrix(key, scheme, partial)
+    hits = resp == key  # blanks never match: the key is 1-4
+    correct = hits.sum(axis=1)
+    attempted = (resp != 0).sum(axis=1)
+    score = credit[np.arange(n), resp].sum(axis=1)
+    max_score = credit.max(axis=1).sum()
+    out = {
+        "correct": correct,
+        "attempted": attempted,
+        "percent": correct * 100.0 / max(1, n),
+        "score": score,
+        "score_percent": score * 100.0 / max_score if max_score > 0 else np.zeros(len(resp)),
+    }
+    if difficulties is not None:
+        labels = np.asarray(difficulties)
+        out["by_difficulty"] = {}
+        for label in np.unique(labels):
+            cols = labels == label
+            c = hits[:, cols].sum(axis=1)
+            out["by_difficulty"][str(label)] = {"total": int(cols.sum()), "correct": c, "percent": c * 100.0 / cols.sum()}
+    return out
+
+def regrade_attempts(attempts, fixes, scheme="standard"):
+    # logged MCQ attempts (RESPONSES_FILE records) rescored with corrected answers
+    # (`fixes`: item id -> option 1-4); one grade_batch per distinct paper
+    np = _numpy()
+    papers = {}  # (subject, item ids) -> [key, [attempt], [responses]]
+    for a in attempts:
+        if a.get("mode") != "MCQ" or not valid_responses(a):
+            continue
+        group = papers.setdefault((a.get("subject"), tuple(a["item_ids"])), [a["answer_key"], [], []])
+        group[1].append(a)
+        group[2].append(a["responses"])
+    rows = []
+    for (subject, ids), (key, group, responses) in papers.items():
+        new_key = [fixes.get(i, k) for i, k in zip(ids, key)]
+        resp = np.asarray(responses, dtype=np.intp)
+        before = (resp == np.asarray(key, dtype=np.intp)).sum(axis=1)
+        graded = grade_batch(new_key, resp, scheme=scheme)
+        for i, a in enumerate(group):
+            rows.append({"user": a.get("user", ""), "subject": subject, "finished": a.get("finished", 0),
+                         "total_questions": len(ids), "correct_before": int(before[i]), "correct": int(graded["correct"][i]),
+                         "score": float(graded["score"][i]), "score_percent": round(float(graded["score_percent"][i]), 2)})
+    return {"papers": len(papers), "attempts": rows}
+
+def regrade_main(args):
+    # --regrade KEYFILE: a JSON object of corrected answers, item id -> option 1-4
+    get_journal_writer().flush()
+    try:
+        with open(args.regrade, encoding="utf-8") as f:
+            fixes = json.load(f)
+        if not isinstance(fixes, dict) or not all(type(v) is int and 1 <= v <= 4 for v in fixes.values()):
+            raise ValueError(f"{args.regrade}: expected a JSON object of item id -> option 1-4")
+        result = regrade_attempts(iter_attempts(args.responses or [RESPONSES_FILE], subject=args.subject, user=args.user),
+                                  fixes, scheme=args.scheme)
+        if args.out:
+            with open(args.out, "w", encoding="utf-8") as f:
+                json.dump(result, f, indent=2)
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"regrade: {e}", file=sys.stderr)
+        return 2
+    changed = [r for r in result["attempts"] if r["correct"] != r["correct_before"]]
+    for r in changed:
+        when = time.strftime("%Y-%m-%d %H:%M", time.localtime(r["finished"]))
+        print(f"  {when}  {r['user']}  {r['subject']}: {r['correct_before']} -> {r['correct']}/{r['total_questions']}")
+    print(f"{len(result['attempts'])} attempts on {result['papers']} papers regraded ({args.scheme} marking), "
+          f"{len(changed)} scores changed")
+    return 0
+
+# ----------------------------
+# Item analysis (streaming)
+# ----------------------------
+# Consumes attempt results one at a time and keeps, per question id, only fixed-size
+# accumulators: response count, correct count (p-value), option frequencies, a Welford
+# co-moment between item score and rest-of-test score (corrected point-biserial) and a P²
+# median of time spent. Memory depends on the number of items, never on the responses.
+ITEM_EASY_P = 0.7  # p-value at or above which an item is labelled Easy
+ITEM_HARD_P = 0.4  # p-value below which an item is labelled Hard
+ITEM_MIN_RESPONSES = 30  # responses needed before an item is relabelled
+
+class ItemAccumulator:
+    __slots__ = ("n", "correct", "options", "mean_x", "mean_y", "m2_x", "m2_y", "c_xy", "time")
+
+    def __init__(self):
+        self.n = 0
+        self.correct = 0
+        self.options = [0]*5  # index 0 = left blank
+        self.mean_x = self.mean_y = self.m2_x = self.m2_y = self.c_xy = 0.0
+        self.time = P2Quantile(0.5)
+
+    def add(self, option, is_correct, rest_score, seconds=None):
+        self.n += 1
+        self.correct += is_correct
+        self.options[option] += 1
+        x, y = float(is_correct), float(rest_score)
+        dx = x - self.mean_x
+        self.mean_x += dx / self.n
+        dy = y - self.mean_y
+        self.mean_y += dy / self.n
+        self.m2_x += dx * (x - self.mean_x)
+        self.m2_y += dy * (y - self.mean_y)
+        self.c_xy += dx * (y - self.mean_y)
+        if seconds is not None:
+            self.time.add(seconds)
+
+    def p_value(self):
+        return self.correct / self.n if self.n else 0.0
+
+    def discrimination(self):
+        if self.m2_x <= 0 or self.m2_y <= 0:
+            return 0.0
+        return self.c_xy / math.sqrt(self.m2_x * self.m2_y)
+
+class ItemAnalysis:
+    def __init__(self):
+        self.items = {}  # item id -> ItemAccumulator
+        self.attempts = 0
+
+    def add_attempt(self, item_ids, responses, key, times=None):
+        scores = [1 if r and r == k else 0 for r, k in zip(responses, key)]
+        total = sum(scores)
+        for i, item in enumerate(item_ids):
+            acc = self.items.get(item)
+            if acc is None:
+                acc = self.items[item] = ItemAccumulator()
+            acc.add(responses[i], scores[i], total - scores[i], times[i] if times else None)
+        self.attempts += 1
+
+    def add_summary(self, summary):
+        # MCQ summaries from ExamSession.submit (or RESPONSES_FILE) carry everything item analysis needs
+        if summary.get("mode") != "MCQ" or not valid_responses(summary):
+            return
+        times = summary.get("per_q_time")
+        if not (isinstance(times, list) and len(times) == len(summary["item_ids"])
+                and all(isinstance(t, (int, float)) for t in times)):
+            summary = dict(summary, per_q_time=None)
+        self.add_attempt(summary["item_ids"], summary["responses"], summary["answer_key"], summary.get("per_q_time"))
+
+    def consume(self, summaries):
+        for summary in summaries:
+            self.add_summary(summary)
+        return self
 
-    diffs = ["Easy"] * (count//2) + ["Medium"] * (count//3) + ["Hard"] * (count - (count//2) - (count//3))
-    random.shuffle(diffs)
-    tpls = templates.get(subject, templates["Aptitude"])
-
-    for i in range(count):
-        tpl = random.choice(tpls)
-        diff = diffs[i]
-        # provide formatting values
-        vals = {
-            "a": random.randint(2,5),
-            "b": random.randint(6,12),
-            "c": random.randint(13,20),
-            "d": random.randint(21,30),
-            "k": random.randint(5,20),
-            "L": random.randint(80,320),
-            "t": random.randint(6,40),
-            "v": random.choice([30,36,45,60]),
-            "p": random.choice([5,10,12,15,20]),
-            "c": random.randint(500,2000),
-            "s": random.randint(1200,4000),
-            "i": random.choice(["pointer arithmetic", "garbage collection", "automatic resize"]),
-            "n": random.randint(3,8)
+    def stats(self, item):
+        acc = self.items[item]
+        return {
+            "responses": acc.n,
+            "p_value": acc.p_value(),
+            "discrimination": acc.discrimination(),
+            "options": {("blank" if o == 0 else chr(64 + o)): c / acc.n for o, c in enumerate(acc.options)},
+            "median_time": acc.time.value(),
+            "suggested_difficulty": suggest_difficulty(acc.p_value()),
         }
-        qtext = tpl[0].format(**vals)
-        opts = []
-        correct_index = random.randint(1,4)
-        for j in range(4):
-            if tpl[1] == "series":
-                opts.append(str(random.choice([36,40,42,56,72,90])))
-            elif tpl[1] == "algebra":
-                opts.append(str(random.randint(1,20)))
-            elif tpl[1] == "speed":
-                opts.append(str(random.choice([80,120,200,160,240])))
-            elif tpl[1] == "percent":
-                opts.append(str(random.choice(["10%","20%","21%","19%"])))
-            elif tpl[1] == "profit":
-                opts.append(str(random.choice(["20%","25%","15%","30%"])))
-            elif tpl[1] in ("c_basic","c_keywords","c_stdlib","postinc","size"):
-                opts.append(random.choice(["stdio.h","stdlib.h","string.h","math.h","static-local"]))
-            elif tpl[1] in ("inherit","threads","div","collections","default"):
-                opts.append(random.choice(["extends","implements","synchronized","true","false","2"]))
-            elif tpl[1] in ("list_comp","floor_div","yield","immut","none"):
-                opts.append(random.choice(["[0,1,4]","1","generator","tuple","no value"]))
-            elif tpl[1] in ("normal","2nf","pk","where","join"):
-                opts.append(random.choice(["remove redundancy","2NF","true","WHERE","JOIN"]))
-            elif tpl[1] in ("network","tcp","switch","ipv4","domain"):
-                opts.append(random.choice(["Network","TCP","Switch","32 bits","Domain to IP"]))
-            elif tpl[1] in ("rr","proc_thread","deadlock","paging","sync"):
-                opts.append(random.choice(["Round Robin","Process","Mutual Exclusion","Paging","Semaphore"]))
+
+    def report(self):
+        return {item: self.stats(item) for item in self.items}
+
+    def difficulties(self, min_responses=ITEM_MIN_RESPONSES):
+        # item id -> measured label, for items with enough responses
+        return {item: suggest_difficulty(acc.p_value()) for item, acc in self.items.items() if acc.n >= min_responses}
+
+    def relabel(self, questions, min_responses=ITEM_MIN_RESPONSES):
+        # record measured difficulty as an override (and label the given dicts); returns how many changed
+        changed = 0
+        for q in questions:
+            acc = self.items.get(q.get("id"))
+            if acc is None or acc.n < min_responses:
+                continue
+            label = suggest_difficulty(acc.p_value())
+            DIFFICULTY_OVERRIDES[q["id"]] = label
+            if label != q.get("difficulty"):
+                set_difficulty(q, label)
+                changed += 1
+        return changed
+
+    def relabel_bank(self, bank=None, min_responses=ITEM_MIN_RESPONSES):
+        bank = QUESTION_BANK if bank is None else bank
+        return sum(self.relabel(bank[subject], min_responses) for subject in bank)
+
+def suggest_difficulty(p_value):
+    if p_value >= ITEM_EASY_P:
+        return "Easy"
+    elif p_value >= ITEM_HARD_P:
+        return "Medium"
+    return "Hard"
+
+def item_stats_main(args):
+    # --item-stats: stream the response log through ItemAnalysis and save the measured labels
+    get_journal_writer().flush()
+    started = time.perf_counter()
+    paths = args.responses or [RESPONSES_FILE]
+    analysis = ItemAnalysis().consume(iter_attempts(paths, subject=args.subject, user=args.user))
+    labels = analysis.difficulties()
+    try:
+        save_difficulty_overrides(labels)
+        if args.out:
+            with open(args.out, "w", encoding="utf-8") as f:
+                json.dump(analysis.report(), f, indent=2)
+    except OSError as e:
+        print(f"item-stats: {e}", file=sys.stderr)
+        return 2
+    counts = {label: list(labels.values()).count(label) for label in ("Easy", "Medium", "Hard")}
+    print(f"{analysis.attempts} attempts, {len(analysis.items)} items; {len(labels)} with {ITEM_MIN_RESPONSES}+ responses "
+          f"labelled {counts} in {DIFFICULTY_FILE} ({time.perf_counter() - started:.2f}s)")
+    return 0
+
+# ----------------------------
+# Leaderboards
+# ----------------------------
+# One board per (subject, mode), holding each user's best result. A board is a treap
+# ordered by (-score fraction, time taken, user) whose nodes carry subtree sizes, so
+# insert/update, rank, percentile and "the k entries from position i" are all O(log n) (plus
+# k) with no re-sorting. Equal score and time share a rank. Results are appended to
+# LEADERBOARD_FILE through the journal writer and replayed on first use.
+class _RankNode:
+    __slots__ = ("key", "prio", "size", "left", "right")
+
+    def __init__(self, key, prio):
+        self.key = key
+        self.prio = prio
+        self.size = 1
+        self.left = None
+        self.right = None
+
+def _size(node):
+    return node.size if node else 0
+
+class Leaderboard:
+    def __init__(self):
+        self.root = None
+        self.best = {}  # user -> key of their entry
+        self.info = {}  # user -> (correct, total, time_taken, ts)
+        self.rng = random.Random()
+
+    def __len__(self):
+        return len(self.best)
+
+    def __contains__(self, user):
+        return user in self.best
+
+    def _merge(self, a, b):
+        if not a or not b:
+            return a or b
+        if a.prio > b.prio:
+            a.right = self._merge(a.right, b)
+            a.size = 1 + _size(a.left) + _size(a.right)
+            return a
+        b.left = self._merge(a, b.left)
+        b.size = 1 + _size(b.left) + _size(b.right)
+        return b
+
+    def _split(self, node, key):
+        # -> (keys < key, keys >= key)
+        if not node:
+            return None, None
+        if node.key < key:
+            node.right, right = self._split(node.right, key)
+            node.size = 1 + _size(node.left) + _size(node.right)
+            return node, right
+        left, node.left = self._split(node.left, key)
+        node.size = 1 + _size(node.left) + _size(node.right)
+        return left, node
+
+    def _remove(self, node, key):
+        # `key` must be present
+        if node.key == key:
+            return self._merge(node.left, node.right)
+        if key < node.key:
+            node.left = self._remove(node.left, key)
+        else:
+            node.right = self._remove(node.right, key)
+        node.size -= 1
+        return node
+
+    def submit(self, user, correct, total, time_taken, ts=0.0):
+        # keeps the user's best result; True when this one became it
+        key = (-(correct / total if total else 0.0), time_taken, user)
+        old = self.best.get(user)
+        if old is not None:
+            if old <= key:
+                return False
+            self.root = self._remove(self.root, old)
+        left, right = self._split(self.root, key)
+        self.root = self._merge(self._merge(left, _RankNode(key, self.rng.random())), right)
+        self.best[user] = key
+        self.info[user] = (correct, total, time_taken, ts)
+        return True
+
+    def _count_before(self, key):
+        node, n = self.root, 0
+        while node:
+            if node.key < key:
+                n += _size(node.left) + 1
+                node = node.right
             else:
-                opts.append(str(random.randint(1,100)))
-        opts = opts[:4]
-        mcqs.append({
-            "question": f"{subject}: {qtext} ({diff})",
-            "options": opts,
-            "answer": correct_index,
-            "difficulty": diff
-        })
-    return mcqs
+                node = node.left
+        return n
 
-# Build question bank
-QUESTION_BANK = {}
-SUBJECTS = []
-for cat, subjects in CATEGORIES.items():
-    for s in subjects:
-        SUBJECTS.append(s)
-        QUESTION_BANK[s] = generate_mcqs_for(s, count=50)
+    def rank(self, user):
+        # 1-based; everyone with the same score and time shares it
+        key = self.best[user]
+        return self._count_before(key[:2]) + 1
 
-# Coding bank (Python problems are executable)
-CODING_BANK = {
-    "Python": [
-        {"title":"Easy: Sum of list", "desc":"Write a function solve() that reads a line of integers separated by spaces and prints their sum."},
-        {"title":"Easy-Mid: Count vowels", "desc":"Write solve() that reads a line, counts vowels (a,e,i,o,u) and prints the count."},
-        {"title":"Medium: Unique words", "desc":"Write solve() that reads a sentence and prints number of unique words (case-insensitive)."},
-        {"title":"Hard: Longest increasing subsequence length", "desc":"Write solve() that reads integers and prints length of LIS."},
-        {"title":"Harder: Evaluate expression", "desc":"Write solve() that evaluates a single-line arithmetic expression (safe eval) and prints result."}
-    ],
-    "C": [
-        {"title":"Easy: Hello World variant", "desc":"Write a C program that prints a pattern or 'Hello from C' (for practice)."},
-        {"title":"Easy-Mid: Pointers practice", "desc":"Write a C function that swaps two integers using pointers."},
-        {"title":"Medium: String reverse", "desc":"Write a C program to reverse a string in place."},
-        {"title":"Hard: Dynamic memory", "desc":"Write code to allocate and resize an integer array using malloc/realloc."},
-        {"title":"Harder: Implement linked list", "desc":"Write code to implement a singly linked list with insert/delete."}
-    ],
-    "Java": [
-        {"title":"Easy: Hello Java", "desc":"Write a Java program that prints 'Hello Java' and demonstrates main method."},
-        {"title":"Easy-Mid: Class & Object", "desc":"Implement a simple class with attributes and a method."},
-        {"title":"Medium: Array operations", "desc":"Write Java code to find second largest element in an array."},
-        {"title":"Hard: Threads demo", "desc":"Create multi-threaded Java example demonstrating Runnable."},
-        {"title":"Harder: Data structures", "desc":"Implement stack using linked list in Java."}
-    ],
-    "DBMS": [
-        {"title":"Easy: SQL SELECT", "desc":"Write SQL to select top-N records from a table."},
-        {"title":"Easy-Mid: JOIN query", "desc":"Write SQL to join two tables on a key."},
-        {"title":"Medium: Normalization", "desc":"Explain/Show steps to normalize a table to 3NF (text answer)."},
-        {"title":"Hard: Transaction", "desc":"Design transactions to avoid lost update (explain)."},
-        {"title":"Harder: Query optimization", "desc":"Explain indexes and how to optimize a query."}
-    ],
-    "CN": [
-        {"title":"Easy: Describe IP", "desc":"Explain IPv4 address structure (text)."},
-        {"title":"Easy-Mid: Subnetting", "desc":"Given CIDR /24, how many hosts? (text)"},
-        {"title":"Medium: Routing", "desc":"Explain how OSPF works at high level."},
-        {"title":"Hard: Congestion control", "desc":"Explain TCP congestion control algorithms."},
-        {"title":"Harder: Protocol design", "desc":"Design a simple reliable message protocol (text)."}
-    ],
-    "OS": [
-        {"title":"Easy: Process vs Thread", "desc":"Explain difference between process and thread."},
-        {"title":"Easy-Mid: Scheduling", "desc":"Given processes, compute turnaround time for Round Robin."},
-        {"title":"Medium: Critical section", "desc":"Write pseudocode to solve mutual exclusion with semaphores."},
-        {"title":"Hard: Virtual memory", "desc":"Explain demand paging and page replacement algorithms."},
-        {"title":"Harder: Kernel modules", "desc":"Describe how kernel modules are loaded/unloaded (text)."}
-    ],
-    "Aptitude": [
-        {"title":"Easy: Simple Interest", "desc":"Compute simple interest for principal, rate, time."},
-        {"title":"Easy-Mid: Percentage", "desc":"Find percentage increase for given values."},
-        {"title":"Medium: Series", "desc":"Find next in numeric series."},
-        {"title":"Hard: Time & Work", "desc":"Solve combined work-rate problems."},
-        {"title":"Harder: Combinatorics", "desc":"Counting/permutation combinatorics problem."}
-    ]
-}
+    def standing(self, user):
+        if user not in self.best:
+            return None
+        rank, n = self.rank(user), len(self.best)
+        return {"rank": rank, "of": n, "top_percent": max(1, math.ceil(100 * rank / n)),
+                "percentile": round(100 * (n - rank) / n, 1)}
+
+    def page(self, start=0, k=20):
+        # entries start+1 .. start+k in rank order
+        stack, node, i = [], self.root, start
+        while node:
+            ls = _size(node.left)
+            if i < ls:
+                stack.append(node)
+                node = node.left
+            elif i == ls:
+                stack.append(node)
+                break
+            else:
+                i -= ls + 1
+                node = node.right
+        out = []
+        rank = prev = None
+        pos = start
+        while stack and len(out) < k:
+            node = stack.pop()
+            pos += 1
+            if node.key[:2] != prev:
+                rank = self._count_before(node.key[:2]) + 1 if prev is None else pos
+                prev = node.key[:2]
+            user = node.key[2]
+            correct, total, time_taken, ts = self.info[user]
+            out.append({"rank": rank, "user": user, "correct": correct, "total": total, "time_taken": time_taken, "ts": ts})
+            child = node.right
+            while child:
+                stack.append(child)
+                child = child.left
+        return out
+
+class Leaderboards:
+    def __init__(self, path=LEADERBOARD_FILE):
+        self.path = path
+        self.boards = {}
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    def _load(self):
+        self.loaded = True
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        r = json.loads(line)
+                        self.board(r["subject"], r["mode"]).submit(r["user"], r["correct"], r["total"], r["time_taken"], r["ts"])
+                    except (ValueError, KeyError, TypeError):
+                        continue  # torn line from a crash
+        except OSError:
+            pass
+
+    def board(self, subject, mode):
+        board = self.boards.get((subject, mode))
+        if board is None:
+            board = self.boards[(subject, mode)] = Leaderboard()
+        return board
+
+    def record(self, user, summary):
+        # -> the user's standing on that board after this result
+        row = {"subject": summary.get("subject", "Unknown"), "mode": summary.get("mode", "MCQ"), "user": user,
+               "correct": summary.get("correct", 0), "total": summary.get("total_questions", 0),
+               "time_taken": round(summary.get("time_taken") or 0.0, 3), "ts": time.time()}
+        with self.lock:
+            if not self.loaded:
+                self._load()
+            board = self.board(row["subject"], row["mode"])
+            if board.submit(user, row["correct"], row["total"], row["time_taken"], row["ts"]) and self.path:
+                get_journal_writer().append(self.path, json.dumps(row) + "\n")
+            return board.standing(user)
+
+    def standing(self, subject, mode, user):
+        with self.lock:
+            if not self.loaded:
+                self._load()
+            board = self.boards.get((subject, mode))
+            return board.standing(user) if board else None
+
+    def page(self, subject, mode, start=0, k=LEADERBOARD_PAGE):
+        with self.lock:
+            if not self.loaded:
+                self._load()
+            board = self.boards.get((subject, mode)) or Leaderboard()
+            return {"subject": subject, "mode": mode, "of": len(board), "entries": board.page(start, k)}
+
+LEADERBOARDS = Leaderboards()
+
+def format_standing(standing):
+    return f"Rank {standing['rank']:,} of {standing['of']:,} (top {standing['top_percent']}%)"
 
 # ----------------------------
 # Session profile and helpers
 # ----------------------------
+class P2Quantile:
+    # streaming quantile estimate (Jain & Chlamtac P² algorithm): five markers, O(1) per value
+    def __init__(self, p):
+        self.p = p
+        self.count = 0
+        self.q = []  # marker heights
+        self.n = [0, 1, 2, 3, 4]  # marker positions
+        self.want = [0, 2*p, 4*p, 2 + 2*p, 4]  # desired positions
+        self.step = [0, p/2, p, (1 + p)/2, 1]
+
+    def add(self, x):
+        self.count += 1
+        q, n = self.q, self.n
+        if len(q) < 5:
+            bisect.insort(q, x)
+            return
+        if x < q[0]:
+            q[0] = x
+        elif x > q[4]:
+            q[4] = x
+        k = min(3, max(0, bisect.bisect_right(q, x) - 1))
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.want[i] += self.step[i]
+        for i in range(1, 4):
+            d = self.want[i] - n[i]
+            if (d >= 1 and n[i+1] - n[i] > 1) or (d <= -1 and n[i-1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                qp = q[i] + d / (n[i+1] - n[i-1]) * ((n[i] - n[i-1] + d) * (q[i+1] - q[i]) / (n[i+1] - n[i])
+                                                     + (n[i+1] - n[i] - d) * (q[i] - q[i-1]) / (n[i] - n[i-1]))
+                if not q[i-1] < qp < q[i+1]:
+                    qp = q[i] + d * (q[i+d] - q[i]) / (n[i+d] - n[i])
+                q[i] = qp
+                n[i] += d
+
+    def value(self):
+        if not self.q:
+            return 0.0
+        if self.count <= 5:
+            return self.q[int(round(self.p * (len(self.q) - 1)))]
+        return self.q[2]
+
 class SessionProfile:
     def __init__(self, username):
         self.username = username
         self.tests_taken = []
         self.start_time = time.time()
+        # running aggregates, updated in record_test so reads never rescan tests_taken
+        self.totals = {"correct":0, "total":0, "tests":0}
+        self.by_subject = {}
+        self.by_mode = {}
+        self.time_count = 0
+        self.time_sum = 0.0
+        self.time_p50 = P2Quantile(0.5)
+        self.time_p95 = P2Quantile(0.95)
 
     def record_test(self, summary):
+        summary["standing"] = LEADERBOARDS.record(self.username, summary)
+        archive_result(self.username, summary)
+        archive_responses(self.username, summary)
         self.tests_taken.append(summary)
+        correct = summary.get("correct",0)
+        total = summary.get("total_questions",0)
+        for agg in (self.totals,
+                    self.by_subject.setdefault(summary.get("subject","Unknown"), {"correct":0, "total":0, "tests":0}),
+                    self.by_mode.setdefault(summary.get("mode","MCQ"), {"correct":0, "total":0, "tests":0})):
+            agg["correct"] += correct
+            agg["total"] += total
+            agg["tests"] += 1
+        t = summary.get("time_taken")
+        if t is not None:
+            self.time_count += 1
+            self.time_sum += t
+            self.time_p50.add(t)
+            self.time_p95.add(t)
+
+    @staticmethod
+    def _percent(agg):
+        if agg["total"] == 0: return 0.0
+        return (agg["correct"]/agg["total"])*100.0
 
     def get_overall_accuracy(self):
-        total_q = 0
-        correct = 0
-        for t in self.tests_taken:
-            total_q += t.get("total_questions",0)
-            correct += t.get("correct",0)
-        if total_q == 0: return 0.0
-        return (correct/total_q)*100.0
+        return self._percent(self.totals)
 
     def subject_accuracy(self):
-        subj = {}
-        for t in self.tests_taken:
-            name = t.get("subject","Unknown")
-            subj.setdefault(name, {"correct":0,"total":0})
-            subj[name]["correct"] += t.get("correct",0)
-            subj[name]["total"] += t.get("total_questions",0)
-        out = {}
-        for k,v in subj.items():
-            if v["total"]==0: out[k]=0.0
-            else: out[k]= (v["correct"]/v["total"])*100.0
-        return out
+        return {k: self._percent(v) for k,v in self.by_subject.items()}
+
+    def mode_accuracy(self):
+        return {k: self._percent(v) for k,v in self.by_mode.items()}
+
+    def time_stats(self):
+        mean = self.time_sum/self.time_count if self.time_count else 0.0
+        return {"count": self.time_count, "mean": mean, "p50": self.time_p50.value(), "p95": self.time_p95.value()}
+
+# ----------------------------
+# Shared exam clock
+# ----------------------------
+# One root.after() chain drives the countdown of every open exam window. Deadlines are on
+# time.monotonic(), so wall-clock changes do not move them. The clock sleeps until the next
+# moment any window's displayed second changes, repaints only those labels, and calls
+# time_up() on a window exactly at its deadline. Views provide .root, .session,
+# show_remaining(seconds) and time_up().
+class ExamClock:
+    def __init__(self, root):
+        self.root = root
+        self.views = {}  # view -> seconds currently displayed (None until first paint)
+        self.after_id = None
+
+    def register(self, view):
+        self.views[view] = None
+        self._schedule()
+
+    def unregister(self, view):
+        self.views.pop(view, None)
+
+    def _next_wake(self, now):
+        wake = None
+        for view, shown in self.views.items():
+            if shown is None or shown <= 0:
+                return now
+            # the display drops from `shown` to `shown - 1` at this instant
+            t = view.session.deadline() - (shown - 1)
+            wake = t if wake is None else min(wake, t)
+        return wake
+
+    def _schedule(self):
+        if self.after_id is not None:
+            self.root.after_cancel(self.after_id)
+            self.after_id = None
+        if not self.views:
+            return
+        now = time.monotonic()
+        delay = max(0, math.ceil((self._next_wake(now) - now) * 1000))
+        self.after_id = self.root.after(delay, self._tick)
+
+    def _tick(self):
+        self.after_id = None
+        try:
+            now = time.monotonic()
+            for view in list(self.views):
+                try:
+                    alive = view.root.winfo_exists()
+                except tk.TclError:
+                    alive = False
+                if not alive:
+                    del self.views[view]
+                    continue
+                left = view.session.deadline() - now
+                shown = max(0, math.ceil(left))
+                if shown != self.views[view]:
+                    self.views[view] = shown
+                    view.show_remaining(shown)
+                if left <= 0:
+                    del self.views[view]
+                    view.time_up()
+        finally:
+            # one failing view must not stop every other window's countdown
+            self._schedule()
+
+def format_remaining(seconds):
+    mins, secs = divmod(seconds, 60)
+    return f"Time Remaining: {mins:02d}:{secs:02d}"
+
+# ----------------------------
+# HTTP exam server (--serve)
+# ----------------------------
+# The same flows as the desktop app as a small HTTP/JSON API on asyncio, so one lab machine
+# can serve a classroom of browser clients from a single process. Exam state lives in
+# ExamSession objects; code runs and judging go to a bounded thread pool in front of the
+# worker pool, so they never block the event loop. When all run slots are busy the
+# server answers 503 instead of queueing without limit.
+#
+#   GET  /api/subjects                      categories and subjects
+#   POST /api/sessions                      {"user", "subject", "mode": "MCQ" | "Coding"}
+#   GET  /api/sessions/<id>                 current state
+#   POST /api/sessions/<id>/goto            {"i"}
+#   POST /api/sessions/<id>/answer          {"option", "i"?}
+#   POST /api/sessions/<id>/mark            {"i"?}
+#   POST /api/sessions/<id>/code            {"code", "i"?}
+#   POST /api/sessions/<id>/run             {"code", "stdin"?}
+#   POST /api/sessions/<id>/submit          -> summary
+#   GET  /api/profiles/<user>               SessionProfile summary
+def _load_server_modules():
+    # everything the server needs beyond the app, imported once when a server is built
+    # (the GUI never pays for it); binds module globals used by ExamServer
+    global asyncio, secrets, urllib, HTTPStatus, ThreadPoolExecutor
+    import asyncio, secrets, urllib.parse
+    from http import HTTPStatus
+    from concurrent.futures import ThreadPoolExecutor
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+def public_items(session):
+    # what a client may see: never the answer key or the test cases
+    if session.mode == "MCQ":
+        return [{"question": q["question"], "options": q["options"], "difficulty": q.get("difficulty")} for q in session.items]
+    return [{"title": p["title"], "desc": p["desc"]} for p in session.items]
+
+def public_summary(summary):
+    # the submit response: scores and timing only, so the paper's answer key stays on the server
+    out = {k: summary.get(k) for k in ("subject", "mode", "correct", "attempted", "total_questions",
+                                       "time_taken", "avg_time_per_question", "standing")}
+    if summary.get("mode") == "Coding":
+        out["judge"] = [{"title": r["title"], "passed": r["passed"], "total": r["total"], "solved": r["solved"],
+                         "cases": [{k: c.get(k) for k in ("verdict", "time", "detail")} for c in r["cases"]]}
+                        for r in summary.get("judge", [])]
+    return out
+
+def session_state(session):
+    state = {
+        "subject": session.subject,
+        "mode": session.mode,
+        "count": session.n,
+        "current": session.current,
+        "remaining": session.remaining(),
+        "status": [session.status(i) for i in range(session.n)],
+        "selected": list(session.selected),
+        "submitted": session.summary is not None,
+    }
+    if session.mode == "Coding":
+        state["answers"] = session.answers
+    return state
+
+def profile_summary(profile):
+    return {
+        "user": profile.username,
+        "tests_taken": len(profile.tests_taken),
+        "overall_accuracy": profile.get_overall_accuracy(),
+        "subject_accuracy": profile.subject_accuracy(),
+        "mode_accuracy": profile.mode_accuracy(),
+        "time": profile.time_stats(),
+        "recent": [{k: t.get(k) for k in ("subject", "mode", "correct", "attempted", "total_questions", "time_taken")}
+                   for t in profile.tests_taken[-20:]],
+    }
+
+class ExamServer:
+    def __init__(self):
+        self.sessions = {}  # id -> ExamSession / CodingSession
+        self.owners = {}  # id -> username
+        self.closed_at = {}  # id -> monotonic time the session was submitted
+        self.finishing = {}  # id -> task grading/submitting it, shared by a client submit and the sweeper
+        self.profiles = {}  # username -> SessionProfile
+        _load_server_modules()
+        self.executor = ThreadPoolExecutor(max_workers=SERVER_EXEC_WORKERS)
+        self.run_slots = None  # asyncio.Semaphore, created inside the running loop
+
+    def profile(self, user):
+        profile = self.profiles.get(user)
+        if profile is None:
+            profile = self.profiles[user] = SessionProfile(user)
+        return profile
+
+    async def run(self, host, port):
+        self.run_slots = asyncio.Semaphore(SERVER_MAX_PENDING_RUNS)
+        server = await asyncio.start_server(self.handle, host, port)
+        sweeper = asyncio.ensure_future(self.sweep())
+        print(f"Exam server listening on http://{host}:{port}/api/subjects")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            sweeper.cancel()
+            self.executor.shutdown(wait=False)
+
+    async def sweep(self):
+        # submit sessions whose time ran out and forget finished ones after a while
+        while True:
+            await asyncio.sleep(SERVER_SWEEP_INTERVAL)
+            now = time.monotonic()
+            for sid, session in list(self.sessions.items()):
+                if session.summary is None and session.remaining() <= 0:
+                    try:
+                        await self.finish(sid)
+                    except Exception as e:
+                        # e.g. every runner busy: leave it expired and try again next tick
+                        print(f"auto-submit of session {sid} failed: {e!r}", file=sys.stderr)
+                elif session.summary is not None and now - self.closed_at.get(sid, now) > SERVER_SESSION_TTL:
+                    for table in (self.sessions, self.owners, self.closed_at):
+                        table.pop(sid, None)
+
+    async def offload(self, fn, *args):
+        if self.run_slots.locked():
+            raise ApiError(503, "all code runners are busy, try again shortly")
+        async with self.run_slots:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def finish(self, sid):
+        session = self.sessions[sid]
+        if session.summary is not None:
+            return session.summary
+        task = self.finishing.get(sid)
+        if task is None:
+            task = self.finishing[sid] = asyncio.ensure_future(self._finish(sid))
+            task.add_done_callback(lambda _: self.finishing.pop(sid, None))
+        return await asyncio.shield(task)
+
+    async def _finish(self, sid):
+        session = self.sessions[sid]
+        if session.mode == "Coding":
+            session.finish_timing()
+            try:
+                results = await self.offload(session.grade)
+            except BaseException:
+                # not graded (runners busy, judge failed, cancelled): the attempt is live again,
+                # so its clock runs on and the sweeper submits it once time is up
+                session.resume_timing()
+                raise
+            summary = session.submit(results)
+        else:
+            summary = session.submit()
+        self.profile(self.owners[sid]).record_test(summary)
+        self.closed_at[sid] = time.monotonic()
+        return summary
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    break
+                lines = head.decode("latin-1").split("\r\n")
+                method, target, version = lines[0].split(" ", 2)
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        k, v = line.split(":", 1)
+                        headers[k.strip().lower()] = v.strip()
+                length = int(headers.get("content-length") or 0)
+                if length > SERVER_MAX_BODY:
+                    await self.respond(writer, 413, {"error": "request body too large"}, False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                url = urllib.parse.urlsplit(target)
+                status, payload = await self.dispatch(method, url.path, body, url.query)
+                keep = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                await self.respond(writer, status, payload, keep)
+                if not keep:
+                    break
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, payload, keep):
+        body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+        head = [
+            f"HTTP/1.1 {status} {HTTPStatus(status).phrase}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(body)}",
+            "Access-Control-Allow-Origin: *",
+            "Access-Control-Allow-Headers: Content-Type",
+            "Access-Control-Allow-Methods: GET, POST, OPTIONS",
+            f"Connection: {'keep-alive' if keep else 'close'}",
+        ]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    async def dispatch(self, method, path, body, query=""):
+        if method == "OPTIONS":
+            return 204, None
+        try:
+            data = json.loads(body) if body else {}
+            if not isinstance(data, dict):
+                raise ApiError(400, "expected a JSON object")
+            if method == "GET" and query:
+                # only reads take query parameters (e.g. leaderboard paging); a body still wins
+                data = dict(urllib.parse.parse_qsl(query), **data)
+            return 200, await self.route(method, [p for p in path.split("/") if p], data)
+        except ApiError as e:
+            return e.status, {"error": e.message}
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            return 400, {"error": f"bad request: {e}"}
+        except Exception as e:
+            # e.g. no worker could start or fork failed: answer the client instead of dropping it
+            print(f"{method} {path} failed: {e!r}", file=sys.stderr)
+            return 500, {"error": "internal server error"}
+
+    def session(self, sid):
+        session = self.sessions.get(sid)
+        if session is None:
+            raise ApiError(404, "no such session")
+        return session
+
+    async def route(self, method, parts, data):
+        if parts[:1] != ["api"]:
+            raise ApiError(404, "not found")
+        parts = parts[1:]
+        if parts == ["subjects"] and method == "GET":
+            return {"categories": CATEGORIES, "subjects": SUBJECTS}
+        if parts[:1] == ["profiles"] and len(parts) == 2 and method == "GET":
+            if parts[1] not in self.profiles:
+                raise ApiError(404, "no such user")
+            return profile_summary(self.profiles[parts[1]])
+        if parts[:1] == ["leaderboards"] and len(parts) == 3 and method == "GET":
+            subject, mode = parts[1], parts[2]
+            k = min(int(data.get("k", LEADERBOARD_PAGE)), 100)
+            board = LEADERBOARDS.page(subject, mode, max(0, int(data.get("start", 0))), k)
+            if data.get("user"):
+                board["standing"] = LEADERBOARDS.standing(subject, mode, str(data["user"]))
+            return board
+        if parts == ["sessions"] and method == "POST":
+            return self.start(data)
+        if parts[:1] == ["sessions"] and len(parts) in (2, 3):
+            sid = parts[1]
+            session = self.session(sid)
+            if session.summary is None and session.remaining() <= 0:
+                await self.finish(sid)
+            action = parts[2] if len(parts) == 3 else None
+            if action is None and method == "GET":
+                return session_state(session)
+            if method != "POST":
+                raise ApiError(405, "method not allowed")
+            if action == "submit":
+                return public_summary(await self.finish(sid))
+            if session.summary is not None:
+                raise ApiError(409, "session already submitted")
+            i = int(data.get("i", session.current))
+            if not 0 <= i < session.n:
+                raise ApiError(400, "question index out of range")
+            if action == "goto":
+                session.goto(i)
+                return {"current": session.current}
+            if action == "answer" and session.mode == "MCQ":
+                option = int(data["option"])
+                if not 0 <= option <= 4:
+                    raise ApiError(400, "option must be 0-4")
+                session.answer(option, i)
+                return {"i": i, "status": session.status(i)}
+            if action == "mark":
+                return {"i": i, "marked": session.toggle_mark(i)}
+            if action == "code" and session.mode == "Coding":
+                session.save_answer(str(data["code"]), i)
+                return {"i": i, "saved": True}
+            if action == "run" and session.mode == "Coding":
+                if not can_execute(session.subject):
+                    raise ApiError(400, f"{session.subject} problems cannot be executed on this server")
+                res = await self.offload(run_program, session.subject, str(data["code"]), str(data.get("stdin", "")))
+                session.record_run(res["usage"])
+                return res
+        raise ApiError(404, "not found")
+
+    def start(self, data):
+        user = str(data.get("user") or "Guest")
+        subject = data["subject"]
+        mode = data.get("mode", "MCQ")
+        if mode == "MCQ":
+            items = draw_mcq_paper(subject, username=user)
+            session = ExamSession(subject, items)
+        elif mode == "Coding":
+            items = draw_coding_set(subject)
+            session = CodingSession(subject, items, user=user)
+        else:
+            raise ApiError(400, "mode must be MCQ or Coding")
+        if not items:
+            raise ApiError(404, f"no {mode} items for subject {subject!r}")
+        session.start()
+        sid = secrets.token_urlsafe(12)
+        self.sessions[sid] = session
+        self.owners[sid] = user
+        self.profile(user)
+        return {"id": sid, "duration": session.duration, "items": public_items(session), "state": session_state(session)}
+
+def serve(host=SERVER_HOST, port=SERVER_PORT):
+    _load_server_modules()
+    try:
+        asyncio.run(ExamServer().run(host, port))
+    except KeyboardInterrupt:
+        pass
+
+# ----------------------------
+# Load benchmark (--bench)
+# ----------------------------
+# Simulates a cohort of candidates taking MCQ tests (and bursts of code runs) against the
+# same engine the app and the server use, then reports throughput, latency percentiles per
+# operation and peak memory. Reports are JSON so a saved one can be used as a baseline:
+#   python Exam_portal.py --bench classroom --out base.json
+#   python Exam_portal.py --bench classroom --compare base.json   # exits 1 on regressions
+BENCH_FORMAT = 1
+BENCH_SCENARIOS = {
+    # candidates: simulated users, concurrency: how many act at once, actions: per attempt
+    # think: mean seconds between actions (exponential), weights: answer/mark/navigate mix
+    # coders: share of candidates that also run code, burst: back-to-back runs per coder
+    "smoke": {"candidates": 20, "concurrency": 4, "actions": 60, "think": 0.0,
+              "weights": {"answer": 6, "mark": 1, "navigate": 3}, "coders": 0.25, "burst": 2},
+    "classroom": {"candidates": 60, "concurrency": 60, "actions": 120, "think": 0.005,
+                  "weights": {"answer": 6, "mark": 1, "navigate": 3}, "coders": 0.2, "burst": 3},
+    "exam-hall": {"candidates": 500, "concurrency": 100, "actions": 150, "think": 0.002,
+                  "weights": {"answer": 6, "mark": 1, "navigate": 3}, "coders": 0.1, "burst": 5},
+}
+BENCH_SNIPPETS = [
+    ("print(sum(map(int, input().split())))", "1 2 3 4 5\n"),
+    ("s = input()\nprint(s[::-1])", "benchmark\n"),
+    ("print(sum(i * i for i in range(20000)))", ""),
+    ("import sys\nprint(len(sys.stdin.read().split()))", "a b c d e f g\n"),
+]
+BENCH_TOLERANCE = 0.25  # allowed p95 / throughput drift against a baseline
+BENCH_MIN_DELTA = 0.0005  # seconds; smaller p95 differences are noise
+
+def percentile(sorted_samples, p):
+    if not sorted_samples:
+        return 0.0
+    k = (len(sorted_samples) - 1) * p
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_samples) - 1)
+    return sorted_samples[lo] + (sorted_samples[hi] - sorted_samples[lo]) * (k - lo)
+
+def peak_memory_kb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak  # macOS reports bytes
+
+def simulate_candidate(idx, scenario, seed):
+    # one candidate's attempt; returns {op: [latency, ...]}, error count
+    rng = random.Random(f"{seed}:{idx}")
+    lat = {"start": [], "answer": [], "mark": [], "navigate": [], "submit": [], "run_code": []}
+    errors = 0
+    ops = list(scenario["weights"])
+    weights = [scenario["weights"][op] for op in ops]
+    think = scenario["think"]
+
+    t = time.perf_counter()
+    subject = rng.choice(SUBJECTS)
+    items = QUESTION_BANK.paper(subject, seed=seed)
+    rng.shuffle(items)
+    session = ExamSession(subject, items)
+    session.start()
+    lat["start"].append(time.perf_counter() - t)
+
+    for _ in range(scenario["actions"]):
+        if think:
+            time.sleep(rng.expovariate(1 / think))
+        op = rng.choices(ops, weights)[0]
+        t = time.perf_counter()
+        if op == "answer":
+            session.answer(rng.randint(1, 4))
+        elif op == "mark":
+            session.toggle_mark()
+        elif not session.next():
+            session.goto(rng.randrange(session.n))
+        lat[op].append(time.perf_counter() - t)
+
+    if rng.random() < scenario["coders"]:
+        for _ in range(scenario["burst"]):
+            code, stdin = rng.choice(BENCH_SNIPPETS)
+            t = time.perf_counter()
+            res = run_python(code, stdin)
+            lat["run_code"].append(time.perf_counter() - t)
+            if res["returncode"] != 0:
+                errors += 1
+
+    t = time.perf_counter()
+    session.submit()
+    lat["submit"].append(time.perf_counter() - t)
+    return lat, errors
+
+def run_benchmark(name="smoke", seed=BANK_SEED, **overrides):
+    from concurrent.futures import ThreadPoolExecutor
+    scenario = dict(BENCH_SCENARIOS[name], **{k: v for k, v in overrides.items() if v is not None})
+    run_python("pass")  # warm the worker pool outside the timed region
+    for subject in SUBJECTS:
+        QUESTION_BANK.paper(subject, seed=seed)
+    samples = {}
+    errors = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=scenario["concurrency"]) as ex:
+        futures = [ex.submit(simulate_candidate, i, scenario, seed) for i in range(scenario["candidates"])]
+        for f in futures:
+            lat, errs = f.result()
+            errors += errs
+            for op, xs in lat.items():
+                samples.setdefault(op, []).extend(xs)
+    wall = time.perf_counter() - start
+    ops = {}
+    total_ops = 0
+    for op, xs in samples.items():
+        if not xs:
+            continue
+        xs.sort()
+        total_ops += len(xs)
+        ops[op] = {
+            "count": len(xs),
+            "mean": sum(xs) / len(xs),
+            "p50": percentile(xs, 0.50),
+            "p95": percentile(xs, 0.95),
+            "p99": percentile(xs, 0.99),
+            "max": xs[-1],
+        }
+    return {
+        "format": BENCH_FORMAT,
+        "scenario": name,
+        "params": scenario,
+        "seed": seed,
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "cpus": os.cpu_count(),
+        "wall_time": wall,
+        "throughput": {"ops_per_sec": total_ops / wall, "candidates_per_sec": scenario["candidates"] / wall},
+        "ops": ops,
+        "peak_rss_kb": peak_memory_kb(),
+        "errors": errors,
+    }
+
+def compare_benchmarks(report, baseline, tolerance=BENCH_TOLERANCE):
+    # list of human-readable regressions of report against baseline
+    problems = []
+    for op, base in baseline.get("ops", {}).items():
+        cur = report["ops"].get(op)
+        if cur is None:
+            continue
+        if cur["p95"] > base["p95"] * (1 + tolerance) and cur["p95"] - base["p95"] > BENCH_MIN_DELTA:
+            problems.append(f"{op}: p95 {base['p95']*1000:.2f} ms -> {cur['p95']*1000:.2f} ms")
+    base_tp = baseline.get("throughput", {}).get("ops_per_sec")
+    if base_tp and report["throughput"]["ops_per_sec"] < base_tp * (1 - tolerance):
+        problems.append(f"throughput: {base_tp:.0f} -> {report['throughput']['ops_per_sec']:.0f} ops/s")
+    base_rss, cur_rss = baseline.get("peak_rss_kb"), report.get("peak_rss_kb")
+    if base_rss and cur_rss and cur_rss > base_rss * (1 + tolerance):
+        problems.append(f"peak memory: {base_rss} -> {cur_rss} KiB")
+    return problems
+
+def format_benchmark(report):
+    lines = [f"scenario {report['scenario']}: {report['params']['candidates']} candidates in {report['wall_time']:.2f}s "
+             f"({report['throughput']['ops_per_sec']:.0f} ops/s, {report['throughput']['candidates_per_sec']:.1f} candidates/s)"]
+    lines.append(f"{'op':<10}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for op, s in report["ops"].items():
+        lines.append(f"{op:<10}{s['count']:>8}{s['p50']*1000:>10.3f}{s['p95']*1000:>10.3f}{s['p99']*1000:>10.3f}{s['max']*1000:>10.3f}")
+    if report["peak_rss_kb"] is not None:
+        lines.append(f"peak RSS {report['peak_rss_kb'] / 1024:.1f} MiB")
+    if report["errors"]:
+        lines.append(f"{report['errors']} code runs failed")
+    return "\n".join(lines)
+
+def bench_main(args):
+    report = run_benchmark(args.bench, seed=BANK_SEED if args.seed is None else args.seed, candidates=args.candidates, think=args.think)
+    print(format_benchmark(report))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            problems = compare_benchmarks(report, json.load(f))
+        for p in problems:
+            print("REGRESSION", p)
+        return 1 if problems else 0
+    return 0
+
+# ----------------------------
+# Startup profiling (--profile-startup)
+# ----------------------------
+# Stages are timed from STARTUP_T0 (the top of this file). --profile-startup builds the app
+# without waiting on the login prompt, reports when each stage was reached, then asks a
+# fresh interpreter for an -X importtime breakdown of loading this file.
+STARTUP_MARKS = []  # (stage, seconds since STARTUP_T0)
+STARTUP_BUDGET = 0.5  # seconds to the login window; --profile-startup exits 1 above it
+
+def startup_mark(stage):
+    STARTUP_MARKS.append((stage, time.perf_counter() - STARTUP_T0))
+
+def import_breakdown():
+    # [(module, self_us, cumulative_us)] for the imports this file triggers directly,
+    # plus the wall time of the fresh interpreter that loaded it
+    import subprocess
+    folder, name = os.path.split(os.path.abspath(__file__))
+    module = os.path.splitext(name)[0]
+    code = f"import sys; sys.path.insert(0, {folder!r}); import {module}"
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    wall = time.perf_counter() - started
+    rows, pending = [], []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        self_us, cum_us, name = int(parts[0]), int(parts[1]), parts[2]
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        name = name.strip()
+        if depth == 1:
+            pending.append((name, self_us, cum_us))
+        elif depth == 0:
+            # children are listed before their parent
+            if name == module:
+                rows = pending
+            pending = []
+    return rows, wall
+
+def profile_startup(top=12):
+    startup_mark("main")
+    try:
+        root = tk.Tk()
+        startup_mark("tk")
+        SmartExamApp(root, username="startup-profile")
+        root.update()
+        startup_mark("drawn")
+        root.destroy()
+    except tk.TclError as e:
+        print(f"no display, window stages skipped ({e})")
+    prev = 0.0
+    print(f"{'stage':<12}{'at ms':>10}{'delta ms':>10}")
+    for stage, at in STARTUP_MARKS:
+        print(f"{stage:<12}{at*1000:>10.1f}{(at-prev)*1000:>10.1f}")
+        prev = at
+    rows, wall = import_breakdown()
+    print(f"\nloading this file in a fresh interpreter: {wall*1000:.0f} ms; slowest direct imports:")
+    print(f"{'module':<28}{'self ms':>10}{'total ms':>10}")
+    for name, self_us, cum_us in sorted(rows, key=lambda r: -r[2])[:top]:
+        print(f"{name:<28}{self_us/1000:>10.1f}{cum_us/1000:>10.1f}")
+    login = dict(STARTUP_MARKS).get("login")
+    if login is not None:
+        print(f"\ntime to first window (login): {login*1000:.0f} ms (budget {STARTUP_BUDGET*1000:.0f} ms)")
+        return 1 if login > STARTUP_BUDGET else 0
+    return 0
 
 # ----------------------------
 # Main Tkinter App
 # ----------------------------
 class SmartExamApp:
-    def __init__(self, root):
+    def __init__(self, root, username=None):
         self.root = root
         self.root.title(WINDOW_TITLE)
         self.root.geometry(WINDOW_SIZE)
         self.root.minsize(1000, 650)
         self.theme = DEFAULT_THEME
+
+        # user login first: it is the first window the user sees, everything else can wait
+        if username is None:
+            def login_mapped(event):
+                # --profile-startup times the login dialog actually appearing, not the call that builds it
+                self.root.unbind_class("Toplevel", "<Map>")
+                startup_mark("login")
+            self.root.bind_class("Toplevel", "<Map>", login_mapped, add="+")
+            username = simpledialog.askstring("Login", "Enter your name for the session:", parent=self.root)
+        else:
+            startup_mark("login")
+        if not username:
+            username = "Guest"
+        self.profile = SessionProfile(username)
+
         # fonts
+        import tkinter.font as tkfont
         self.title_font = tkfont.Font(family="Inter", size=18, weight="bold")
         self.h2_font = tkfont.Font(family="Inter", size=14, weight="bold")
         self.normal_font = tkfont.Font(family="Inter", size=11)
         self.small_font = tkfont.Font(family="Inter", size=10)
+        # dashboard screens use ttk styles, so a theme switch is one style update
+        self.style = ttk.Style(self.root)
+        self.style.theme_use("clam")
+        self.themed_texts = []  # tk.Text widgets (not ttk) recoloured on theme change
+        self.clock = ExamClock(self.root)  # one countdown scheduler for all exam windows
 
-        # user login
-        username = simpledialog.askstring("Login", "Enter your name for the session:", parent=self.root)
-        if not username:
-            username = "Guest"
-        self.profile = SessionProfile(username)
-
-        # UI frames
+        # UI frames; each screen is built once, cached and re-packed on demand
+        self.screens = {}
+        self.current_screen = None
         self.create_menu()
-        self.main_frame = tk.Frame(self.root)
+        self.main_frame = ttk.Frame(self.root, style="App.TFrame")
         self.main_frame.pack(fill="both", expand=True)
         self.apply_theme()
         self.show_home()
+        startup_mark("dashboard")
+        # journal scan once the dashboard has been drawn
+        self.root.after(200, self.offer_resume)
+
+    def offer_resume(self):
+        for state in load_unfinished_attempts(user=self.profile.username):
+            when = time.strftime("%d %b %H:%M", time.localtime(state["started"]))
+            mins = int(state["elapsed"] // 60)
+            if messagebox.askyesno("Resume attempt",
+                                   f"An unfinished {state['kind']} test in {state['subject']} (started {when}, "
+                                   f"{mins} min in) was found.\n\nResume it?", parent=self.root):
+                if state["kind"] == "MCQ":
+                    TestWindow(self, state["subject"], state["payload"]["questions"], mode="MCQ", resume=state)
+                else:
+                    problems = state["payload"].get("problems") or CODING_BANK.get(state["subject"], [])
+                    CodingWindow(self, state["subject"], problems, resume=state)
+            else:
+                get_journal_writer().remove(state["path"])  # only ever this user's own journal
 
     def create_menu(self):
         menubar = tk.Menu(self.root)
@@ -281,11 +4341,31 @@ class SmartExamApp:
         menubar.add_cascade(label="App", menu=app_menu)
         view_menu = tk.Menu(menubar, tearoff=0)
         view_menu.add_command(label="Toggle Theme", command=self.toggle_theme)
+        view_menu.add_command(label="Diagnostics", command=lambda: DiagnosticsWindow(self))
         menubar.add_cascade(label="View", menu=view_menu)
 
+    @timed("exam_clear_main_seconds")
     def clear_main(self):
-        for w in self.main_frame.winfo_children():
-            w.destroy()
+        # hide the visible screen; it stays cached for the next visit
+        if self.current_screen is not None:
+            self.current_screen.pack_forget()
+            self.current_screen = None
+
+    def show_screen(self, key, build, refresh=None):
+        self.clear_main()
+        frame = self.screens.get(key)
+        screen = key if isinstance(key, str) else ":".join(key)
+        METRICS.inc("exam_screen_shows_total", screen=screen, cached=str(frame is not None).lower())
+        if frame is None:
+            started = time.perf_counter()
+            frame = ttk.Frame(self.main_frame, style="App.TFrame")
+            build(frame)
+            self.screens[key] = frame
+            METRICS.observe("exam_screen_build_seconds", time.perf_counter() - started, screen=screen)
+        frame.pack(fill="both", expand=True)
+        self.current_screen = frame
+        if refresh:
+            refresh()
 
     def toggle_theme(self):
         self.theme = "light" if self.theme=="dark" else "dark"
@@ -307,53 +4387,54 @@ class SmartExamApp:
             self.btn_bg = "#2563eb"
             self.btn_fg = "#ffffff"
         self.root.configure(bg=self.bg)
-        for w in self.main_frame.winfo_children():
-            try:
-                w.configure(bg=self.bg)
-            except:
-                pass
+        st = self.style
+        st.configure("App.TFrame", background=self.bg)
+        st.configure("Card.TFrame", background=self.card)
+        st.configure("App.TLabel", background=self.bg, foreground=self.fg, font=self.normal_font)
+        st.configure("Title.TLabel", background=self.bg, foreground=self.fg, font=self.title_font)
+        st.configure("H2.TLabel", background=self.bg, foreground=self.fg, font=self.h2_font)
+        st.configure("Card.TLabel", background=self.card, foreground=self.fg)
+        st.configure("CardH2.TLabel", background=self.card, foreground=self.fg, font=self.h2_font)
+        st.configure("CardSmall.TLabel", background=self.card, foreground=self.fg, font=self.small_font)
+        st.configure("Accent.TButton", background=self.btn_bg, foreground=self.btn_fg, relief="flat", borderwidth=0)
+        st.map("Accent.TButton", background=[("active", self.btn_bg)])
+        for t in self.themed_texts:
+            t.configure(bg=self.card, fg=self.fg)
 
     def show_home(self):
-        self.clear_main()
-        self.apply_theme()
-        top = tk.Frame(self.main_frame, bg=self.bg)
+        self.show_screen("home", self.build_home, self.update_summary_text)
+
+    def build_home(self, frame):
+        top = ttk.Frame(frame, style="App.TFrame")
         top.pack(fill="x", padx=18, pady=12)
-        title = tk.Label(top, text="Smart Exam Portal", font=self.title_font, bg=self.bg, fg=self.fg)
-        title.pack(side="left")
-        user_lbl = tk.Label(top, text=f"User: {self.profile.username}", font=self.normal_font, bg=self.bg, fg=self.fg)
-        user_lbl.pack(side="right")
-        body = tk.Frame(self.main_frame, bg=self.bg)
+        ttk.Label(top, text="Smart Exam Portal", style="Title.TLabel").pack(side="left")
+        ttk.Label(top, text=f"User: {self.profile.username}", style="App.TLabel").pack(side="right")
+        body = ttk.Frame(frame, style="App.TFrame")
         body.pack(fill="both", expand=True, padx=18, pady=6)
-        left = tk.Frame(body, width=360, bg=self.bg)
+        left = ttk.Frame(body, width=360, style="App.TFrame")
         left.pack(side="left", fill="y", padx=(0,12))
         for cat, subs in CATEGORIES.items():
-            card = tk.Frame(left, bg=self.card, bd=0, relief="ridge", padx=10, pady=8)
+            card = ttk.Frame(left, style="Card.TFrame", padding=(10, 8))
             card.pack(fill="x", pady=8)
-            lbl = tk.Label(card, text=cat, font=self.h2_font, bg=self.card, fg=self.fg)
-            lbl.pack(anchor="w")
-            desc = tk.Label(card, text=f"{len(subs)} subjects", font=self.small_font, bg=self.card, fg=self.fg)
-            desc.pack(anchor="w")
+            ttk.Label(card, text=cat, style="CardH2.TLabel").pack(anchor="w")
+            ttk.Label(card, text=f"{len(subs)} subjects", style="CardSmall.TLabel").pack(anchor="w")
             for s in subs:
-                btn = tk.Button(card, text=f"Open {s}", command=lambda sub=s: self.show_subject(sub),
-                                bg=self.btn_bg, fg=self.btn_fg, relief="flat")
-                btn.pack(side="left", padx=4, pady=6)
+                ttk.Button(card, text=f"Open {s}", command=lambda sub=s: self.show_subject(sub),
+                           style="Accent.TButton").pack(side="left", padx=4, pady=6)
 
-        right = tk.Frame(body, bg=self.bg)
+        right = ttk.Frame(body, style="App.TFrame")
         right.pack(side="left", fill="both", expand=True)
-        actions = tk.Frame(right, bg=self.card, padx=12, pady=12)
+        actions = ttk.Frame(right, style="Card.TFrame", padding=12)
         actions.pack(fill="x")
-        a1 = tk.Button(actions, text="All Tests", command=self.show_all_tests, bg=self.btn_bg, fg=self.btn_fg, relief="flat")
-        a1.pack(side="left", padx=6)
-        a2 = tk.Button(actions, text="Profile", command=self.show_profile, bg=self.btn_bg, fg=self.btn_fg, relief="flat")
-        a2.pack(side="left", padx=6)
+        ttk.Button(actions, text="All Tests", command=self.show_all_tests, style="Accent.TButton").pack(side="left", padx=6)
+        ttk.Button(actions, text="Profile", command=self.show_profile, style="Accent.TButton").pack(side="left", padx=6)
 
-        recent = tk.Frame(right, bg=self.card, padx=12, pady=12)
+        recent = ttk.Frame(right, style="Card.TFrame", padding=12)
         recent.pack(fill="both", expand=True, pady=12)
-        rlbl = tk.Label(recent, text="Session Summary", font=self.h2_font, bg=self.card, fg=self.fg)
-        rlbl.pack(anchor="w")
+        ttk.Label(recent, text="Session Summary", style="CardH2.TLabel").pack(anchor="w")
         self.summary_text = tk.Text(recent, height=12, bg=self.card, fg=self.fg, bd=0)
         self.summary_text.pack(fill="both", expand=True, pady=8)
-        self.update_summary_text()
+        self.themed_texts.append(self.summary_text)
 
     def update_summary_text(self):
         self.summary_text.delete("1.0", tk.END)
@@ -362,102 +4443,133 @@ class SmartExamApp:
         self.summary_text.insert(tk.END, f"Total tests taken: {len(self.profile.tests_taken)}\n\n")
         for t in self.profile.tests_taken[-8:]:
             self.summary_text.insert(tk.END, f"- {t.get('subject')} | {t.get('mode')} | Score: {t.get('correct')}/{t.get('total_questions')} | Time: {t.get('time_taken'):.1f}s\n")
+        if self.current_screen is self.screens.get("profile"):
+            self.refresh_profile()
 
     def show_all_tests(self):
-        self.clear_main()
-        self.apply_theme()
-        header = tk.Frame(self.main_frame, bg=self.bg)
+        self.show_screen("all_tests", self.build_all_tests)
+
+    def build_all_tests(self, frame):
+        header = ttk.Frame(frame, style="App.TFrame")
         header.pack(fill="x", padx=12, pady=8)
-        lbl = tk.Label(header, text="All Available Tests", font=self.title_font, bg=self.bg, fg=self.fg)
-        lbl.pack(anchor="w")
-        container = tk.Frame(self.main_frame, bg=self.bg)
+        ttk.Label(header, text="All Available Tests", style="Title.TLabel").pack(anchor="w")
+        container = ttk.Frame(frame, style="App.TFrame")
         container.pack(fill="both", expand=True, padx=12, pady=6)
         for subj in SUBJECTS:
-            card = tk.Frame(container, bg=self.card, padx=10, pady=10)
+            card = ttk.Frame(container, style="Card.TFrame", padding=10)
             card.pack(fill="x", pady=6)
-            l = tk.Label(card, text=subj, font=self.h2_font, bg=self.card, fg=self.fg)
-            l.pack(side="left")
-            mbtn = tk.Button(card, text="MCQ Test", command=lambda s=subj: self.start_mcq_test(s),
-                             bg=self.btn_bg, fg=self.btn_fg, relief="flat")
-            mbtn.pack(side="right", padx=6)
-            cbtn = tk.Button(card, text="Coding Test", command=lambda s=subj: self.start_coding_test(s),
-                             bg=self.btn_bg, fg=self.btn_fg, relief="flat")
-            cbtn.pack(side="right", padx=6)
+            ttk.Label(card, text=subj, style="CardH2.TLabel").pack(side="left")
+            ttk.Button(card, text="MCQ Test", command=lambda s=subj: self.start_mcq_test(s),
+                       style="Accent.TButton").pack(side="right", padx=6)
+            ttk.Button(card, text="Coding Test", command=lambda s=subj: self.start_coding_test(s),
+                       style="Accent.TButton").pack(side="right", padx=6)
 
     def show_subject(self, subject):
-        self.clear_main()
-        self.apply_theme()
-        header = tk.Frame(self.main_frame, bg=self.bg)
+        self.show_screen(("subject", subject), lambda frame: self.build_subject(frame, subject))
+
+    def build_subject(self, frame, subject):
+        header = ttk.Frame(frame, style="App.TFrame")
         header.pack(fill="x", padx=12, pady=8)
-        tk.Label(header, text=f"{subject} — Tests", font=self.title_font, bg=self.bg, fg=self.fg).pack(anchor="w")
-        body = tk.Frame(self.main_frame, bg=self.bg)
+        ttk.Label(header, text=f"{subject} — Tests", style="Title.TLabel").pack(anchor="w")
+        body = ttk.Frame(frame, style="App.TFrame")
         body.pack(fill="both", expand=True, padx=12, pady=6)
 
-        mcq_card = tk.Frame(body, bg=self.card, padx=12, pady=12)
+        mcq_card = ttk.Frame(body, style="Card.TFrame", padding=12)
         mcq_card.pack(fill="x", pady=6)
-        tk.Label(mcq_card, text="MCQ Test", font=self.h2_font, bg=self.card, fg=self.fg).pack(anchor="w")
-        tk.Label(mcq_card, text="50 MCQs covering full subject skills (mixed difficulties).", bg=self.card, fg=self.fg).pack(anchor="w")
-        tk.Button(mcq_card, text="Start MCQ Test", command=lambda s=subject: self.start_mcq_test(s),
-                  bg=self.btn_bg, fg=self.btn_fg, relief="flat").pack(anchor="e", pady=6)
+        ttk.Label(mcq_card, text="MCQ Test", style="CardH2.TLabel").pack(anchor="w")
+        ttk.Label(mcq_card, text=f"{MCQ_COUNT} MCQs covering full subject skills (mixed difficulties).", style="Card.TLabel").pack(anchor="w")
+        ttk.Button(mcq_card, text="Start MCQ Test", command=lambda s=subject: self.start_mcq_test(s),
+                   style="Accent.TButton").pack(anchor="e", pady=6)
 
-        cod_card = tk.Frame(body, bg=self.card, padx=12, pady=12)
+        cod_card = ttk.Frame(body, style="Card.TFrame", padding=12)
         cod_card.pack(fill="x", pady=6)
-        tk.Label(cod_card, text="Coding Test", font=self.h2_font, bg=self.card, fg=self.fg).pack(anchor="w")
-        tk.Label(cod_card, text="5 coding problems: Easy → Hard. Python problems are executable.", bg=self.card, fg=self.fg).pack(anchor="w")
-        tk.Button(cod_card, text="Start Coding Test", command=lambda s=subject: self.start_coding_test(s),
-                  bg=self.btn_bg, fg=self.btn_fg, relief="flat").pack(anchor="e", pady=6)
+        ttk.Label(cod_card, text="Coding Test", style="CardH2.TLabel").pack(anchor="w")
+        runnable = "Code is run and judged on test cases." if can_execute(subject) else "Answers are saved as text (not executable here)."
+        ttk.Label(cod_card, text=f"5 coding problems: Easy → Hard. {runnable}", style="Card.TLabel").pack(anchor="w")
+        ttk.Button(cod_card, text="Start Coding Test", command=lambda s=subject: self.start_coding_test(s),
+                   style="Accent.TButton").pack(anchor="e", pady=6)
 
     def start_mcq_test(self, subject):
-        mcqs = QUESTION_BANK.get(subject, [])[:]
+        mcqs = draw_mcq_paper(subject, username=self.profile.username)
         if not mcqs:
             messagebox.showerror("No questions", "No MCQs available for this subject.")
             return
-        random.shuffle(mcqs)
         TestWindow(self, subject, mcqs, mode="MCQ")
 
     def start_coding_test(self, subject):
-        problems = CODING_BANK.get(subject, [])
+        problems = draw_coding_set(subject)
         if not problems:
             messagebox.showerror("No problems", "No coding problems for this subject.")
             return
         CodingWindow(self, subject, problems)
 
     def show_profile(self):
-        self.clear_main()
-        self.apply_theme()
-        top = tk.Frame(self.main_frame, bg=self.bg)
+        self.show_screen("profile", self.build_profile, self.refresh_profile)
+
+    def build_profile(self, frame):
+        top = ttk.Frame(frame, style="App.TFrame")
         top.pack(fill="x", padx=12, pady=8)
-        tk.Label(top, text="Profile Dashboard", font=self.title_font, bg=self.bg, fg=self.fg).pack(anchor="w")
-        body = tk.Frame(self.main_frame, bg=self.bg)
+        ttk.Label(top, text="Profile Dashboard", style="Title.TLabel").pack(anchor="w")
+        body = ttk.Frame(frame, style="App.TFrame")
         body.pack(fill="both", expand=True, padx=12, pady=8)
-        left = tk.Frame(body, bg=self.card, padx=12, pady=12)
+        left = ttk.Frame(body, style="Card.TFrame", padding=12)
         left.pack(side="left", fill="y")
-        tk.Label(left, text=f"User: {self.profile.username}", font=self.h2_font, bg=self.card, fg=self.fg).pack(anchor="w")
-        tk.Label(left, text=f"Overall Accuracy: {self.profile.get_overall_accuracy():.2f}%", bg=self.card, fg=self.fg).pack(anchor="w", pady=6)
-        tk.Label(left, text=f"Tests Taken: {len(self.profile.tests_taken)}", bg=self.card, fg=self.fg).pack(anchor="w", pady=6)
-        subj_acc = self.profile.subject_accuracy()
-        acc_frame = tk.Frame(body, bg=self.bg)
-        acc_frame.pack(side="left", fill="both", expand=True, padx=12)
-        tk.Label(acc_frame, text="Subject-wise Accuracy", font=self.h2_font, bg=self.bg, fg=self.fg).pack(anchor="w")
-        for k,v in subj_acc.items():
-            bar_frame = tk.Frame(acc_frame, bg=self.card)
-            bar_frame.pack(fill="x", pady=6)
-            tk.Label(bar_frame, text=k, bg=self.card, fg=self.fg).pack(side="left")
-            val = tk.Label(bar_frame, text=f"{v:.1f}%", bg=self.card, fg=self.fg)
-            val.pack(side="right")
-        table = tk.Frame(body, bg=self.bg)
+        ttk.Label(left, text=f"User: {self.profile.username}", style="CardH2.TLabel").pack(anchor="w")
+        self.profile_acc_lbl = ttk.Label(left, style="Card.TLabel")
+        self.profile_acc_lbl.pack(anchor="w", pady=6)
+        self.profile_count_lbl = ttk.Label(left, style="Card.TLabel")
+        self.profile_count_lbl.pack(anchor="w", pady=6)
+        self.profile_time_lbl = ttk.Label(left, style="Card.TLabel")
+        self.profile_time_lbl.pack(anchor="w", pady=6)
+        ttk.Button(left, text="Export Report...", command=self.export_profile_report).pack(anchor="w", pady=(12, 0))
+        self.acc_frame = ttk.Frame(body, style="App.TFrame")
+        self.acc_frame.pack(side="left", fill="both", expand=True, padx=12)
+        ttk.Label(self.acc_frame, text="Subject-wise Accuracy", style="H2.TLabel").pack(anchor="w")
+        self.subject_bars = {}  # subject -> value label, created as subjects are first tested
+        table = ttk.Frame(body, style="App.TFrame")
         table.pack(side="bottom", fill="both", padx=12, pady=8)
-        tk.Label(table, text="Recent Tests", font=self.h2_font, bg=self.bg, fg=self.fg).pack(anchor="w")
-        txt = tk.Text(table, height=10, bg=self.card, fg=self.fg, bd=0)
-        txt.pack(fill="both", expand=True)
+        ttk.Label(table, text="Recent Tests", style="H2.TLabel").pack(anchor="w")
+        self.profile_txt = tk.Text(table, height=10, bg=self.card, fg=self.fg, bd=0)
+        self.profile_txt.pack(fill="both", expand=True)
+        self.themed_texts.append(self.profile_txt)
+
+    def export_profile_report(self):
+        from tkinter import filedialog
+        path = filedialog.asksaveasfilename(parent=self.root, title="Export report", defaultextension=".html",
+                                            filetypes=[("HTML report", "*.html"), ("CSV", "*.csv"), ("JSON lines", "*.jsonl")])
+        if not path:
+            return
+        get_journal_writer().flush()  # include the attempts of this session
+        try:
+            n = export_report(path, iter_attempts([RESULTS_FILE], user=self.profile.username))
+        except (OSError, ValueError, TypeError) as e:
+            messagebox.showerror("Export failed", str(e))
+            return
+        messagebox.showinfo("Report exported", f"{n} attempts written to {path}")
+
+    def refresh_profile(self):
+        self.profile_acc_lbl.config(text=f"Overall Accuracy: {self.profile.get_overall_accuracy():.2f}%")
+        self.profile_count_lbl.config(text=f"Tests Taken: {len(self.profile.tests_taken)}")
+        ts = self.profile.time_stats()
+        self.profile_time_lbl.config(text=f"Time / Test: mean {ts['mean']:.1f}s | p50 {ts['p50']:.1f}s | p95 {ts['p95']:.1f}s")
+        for k,v in self.profile.subject_accuracy().items():
+            val = self.subject_bars.get(k)
+            if val is None:
+                bar_frame = ttk.Frame(self.acc_frame, style="Card.TFrame")
+                bar_frame.pack(fill="x", pady=6)
+                ttk.Label(bar_frame, text=k, style="Card.TLabel").pack(side="left")
+                val = self.subject_bars[k] = ttk.Label(bar_frame, style="Card.TLabel")
+                val.pack(side="right")
+            val.config(text=f"{v:.1f}%")
+        self.profile_txt.delete("1.0", tk.END)
         for t in self.profile.tests_taken[-20:]:
-            txt.insert(tk.END, f"{t.get('subject')} | {t.get('mode')} | Score: {t.get('correct')}/{t.get('total_questions')} | Time: {t.get('time_taken'):.1f}s\n")
+            self.profile_txt.insert(tk.END, f"{t.get('subject')} | {t.get('mode')} | Score: {t.get('correct')}/{t.get('total_questions')} | Time: {t.get('time_taken'):.1f}s\n")
 
 # ----------------------------
 # MCQ Test Window
 # ----------------------------
 class TestWindow:
-    def __init__(self, app: SmartExamApp, subject, questions, mode="MCQ"):
+    def __init__(self, app: SmartExamApp, subject, questions, mode="MCQ", resume=None):
         self.app = app
         self.subject = subject
         self.questions = questions
@@ -467,21 +4579,19 @@ class TestWindow:
         self.root.geometry("1000x660")
         self.root.minsize(900,600)
 
-        # session state
-        self.num_q = len(questions)
-        self.current = 0
-        self.selected = [0]*self.num_q
-        self.visited = [False]*self.num_q
-        self.marked = [False]*self.num_q
-        self.time_started = time.time()
-        self.per_q_time = [0.0]*self.num_q
-        self.q_start_time = time.time()
-        self.remaining_sec = EXAM_DURATION_SECONDS
+        # session state lives in the UI-independent engine
+        journal = AttemptJournal("MCQ", subject, app.profile.username, {"questions": questions}, resume=resume)
+        self.session = ExamSession(subject, questions, journal=journal)
+        if resume:
+            self.session.resume(resume)
+        self.session.start(elapsed=resume["elapsed"] if resume else 0.0)
+        self.num_q = self.session.n
 
         # build UI
         self.build_ui()
-        self.update_timer()
-        self.display_question(0)
+        self.show_nav_page(self.session.current // self.nav_page_size)
+        self.display_question(self.session.current)
+        self.app.clock.register(self)
 
     def build_ui(self):
         top = tk.Frame(self.root, bg=self.app.bg)
@@ -496,13 +4606,28 @@ class TestWindow:
         left.pack(side="left", fill="y", padx=(0,8))
         left.pack_propagate(False)
         tk.Label(left, text="Navigator", bg=self.app.card, fg=self.app.fg).pack(pady=6)
-        self.nav_frame = tk.Frame(left, bg=self.app.card)
-        self.nav_frame.pack(fill="y", expand=True)
-        self.nav_buttons = []
-        for i in range(self.num_q):
-            b = tk.Button(self.nav_frame, text=str(i+1), width=4, command=lambda idx=i: self.goto(idx), bg="#2b3440", fg=self.app.fg)
-            b.grid(row=i//10, column=i%10, padx=2, pady=4)
-            self.nav_buttons.append(b)
+        # paged canvas navigator: a fixed set of cells is reused for every page, so the
+        # widget/item count stays the same however many questions the paper has
+        self.nav_page_size = NAV_COLS * NAV_ROWS
+        self.nav_page = 0
+        self.nav_dirty = set()  # question indices whose cell needs repainting
+        self.nav_canvas = tk.Canvas(left, width=NAV_COLS*NAV_CELL_W, height=NAV_ROWS*NAV_CELL_H,
+                                    bg=self.app.card, highlightthickness=0)
+        self.nav_canvas.pack(pady=4)
+        self.nav_cells = []
+        for slot in range(self.nav_page_size):
+            r, c = divmod(slot, NAV_COLS)
+            x, y = c*NAV_CELL_W, r*NAV_CELL_H
+            rect = self.nav_canvas.create_rectangle(x+2, y+2, x+NAV_CELL_W-2, y+NAV_CELL_H-2, fill=NAV_COLORS["new"], outline="", width=2)
+            text = self.nav_canvas.create_text(x+NAV_CELL_W/2, y+NAV_CELL_H/2, text="", fill=self.app.fg)
+            self.nav_cells.append((rect, text))
+        self.nav_canvas.bind("<Button-1>", self.on_nav_click)
+        pager = tk.Frame(left, bg=self.app.card)
+        pager.pack(pady=4)
+        tk.Button(pager, text="◀", command=lambda: self.show_nav_page(self.nav_page - 1)).pack(side="left")
+        self.nav_page_lbl = tk.Label(pager, text="", bg=self.app.card, fg=self.app.fg)
+        self.nav_page_lbl.pack(side="left", padx=6)
+        tk.Button(pager, text="▶", command=lambda: self.show_nav_page(self.nav_page + 1)).pack(side="left")
 
         right = tk.Frame(main, bg=self.app.bg)
         right.pack(side="left", fill="both", expand=True)
@@ -522,119 +4647,144 @@ class TestWindow:
         tk.Button(footer, text="Save & Next", command=self.save_next, bg=self.app.btn_bg, fg=self.app.btn_fg).pack(side="left", padx=6)
         tk.Button(footer, text="Mark/Unmark Review", command=self.toggle_mark, bg=self.app.btn_bg, fg=self.app.btn_fg).pack(side="left", padx=6)
         tk.Button(footer, text="Submit Test", command=self.submit).pack(side="right")
-        tk.Button(footer, text="Cancel", command=self.root.destroy).pack(side="right", padx=6)
+        tk.Button(footer, text="Cancel", command=self.cancel).pack(side="right", padx=6)
 
-    def update_timer(self):
-        elapsed = int(time.time() - self.time_started)
-        remaining = max(0, self.remaining_sec - elapsed)
-        mins, secs = divmod(remaining, 60)
-        self.timer_lbl.config(text=f"Time Remaining: {mins:02d}:{secs:02d}")
-        if remaining <= 0:
-            self.submit()
-        else:
-            self.root.after(1000, self.update_timer)
+    def show_remaining(self, seconds):
+        self.timer_lbl.config(text=format_remaining(seconds))
+
+    def time_up(self):
+        self.submit()
 
+    @timed("exam_display_question_seconds")
     def display_question(self, idx):
-        # save time spent on previous before switching
-        now = time.time()
-        if hasattr(self, "q_start_time") and self.q_start_time:
-            self.per_q_time[self.current] += now - self.q_start_time
-        self.q_start_time = now
-        self.current = idx
+        # the session books the time spent on the previous question
+        prev = self.session.goto(idx)
+        self.nav_dirty.update((prev, idx))
         q = self.questions[idx]
         self.q_label.config(text=f"Q{idx+1}. {q['question']}")
-        self.var.set(self.selected[idx])
+        self.var.set(self.session.selected[idx])
         for i,opt in enumerate(q["options"]):
             self.opt_rbs[i].config(text=f"{chr(65+i)}. {opt}")
-        self.visited[idx] = True
-        self.update_nav_colors()
+        if idx // self.nav_page_size != self.nav_page:
+            self.show_nav_page(idx // self.nav_page_size)
+        else:
+            self.update_nav_colors()
 
     def on_select(self):
-        sel = self.var.get()
-        self.selected[self.current] = sel
+        self.session.answer(self.var.get())
+        self.nav_dirty.add(self.session.current)
         self.update_nav_colors()
 
     def goto(self, idx):
         self.display_question(idx)
 
     def prev_q(self):
-        if self.current > 0:
-            self.display_question(self.current - 1)
+        if self.session.current > 0:
+            self.display_question(self.session.current - 1)
 
     def save_next(self):
-        if self.current < self.num_q - 1:
-            self.display_question(self.current + 1)
+        if self.session.current < self.num_q - 1:
+            self.display_question(self.session.current + 1)
         else:
             messagebox.showinfo("End", "You are at the last question.")
 
     def toggle_mark(self):
-        self.marked[self.current] = not self.marked[self.current]
+        self.session.toggle_mark()
+        self.nav_dirty.add(self.session.current)
         self.update_nav_colors()
 
-    def update_nav_colors(self):
-        for i,b in enumerate(self.nav_buttons):
-            if self.marked[i]:
-                b.config(bg="#ff9f1c")  # orange
-            elif self.selected[i] != 0:
-                b.config(bg="#10b981")  # green
-            elif self.visited[i]:
-                b.config(bg="#fbbf24")  # yellow
+    def nav_color(self, i):
+        return NAV_COLORS[self.session.status(i)]
+
+    def paint_nav_cell(self, i):
+        rect, _ = self.nav_cells[i - self.nav_page*self.nav_page_size]
+        self.nav_canvas.itemconfig(rect, fill=self.nav_color(i), outline=self.app.fg if i == self.session.current else "")
+
+    def show_nav_page(self, page):
+        pages = max(1, -(-self.num_q // self.nav_page_size))
+        self.nav_page = max(0, min(page, pages - 1))
+        first = self.nav_page * self.nav_page_size
+        for slot, (rect, text) in enumerate(self.nav_cells):
+            i = first + slot
+            if i < self.num_q:
+                self.nav_canvas.itemconfig(rect, state="normal")
+                self.nav_canvas.itemconfig(text, text=str(i+1), state="normal")
+                self.paint_nav_cell(i)
             else:
-                b.config(bg="#2b3440")  # default
+                self.nav_canvas.itemconfig(rect, state="hidden")
+                self.nav_canvas.itemconfig(text, state="hidden")
+        last = min(first + self.nav_page_size, self.num_q)
+        self.nav_page_lbl.config(text=f"{first+1}-{last} of {self.num_q}")
+        self.nav_dirty.clear()
 
+    @timed("exam_nav_update_seconds")
+    def update_nav_colors(self):
+        # repaint only cells that changed and are on the visible page; the rest are
+        # painted when their page is shown
+        first = self.nav_page * self.nav_page_size
+        for i in self.nav_dirty:
+            if first <= i < first + self.nav_page_size and i < self.num_q:
+                self.paint_nav_cell(i)
+        self.nav_dirty.clear()
+
+    def on_nav_click(self, event):
+        col, row = event.x // NAV_CELL_W, event.y // NAV_CELL_H
+        if 0 <= col < NAV_COLS and 0 <= row < NAV_ROWS:
+            i = self.nav_page*self.nav_page_size + row*NAV_COLS + col
+            if i < self.num_q:
+                self.goto(i)
+
+    @timed("exam_submit_seconds", mode="MCQ")
     def submit(self):
-        now = time.time()
-        if self.q_start_time:
-            self.per_q_time[self.current] += now - self.q_start_time
-        total_time = time.time() - self.time_started
-        correct = 0
-        attempted = 0
-        for i,q in enumerate(self.questions):
-            if self.selected[i] != 0:
-                attempted += 1
-                if self.selected[i] == q.get("answer", 1):
-                    correct += 1
-        total = self.num_q
-        percent = (correct/total)*100.0
-        avg_time = sum(self.per_q_time)/max(1,total)
-        summary = {
-            "subject": self.subject,
-            "mode": "MCQ",
-            "correct": correct,
-            "attempted": attempted,
-            "total_questions": total,
-            "time_taken": total_time,
-            "avg_time_per_question": avg_time
-        }
+        self.app.clock.unregister(self)
+        summary = self.session.submit()
         self.app.profile.record_test(summary)
         self.app.update_summary_text()
         ResultWindow(self.app, summary)
         self.root.destroy()
 
+    def cancel(self):
+        self.app.clock.unregister(self)
+        self.session.cancel()
+        self.root.destroy()
+
 # ----------------------------
 # Coding Window
 # ----------------------------
 class CodingWindow:
-    def __init__(self, app: SmartExamApp, subject, problems):
+    def __init__(self, app: SmartExamApp, subject, problems, resume=None):
         self.app = app
         self.subject = subject
         self.problems = problems
         self.root = tk.Toplevel(app.root)
         self.root.title(f"{subject} — Coding Test")
         self.root.geometry("1000x700")
-        self.current = 0
         self.num = len(problems)
-        self.answers = [""]*self.num
-        self.times = [0.0]*self.num
-        self.start_time = time.time()
-        self.q_start = time.time()
+        self.running = False
+        self.submitting = False
+        journal = AttemptJournal("Coding", subject, app.profile.username, {"problems": problems}, resume=resume)
+        self.session = CodingSession(subject, problems, user=app.profile.username, journal=journal)
+        if resume:
+            self.session.resume(resume)
+        self.session.start(elapsed=resume["elapsed"] if resume else 0.0)
+        if can_execute(subject):
+            get_worker_pool()  # start warming workers while the candidate reads the problem
         self.build_ui()
+        self.app.clock.register(self)
 
     def build_ui(self):
+        from tkinter import scrolledtext
         top = tk.Frame(self.root, bg=self.app.bg)
         top.pack(fill="x")
         tk.Label(top, text=f"{self.subject} — Coding Test", font=self.app.h2_font, bg=self.app.bg, fg=self.app.fg).pack(side="left", padx=10, pady=8)
-        tk.Label(top, text="Note: Only Python problems are executable. For others, write code as text (no execution).", bg=self.app.bg, fg=self.app.fg).pack(side="right", padx=8)
+        self.timer_lbl = tk.Label(top, text="", bg=self.app.bg, fg="#ffecd1")
+        self.timer_lbl.pack(side="right", padx=12)
+        if can_execute(self.subject):
+            note = "Run executes your program with the stdin tests use." if self.subject == "Python" else \
+                f"Run compiles your program ({toolchain(self.subject)['version']}) and executes it."
+        else:
+            note = f"Note: no {self.subject} toolchain on this machine. Write code as text (no execution)."
+        tk.Label(top, text=note, bg=self.app.bg, fg=self.app.fg).pack(side="right", padx=8)
 
         main = tk.Frame(self.root, bg=self.app.bg)
         main.pack(fill="both", expand=True, padx=10, pady=8)
@@ -658,89 +4808,177 @@ class CodingWindow:
 
         ctrl = tk.Frame(self.root, bg=self.app.bg)
         ctrl.pack(fill="x", padx=8, pady=6)
-        tk.Button(ctrl, text="Run (Python only)", command=self.run_code, bg="#06b6d4", fg="#000").pack(side="left", padx=6)
+        run_text = f"Run {self.subject}" if can_execute(self.subject) else "Run (not available here)"
+        tk.Button(ctrl, text=run_text, command=self.run_code, bg="#06b6d4", fg="#000").pack(side="left", padx=6)
         tk.Button(ctrl, text="Save Answer", command=self.save_answer, bg=self.app.btn_bg, fg=self.app.btn_fg).pack(side="left", padx=6)
         tk.Button(ctrl, text="Submit Test", command=self.submit).pack(side="right", padx=6)
-        tk.Button(ctrl, text="Cancel", command=self.root.destroy).pack(side="right", padx=6)
+        tk.Button(ctrl, text="Cancel", command=self.cancel).pack(side="right", padx=6)
 
         outlbl = tk.Label(self.root, text="Output:", bg=self.app.bg, fg=self.app.fg)
         outlbl.pack(anchor="w", padx=12)
         self.output_area = scrolledtext.ScrolledText(self.root, height=8, bg="#02111b", fg="#bfefff")
         self.output_area.pack(fill="x", padx=12, pady=6)
-        self.show_problem(0)
+        self.output_area.tag_configure("stderr", foreground="#fca5a5")
+        self.output_area.tag_configure("note", foreground="#fde68a")
+        self.show_problem(self.session.current)
 
     def show_problem(self, idx):
-        now = time.time()
-        self.times[self.current] += now - self.q_start
-        self.q_start = now
-        self.current = idx
+        self.session.goto(idx)
         p = self.problems[idx]
         self.title_lbl.config(text=f"{idx+1}. {p['title']}")
         self.desc_lbl.config(text=p['desc'])
         self.editor.delete("1.0", tk.END)
-        self.editor.insert(tk.END, self.answers[idx])
+        self.editor.insert(tk.END, self.session.answers[idx])
 
     def save_answer(self):
-        code = self.editor.get("1.0", tk.END).rstrip()
-        self.answers[self.current] = code
+        self.session.save_answer(self.editor.get("1.0", tk.END).rstrip())
         messagebox.showinfo("Saved", "Answer saved locally in session.")
 
     def run_code(self):
-        if self.subject != "Python":
-            messagebox.showwarning("Not supported", "Only Python problems are executable in this demo. For other languages, save answers as text.")
+        if not can_execute(self.subject):
+            messagebox.showwarning("Not supported", f"{self.subject} cannot be executed on this machine. Save your answer as text.")
             return
         code = self.editor.get("1.0", tk.END).rstrip()
         if not code.strip():
-            messagebox.showerror("No code", "Please write some Python code to run.")
+            messagebox.showerror("No code", f"Please write some {self.subject} code to run.")
+            return
+        if self.running:
+            messagebox.showinfo("Running", "Your previous run is still in progress.")
             return
-        tmpdir = tempfile.gettempdir()
-        fname = os.path.join(tmpdir, f"exam_user_code_{int(time.time()*1000)}.py")
-        with open(fname, "w", encoding="utf-8") as f:
-            f.write(code + "\n")
+        self.running = True
+        self.run_started = time.perf_counter()
+        self.output_area.delete("1.0", tk.END)
+        self.out_chars = 0
+        self.out_truncated = False
+        # the runner thread only ever touches this queue; the Tk loop drains it in _drain_output
+        self.out_queue = queue.Queue(maxsize=OUTPUT_QUEUE_SIZE)
+        out_queue = self.out_queue
+        def push(item):
+            while self.running:
+                try:
+                    out_queue.put(item, timeout=0.2)
+                    return
+                except queue.Full:
+                    continue
         def run_and_capture():
             try:
-                proc = subprocess.run([sys.executable, fname], capture_output=True, text=True, timeout=PY_EXEC_TIMEOUT)
-                out = proc.stdout
-                err = proc.stderr
-                self.output_area.delete("1.0", tk.END)
-                if out:
-                    self.output_area.insert(tk.END, "=== STDOUT ===\n")
-                    self.output_area.insert(tk.END, out)
-                if err:
-                    self.output_area.insert(tk.END, "\n=== STDERR ===\n")
-                    self.output_area.insert(tk.END, err)
-            except subprocess.TimeoutExpired:
-                self.output_area.insert(tk.END, "ERROR: Execution timed out.\n")
+                res = run_program(self.subject, code, timeout=PY_EXEC_TIMEOUT,
+                                  on_output=lambda stream, text: push(("chunk", stream, text)))
+                push(("done", res, None))
             except Exception as e:
-                self.output_area.insert(tk.END, f"ERROR running code: {e}\n")
-            finally:
-                try:
-                    os.remove(fname)
-                except:
-                    pass
+                push(("error", e, None))
         threading.Thread(target=run_and_capture, daemon=True).start()
+        self.root.after(OUTPUT_POLL_MS, self._drain_output)
+
+    def _append_output(self, text, tag=None):
+        if self.out_truncated:
+            return
+        room = OUTPUT_PANE_LIMIT - self.out_chars
+        if len(text) > room:
+            text = text[:room]
+            self.out_truncated = True
+        self.out_chars += len(text)
+        self.output_area.insert(tk.END, text, tag)
+        if self.out_truncated:
+            self.output_area.insert(tk.END, f"\n... output truncated after {OUTPUT_PANE_LIMIT} characters ...\n", "note")
+        self.output_area.see(tk.END)
+
+    @timed("exam_run_render_seconds")
+    def _drain_output(self):
+        if not self.root.winfo_exists():
+            self.running = False
+            return
+        for _ in range(OUTPUT_QUEUE_SIZE):
+            try:
+                kind, a, b = self.out_queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "chunk":
+                self._append_output(b, "stderr" if a == "stderr" else None)
+                continue
+            self.running = False
+            if kind == "error":
+                self.output_area.insert(tk.END, f"ERROR running code: {a}\n", "note")
+                return
+            res = a
+            build = res.get("compile")
+            if build and not build["ok"]:
+                self._append_output(res["stderr"], "stderr")
+                self.output_area.insert(tk.END, "\nERROR: Compilation failed.\n", "note")
+                self.output_area.see(tk.END)
+                return
+            if res.get("cached"):
+                self.output_area.insert(tk.END, "\n[unchanged code and input: cached result]", "note")
+            elif build:
+                how = "cached build" if build["cached"] else f"compiled in {build['time']:.2f}s"
+                self.output_area.insert(tk.END, f"\n[{how}]", "note")
+            if res["timed_out"]:
+                self.output_area.insert(tk.END, "\nERROR: Execution timed out.\n", "note")
+            if res.get("limit_exceeded"):
+                self.output_area.insert(tk.END, f"\nERROR: {res['limit_exceeded']} limit exceeded.\n", "note")
+            self.output_area.insert(tk.END, f"\n=== USAGE ===\n{format_usage(res['usage'])}\n", "note")
+            self.output_area.see(tk.END)
+            self.session.record_run(res["usage"])
+            METRICS.observe("exam_run_code_seconds", time.perf_counter() - self.run_started)
+            return
+        self.root.after(OUTPUT_POLL_MS, self._drain_output)
+
+    def show_remaining(self, seconds):
+        self.timer_lbl.config(text=format_remaining(seconds))
+
+    def time_up(self):
+        self.submit()
 
     def submit(self):
-        total = self.num
-        solved = 0
-        for i, ans in enumerate(self.answers):
-            if ans and len(ans.strip())>20:
-                solved += 1
-        score = solved
-        total_time = time.time() - self.start_time
-        summary = {
-            "subject": self.subject,
-            "mode": "Coding",
-            "correct": score,
-            "attempted": solved,
-            "total_questions": total,
-            "time_taken": total_time
-        }
+        if self.submitting:
+            return
+        self.submitting = True
+        self.submit_started = time.perf_counter()
+        self.app.clock.unregister(self)
+        # keep whatever is in the editor, stop the clock, then judge off the UI thread
+        self.session.save_answer(self.editor.get("1.0", tk.END).rstrip())
+        self.session.finish_timing()
+        self.output_area.delete("1.0", tk.END)
+        self.output_area.insert(tk.END, "Judging submission...\n")
+        done = {}
+        def grade():
+            started = time.perf_counter()
+            try:
+                done["results"] = self.session.grade()
+            except Exception as e:
+                done["error"] = e
+            METRICS.observe("exam_judge_seconds", time.perf_counter() - started)
+        threading.Thread(target=grade, daemon=True).start()
+        self.root.after(50, lambda: self._finish_submit(done))
+
+    def _finish_submit(self, done):
+        if not done:
+            self.root.after(50, lambda: self._finish_submit(done))
+            return
+        if "error" in done:
+            self.session.resume_timing()
+            if self.session.remaining() > 0:
+                # back to a live attempt: the clock picks it up again
+                messagebox.showerror("Judge error", f"Could not judge submission: {done['error']}")
+                self.submitting = False
+                self.app.clock.register(self)
+                return
+            # time is up, so another try would just fail again on the next tick: record it unjudged
+            messagebox.showerror("Judge error", f"Could not judge submission: {done['error']}\n\n"
+                                 "Time is up, so the attempt is recorded without test results; the code is kept.")
+            done = {"results": unjudged_results(self.session.items, f"judge error: {done['error']}")}
+        summary = self.session.submit(done["results"])
+        METRICS.observe("exam_submit_seconds", time.perf_counter() - self.submit_started, mode="Coding")
         self.app.profile.record_test(summary)
         self.app.update_summary_text()
         ResultWindow(self.app, summary)
         self.root.destroy()
 
+    def cancel(self):
+        self.app.clock.unregister(self)
+        self.session.cancel()
+        self.root.destroy()
+
 # ----------------------------
 # Result Window
 # ----------------------------
@@ -754,6 +4992,7 @@ class ResultWindow:
         self.build_ui()
 
     def build_ui(self):
+        from tkinter import scrolledtext
         top = tk.Frame(self.root, bg=self.app.bg)
         top.pack(fill="x", padx=10, pady=10)
         tk.Label(top, text="Test Result", font=self.app.h2_font, bg=self.app.bg, fg=self.app.fg).pack(anchor="w")
@@ -764,22 +5003,145 @@ class ResultWindow:
         tk.Label(body, text=f"Subject: {sbj}", bg=self.app.card, fg=self.app.fg).pack(anchor="w")
         tk.Label(body, text=f"Mode: {mode}", bg=self.app.card, fg=self.app.fg).pack(anchor="w")
         tk.Label(body, text=f"Score: {self.summary.get('correct')} / {self.summary.get('total_questions')}", bg=self.app.card, fg=self.app.fg).pack(anchor="w", pady=6)
+        if self.summary.get("standing"):
+            tk.Label(body, text=format_standing(self.summary["standing"]), bg=self.app.card, fg=self.app.fg).pack(anchor="w")
         if mode == "MCQ":
             tk.Label(body, text=f"Attempted: {self.summary.get('attempted')}", bg=self.app.card, fg=self.app.fg).pack(anchor="w")
             tk.Label(body, text=f"Time Taken: {self.summary.get('time_taken'):.1f} seconds", bg=self.app.card, fg=self.app.fg).pack(anchor="w")
             tk.Label(body, text=f"Avg Time / Q: {self.summary.get('avg_time_per_question',0):.2f} seconds", bg=self.app.card, fg=self.app.fg).pack(anchor="w")
         else:
-            tk.Label(body, text=f"Problems Solved (crude): {self.summary.get('correct')}", bg=self.app.card, fg=self.app.fg).pack(anchor="w")
+            tk.Label(body, text=f"Problems Solved: {self.summary.get('correct')}", bg=self.app.card, fg=self.app.fg).pack(anchor="w")
             tk.Label(body, text=f"Time Taken: {self.summary.get('time_taken'):.1f} seconds", bg=self.app.card, fg=self.app.fg).pack(anchor="w")
+            if self.summary.get("usage"):
+                tk.Label(body, text=f"Judge usage: {format_usage(self.summary['usage'])}", bg=self.app.card, fg=self.app.fg).pack(anchor="w")
+            judged = [r for r in self.summary.get("judge", []) if r["total"]]
+            if judged:
+                txt = scrolledtext.ScrolledText(body, height=8, bg=self.app.card, fg=self.app.fg, bd=0)
+                txt.pack(fill="both", expand=True, pady=6)
+                for r in judged:
+                    txt.insert(tk.END, f"{r['title']} — {r['passed']}/{r['total']} passed\n")
+                    for i, c in enumerate(r["cases"]):
+                        extra = f" ({c['detail']})" if c.get("detail") else ""
+                        usage = f" — {format_usage(c['usage'])}" if c.get("usage") else ""
+                        txt.insert(tk.END, f"   case {i+1}: {c['verdict']} in {c['time']*1000:.0f} ms{extra}{usage}\n")
+                txt.config(state="disabled")
         btn_frame = tk.Frame(self.root, bg=self.app.bg)
         btn_frame.pack(fill="x", pady=8)
         tk.Button(btn_frame, text="Back to Dashboard", command=self.root.destroy, bg=self.app.btn_bg, fg=self.app.btn_fg).pack(side="left", padx=8)
         tk.Button(btn_frame, text="View Profile", command=lambda: [self.root.destroy(), self.app.show_profile()]).pack(side="left", padx=8)
 
+# ----------------------------
+# Diagnostics Window
+# ----------------------------
+class DiagnosticsWindow:
+    def __init__(self, app: SmartExamApp):
+        self.app = app
+        self.root = tk.Toplevel(app.root)
+        self.root.title("Diagnostics")
+        self.root.geometry("760x460")
+        self.enabled = tk.IntVar(value=int(METRICS.enabled))
+        self.build_ui()
+        self.refresh()
+
+    def build_ui(self):
+        top = tk.Frame(self.root, bg=self.app.bg)
+        top.pack(fill="x", padx=10, pady=8)
+        tk.Label(top, text="Diagnostics", font=self.app.h2_font, bg=self.app.bg, fg=self.app.fg).pack(side="left")
+        tk.Button(top, text="Reset", command=METRICS.reset, bg=self.app.btn_bg, fg=self.app.btn_fg).pack(side="right", padx=6)
+        tk.Checkbutton(top, text="Record metrics", variable=self.enabled, command=self.toggle,
+                       bg=self.app.bg, fg=self.app.fg, selectcolor=self.app.card).pack(side="right", padx=6)
+        self.text = tk.Text(self.root, bg=self.app.card, fg=self.app.fg, bd=0, font=("Courier", 10))
+        self.text.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+
+    def toggle(self):
+        METRICS.enabled = bool(self.enabled.get())
+
+    def refresh(self):
+        if not self.root.winfo_exists():
+            return
+        snap = METRICS.snapshot()
+        lines = [f"{'histogram':<40}{'count':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}"]
+        for h in snap["histograms"]:
+            name = h["name"] + _prom_labels(h["labels"])
+            lines.append(f"{name:<40}{h['count']:>7}{h['p50']*1000:>9.2f}{h['p95']*1000:>9.2f}{h['p99']*1000:>9.2f}{h['max']*1000:>9.2f}")
+        lines.append("")
+        lines.append(f"{'counter':<60}{'value':>10}")
+        for c in snap["counters"]:
+            lines.append(f"{c['name'] + _prom_labels(c['labels']):<60}{c['value']:>10}")
+        if not METRICS.enabled:
+            lines.append("\nRecording is off.")
+        self.text.config(state="normal")
+        self.text.delete("1.0", tk.END)
+        self.text.insert(tk.END, "\n".join(lines))
+        self.text.config(state="disabled")
+        self.root.after(METRICS_PANEL_REFRESH_MS, self.refresh)
+
 # ----------------------------
 # Run App
 # ----------------------------
-def main():
+def main(argv=None):
+    global PAPERS_FILE
+    parser = argparse.ArgumentParser(description="Smart Exam Portal")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--serve", action="store_true", help="serve the exam flows as an HTTP/JSON API instead of the desktop app")
+    parser.add_argument("--host", default=SERVER_HOST, help="address for --serve")
+    parser.add_argument("--port", type=int, default=SERVER_PORT, help="port for --serve")
+    parser.add_argument("--bench", nargs="?", const="smoke", choices=sorted(BENCH_SCENARIOS), help="run a load benchmark scenario and exit")
+    parser.add_argument("--candidates", type=int, help="override the scenario's candidate count")
+    parser.add_argument("--think", type=float, help="override the scenario's mean think time (seconds)")
+    parser.add_argument("--seed", type=int, help=f"seed for --bench (default {BANK_SEED}) or to override the --cohort blueprint's")
+    parser.add_argument("--out", help="write the --bench, --similarity, --item-stats or --regrade report as JSON")
+    parser.add_argument("--compare", help="baseline JSON report to check --bench against")
+    parser.add_argument("--import", dest="import_packs", nargs="+", metavar="PACK", help="import JSON-lines/CSV question packs and exit")
+    parser.add_argument("--export", dest="export_pack", metavar="PATH", help="export the imported questions (JSON lines or .csv) and exit")
+    parser.add_argument("--subject", help="limit --export, --report, --item-stats or --regrade to one subject")
+    parser.add_argument("--report", metavar="PATH", help="export recorded attempts to PATH (.csv, .jsonl or .html) and exit")
+    parser.add_argument("--report-format", choices=("csv", "jsonl", "html"), help="report format (default: from the file extension)")
+    parser.add_argument("--results", nargs="+", metavar="FILE", help=f"attempt logs for --report (default {RESULTS_FILE})")
+    parser.add_argument("--user", help="limit --report, --item-stats or --regrade to one user")
+    parser.add_argument("--metrics", metavar="PATH", help="record hot-path metrics and export them to PATH")
+    parser.add_argument("--metrics-format", choices=("prom", "jsonl"), help="export format (default: from the file extension)")
+    parser.add_argument("--cohort", metavar="BLUEPRINT", help="pre-assemble one MCQ paper per --roster candidate and exit")
+    parser.add_argument("--roster", metavar="FILE", help="candidate usernames for --cohort (text or CSV with a username column)")
+    parser.add_argument("--papers", metavar="PATH", help=f"cohort paper file to write with --cohort and to serve exams from (default {PAPERS_FILE})")
+    parser.add_argument("--similarity", nargs="*", metavar="FILE", help=f"report likely-copied coding submissions (default {SUBMISSIONS_FILE})")
+    parser.add_argument("--threshold", type=float, default=SIMILARITY_THRESHOLD, help="similarity reported by --similarity")
+    parser.add_argument("--item-stats", action="store_true", help="measure item difficulty from logged MCQ responses, save the labels and exit")
+    parser.add_argument("--regrade", metavar="KEYFILE", help="rescore logged MCQ attempts with corrected answers (JSON: item id -> option 1-4) and exit")
+    parser.add_argument("--scheme", choices=sorted(MARKING_SCHEMES), default="standard", help="marking scheme for --regrade")
+    parser.add_argument("--responses", nargs="+", metavar="FILE", help=f"MCQ response logs for --item-stats or --regrade (default {RESPONSES_FILE})")
+    parser.add_argument("--run-cache", metavar="DIR", help="also keep deterministic run results in DIR across restarts")
+    parser.add_argument("--profile-startup", action="store_true", help="report time to first window and an import-time breakdown")
+    args = parser.parse_args(argv)
+    if args.worker:
+        worker_main()
+        return
+    if args.metrics:
+        METRICS.enabled = True
+        MetricsExporter(args.metrics, args.metrics_format)
+    if args.run_cache:
+        RESULT_CACHE.folder = os.path.abspath(os.path.expanduser(args.run_cache))
+    if args.papers:
+        PAPERS_FILE = os.path.abspath(os.path.expanduser(args.papers))
+    if args.serve:
+        serve(args.host, args.port)
+        return
+    if args.bench:
+        sys.exit(bench_main(args))
+    if args.profile_startup:
+        sys.exit(profile_startup())
+    if args.cohort:
+        sys.exit(cohort_main(args))
+    if args.similarity is not None:
+        sys.exit(similarity_main(args))
+    if args.report:
+        sys.exit(report_main(args))
+    if args.item_stats:
+        sys.exit(item_stats_main(args))
+    if args.regrade:
+        sys.exit(regrade_main(args))
+    if args.import_packs or args.export_pack:
+        sys.exit(pack_main(args))
     root = tk.Tk()
     app = SmartExamApp(root)
     app.apply_theme()